@@ -5,42 +5,58 @@ import logging
 import time
 from datetime import datetime
 from difflib import SequenceMatcher
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_file
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Blueprint, Flask, render_template, request, jsonify, session, redirect, url_for, send_file, Response, stream_with_context
 from werkzeug.exceptions import HTTPException
+from werkzeug.middleware.proxy_fix import ProxyFix
 import random
 from modules.llm_handler import LLMHandler
 import json  
 from modules.summarize import Summarizer
+from modules.events import create_event_bus
+from modules.activity import ActivityFeed
+from modules.topics import TopicIndex
+from modules.database import USER_DB_PATH, get_db_connection
+from modules.archive import ActivityArchive
+from modules.profiles import ProfileService, create_profile_store
+from modules.export import RecordExporter, EXPORT_TABLES
+from modules.mastery import MasteryIndex
+from modules.search import InteractionSearch
+from modules.assessments import Assessments, TestNotFound, TestAlreadySubmitted
+from modules.shards import router as shard_router
+from modules.backup import BackupService
+from modules.passwords import hasher as password_hasher, HashingBusy, LoginThrottle
+from modules.jobs import JobQueue, FINAL_STATES
+from modules.slide_store import SlideStore, file_key, result_key, video_key
+import hmac
 from markupsafe import escape
 import requests
-import cv2
-import numpy as np
-import subprocess
-from PIL import Image
-import pytesseract
-from datetime import timedelta
-from skimage.metrics import structural_similarity as ssim
-llm = LLMHandler()
+import threading
+from functools import lru_cache
+from typing import Optional
 
-# Logging setup
-os.makedirs('logs', exist_ok=True)
-os.makedirs('database', exist_ok=True)
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('logs/app.log', mode='a')
-    ]
-)
 logger = logging.getLogger(__name__)
 
 CONFIG = {
-    'DATABASE_PATH': 'database/edu_chat.db',
+    'DATABASE_PATH': USER_DB_PATH,
+    # Set SECRET_KEY in production; a random key only works when every worker shares it (preload)
+    'SECRET_KEY': os.environ.get('SECRET_KEY', os.urandom(24).hex()),
     'REQUIRE_EMAIL_VERIFICATION': False,
     'PASSWORD_MIN_LENGTH': 8,
     'SESSION_TIMEOUT_MINUTES': 30,
+    'EVENT_BUS_URL': os.environ.get('EDUX_EVENT_BUS_URL'),  # e.g. redis://localhost:6379/0 for multi-worker
+    'SSE_HEARTBEAT_SECONDS': 15,
+    'PROFILE_CACHE_URL': os.environ.get('EDUX_PROFILE_CACHE_URL'),  # shared cache for multi-worker, e.g. redis://
+    'PROFILE_CACHE_SIZE': 10000,
+    'PROFILE_CACHE_TTL_SECONDS': 300,
+    'EXPORT_API_TOKEN': os.environ.get('EDUX_EXPORT_TOKEN'),  # bearer token for exports across users
+    # Refresh read replicas and take snapshots from this process; with several
+    # workers run `python -m modules.backup run` once instead
+    'BACKUP_IN_PROCESS': os.environ.get('EDUX_BACKUP_IN_PROCESS', '0') == '1',
+    # Reverse proxies in front of the app whose X-Forwarded-For is trusted; behind
+    # nginx set 1, or every client shares the proxy's address in the login throttle
+    'TRUSTED_PROXIES': int(os.environ.get('EDUX_TRUSTED_PROXIES', 0)),
+    # Largest lecture video accepted by /api/extract_slides as an upload
+    'MAX_VIDEO_UPLOAD_MB': int(os.environ.get('EDUX_MAX_VIDEO_UPLOAD_MB', 2048)),
     'SUBJECT_MODELS': {
         'math': 'wizard-math:7b',
         'science': 'dolphin-mistral:latest',
@@ -52,8 +68,9 @@ CONFIG = {
 
 PROMPT_TEMPLATES_DIR = "modules/prompts"
 
-def load_prompt_templates():
-    """Load all prompt templates from files"""
+@lru_cache(maxsize=None)
+def prompt_templates():
+    """Load all prompt templates from files, once per process on first use"""
     templates = {}
     for subject in CONFIG['SUBJECT_MODELS'].keys():
         try:
@@ -65,116 +82,101 @@ def load_prompt_templates():
             templates[subject] = f"You are an expert {subject} tutor. Please provide detailed and helpful responses."
     return templates
 
-PROMPT_TEMPLATES = load_prompt_templates()
-
-app = Flask(__name__)
-app.secret_key = os.environ.get('SECRET_KEY', os.urandom(24).hex())
-
-USER_DB_PATH = 'database/user_data.db'
-EDU_DB_PATH = 'database/edu_chat.db'
+def configure_logging():
+    os.makedirs('logs', exist_ok=True)
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(),
+            logging.FileHandler('logs/app.log', mode='a')
+        ]
+    )
 
 def init_db():
-    """Initialize user-related tables in user_data.db"""
+    """Bring the primary database and any shard files up to the latest schema version"""
     try:
-        db_path = USER_DB_PATH
-        os.makedirs('database', exist_ok=True)
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            # Users table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    email TEXT UNIQUE,
-                    password_hash TEXT NOT NULL,
-                    is_verified BOOLEAN DEFAULT 0,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    last_login DATETIME
-                )
-            ''')
-            # User progress table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS user_progress (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    topic TEXT,
-                    correct_count INTEGER DEFAULT 0,
-                    incorrect_count INTEGER DEFAULT 0,
-                    avg_response_time REAL DEFAULT 0,
-                    FOREIGN KEY(user_id) REFERENCES users(id)
-                )
-            ''')
-            # Interactions table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS interactions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    topic TEXT,
-                    question TEXT,
-                    answer TEXT,
-                    is_correct BOOLEAN,
-                    response_time REAL,
-                    model_used TEXT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY(user_id) REFERENCES users(id)
-                )
-            ''')
-            # Add a new table for rapid quiz responses
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS rapid_quiz_responses (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    topic TEXT,
-                    question TEXT,
-                    user_answer TEXT,
-                    correct_answer TEXT,
-                    is_correct BOOLEAN,
-                    response_time REAL,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY(user_id) REFERENCES users(id)
-                )
-            ''')
-            # Add feedback table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS feedback (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    interaction_id INTEGER,
-                    helpful_rating INTEGER,
-                    clarity_rating INTEGER,
-                    engagement_rating INTEGER,
-                    comments TEXT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY(user_id) REFERENCES users(id),
-                    FOREIGN KEY(interaction_id) REFERENCES interactions(id)
-                )
-            ''')
-            # Add user preferences table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS user_preferences (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER UNIQUE,
-                    interests TEXT,
-                    learning_style TEXT,
-                    preferred_explanation_style TEXT DEFAULT 'standard',
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY(user_id) REFERENCES users(id)
-                )
-            ''')
-            conn.commit()
-            logger.info(f"Database {db_path} initialized successfully")
+        os.makedirs(os.path.dirname(USER_DB_PATH) or '.', exist_ok=True)
+        for path, version in shard_router.upgrade_all().items():
+            logger.info(f"Database {path} initialized successfully (schema version {version})")
     except Exception as e:
-        logger.critical(f"Database initialization failed for {db_path}: {str(e)}")
+        logger.critical(f"Database initialization failed for {USER_DB_PATH}: {str(e)}")
         raise
-init_db()
 
 def init_models():
     """Initialize/check LLM models if needed. Currently a placeholder."""
     # You can add model download/check logic here if needed.
     logger.info("init_models called (no-op placeholder).")
-init_models()
 
+# Services used by the views. Constructing them is cheap: the LLM server is
+# probed on first use, and the event bus connects on first publish/subscribe.
+llm = LLMHandler()
 summarizer = Summarizer()
+login_throttle = LoginThrottle()
+backups = BackupService(shard_router)
+profiles = None  # built by create_app() from CONFIG
+_event_bus = None
+_event_bus_lock = threading.Lock()
+
+def get_event_bus():
+    global _event_bus
+    with _event_bus_lock:
+        if _event_bus is None:
+            _event_bus = create_event_bus(CONFIG['EVENT_BUS_URL'])
+        return _event_bus
+
+# Slide extraction and PDF jobs; handlers are registered next to their views
+jobs = JobQueue(publish=lambda user_id, event: get_event_bus().publish(user_id, event))
+# Videos and extracted slides, shared by everyone who extracts the same lecture
+slide_store = SlideStore()
+
+# Views register on this blueprint; create_app() adds it to the app
+views = Blueprint('views', __name__)
+
+def create_app(config: Optional[dict] = None, preload: bool = False) -> Flask:
+    """Build the app: config, routes and the database schema, nothing slower.
+
+    Views read the module-level CONFIG and services, so this is meant to be
+    called once per process. It also starts the per-process services
+    (start_worker()), unless preload is set: a preloading server builds the
+    app once in the master and runs start_worker() in each worker after the
+    fork, since threads and process pools do not survive one.
+    """
+    global profiles
+    if config:
+        CONFIG.update(config)
+    configure_logging()
+    app = Flask(__name__)
+    app.secret_key = CONFIG['SECRET_KEY']
+    app.config['MAX_CONTENT_LENGTH'] = CONFIG['MAX_VIDEO_UPLOAD_MB'] * 1024 * 1024
+    if CONFIG['TRUSTED_PROXIES']:
+        # request.remote_addr becomes the client's address as seen by the outermost proxy
+        hops = CONFIG['TRUSTED_PROXIES']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
+    app.register_blueprint(views)
+
+    init_db()
+    init_models()
+    profiles = ProfileService(lambda user_id: get_db_connection(user_id=user_id), create_profile_store(
+        CONFIG['PROFILE_CACHE_URL'],
+        max_entries=CONFIG['PROFILE_CACHE_SIZE'],
+        ttl_seconds=CONFIG['PROFILE_CACHE_TTL_SECONDS']
+    ))
+    if CONFIG['BACKUP_IN_PROCESS']:
+        backups.start()
+    if not preload:
+        start_worker()
+    return app
+
+def start_worker():
+    """Per-process services that must not be inherited across a fork"""
+    # Fork the hashing workers now, before this process has request threads
+    password_hasher.start()
+    jobs.start()
+
+def stop_worker():
+    jobs.stop()
+    password_hasher.shutdown()
 
 def validate_email(email):
     """Validate email format"""
@@ -194,16 +196,38 @@ def validate_password(password):
         return False, "Password must contain at least one special character"
     return True, ""
 
-def get_db_connection(db_path=USER_DB_PATH):
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+def publish_progress_delta(user_id, progress=None, activity=None, recommendations=None):
+    """Push a dashboard update to the user's open progress streams"""
+    try:
+        get_event_bus().publish(user_id, {
+            'type': 'progress',
+            'progress': progress,
+            'activity': activity,
+            'recommendations': recommendations
+        })
+    except Exception as e:
+        logger.error(f"Failed to publish progress event: {str(e)}")
+
+def retry_later(status, retry_after, message):
+    """429/503 response telling the client when to try again"""
+    response = jsonify({'success': False, 'error': message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+def sqlite_timestamp():
+    """Current UTC time formatted like SQLite's CURRENT_TIMESTAMP"""
+    return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
 
 # Authentication Routes
-@app.route('/signup', methods=['GET', 'POST'])
+@views.route('/signup', methods=['GET', 'POST'])
 def signup():
     if request.method == 'GET':
         return render_template('auth/signup.html')
+    retry_after = login_throttle.retry_after(request.remote_addr, None)
+    if retry_after:
+        return retry_later(429, retry_after, "Too many attempts, please try again later")
+    login_throttle.hit('ip', request.remote_addr)
     try:
         data = request.form if request.form else request.get_json()
         username = data.get('username', '').strip()
@@ -227,7 +251,9 @@ def signup():
             )
             if cursor.fetchone():
                 raise ValueError("Username or email already exists")
-            password_hash = generate_password_hash(password)
+        password_hash = password_hasher.hash(password)
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
             cursor.execute(
                 "INSERT INTO users (username, email, password_hash, is_verified) VALUES (?, ?, ?, ?)",
                 (username, email, password_hash, not CONFIG['REQUIRE_EMAIL_VERIFICATION'])
@@ -241,12 +267,17 @@ def signup():
             return jsonify({
                 'success': True,
                 'message': 'Registration successful',
-                'redirect': url_for('dashboard')
+                'redirect': url_for('views.dashboard')
             })
         return jsonify({
             'success': True,
             'message': 'Registration successful. Please check your email to verify your account.'
         })
+    except HashingBusy as e:
+        return retry_later(503, HashingBusy.retry_after, str(e))
+    except sqlite3.IntegrityError:
+        # Lost a race with another signup for the same name between check and insert
+        return jsonify({'success': False, 'error': "Username or email already exists"}), 400
     except Exception as e:
         logger.error(f"Signup error: {str(e)}")
         return jsonify({
@@ -254,7 +285,7 @@ def signup():
             'error': str(e)
         }), 400
 
-@app.route('/login', methods=['GET', 'POST'])
+@views.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'GET':
         return render_template('auth/login.html')
@@ -265,21 +296,35 @@ def login():
         remember_me = data.get('remember_me', False)
         if not username_or_email or not password:
             raise ValueError("Username/email and password are required")
+        account = username_or_email.lower()
+        # Shed guessing before it costs a hash
+        retry_after = login_throttle.retry_after(request.remote_addr, account)
+        if retry_after:
+            return retry_later(429, retry_after, "Too many attempts, please try again later")
+        login_throttle.hit('ip', request.remote_addr)
         with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
+            user = conn.execute(
                 "SELECT id, username, password_hash, is_verified FROM users WHERE username = ? OR email = ?",
                 (username_or_email, username_or_email)
-            )
-            user = cursor.fetchone()
-            if not user or not check_password_hash(user['password_hash'], password):
-                raise ValueError("Invalid credentials")
-            if CONFIG['REQUIRE_EMAIL_VERIFICATION'] and not user['is_verified']:
-                raise ValueError("Please verify your email before logging in")
-            cursor.execute(
-                "UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?",
-                (user['id'],)
-            )
+            ).fetchone()
+        if not user or not password_hasher.verify(user['password_hash'], password):
+            login_throttle.hit('account', account)
+            raise ValueError("Invalid credentials")
+        if CONFIG['REQUIRE_EMAIL_VERIFICATION'] and not user['is_verified']:
+            raise ValueError("Please verify your email before logging in")
+        # Upgrade hashes made with older or cheaper parameters while we have the password
+        new_hash = password_hasher.hash(password) if password_hasher.needs_rehash(user['password_hash']) else None
+        with get_db_connection() as conn:
+            if new_hash:
+                conn.execute(
+                    "UPDATE users SET password_hash = ?, last_login = CURRENT_TIMESTAMP WHERE id = ? AND password_hash = ?",
+                    (new_hash, user['id'], user['password_hash'])
+                )
+            else:
+                conn.execute(
+                    "UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?",
+                    (user['id'],)
+                )
             conn.commit()
         session['user_id'] = user['id']
         session['username'] = user['username']
@@ -287,8 +332,10 @@ def login():
         return jsonify({
             'success': True,
             'message': 'Login successful',
-            'redirect': url_for('dashboard')
+            'redirect': url_for('views.dashboard')
         })
+    except HashingBusy as e:
+        return retry_later(503, HashingBusy.retry_after, str(e))
     except Exception as e:
         logger.error(f"Login error: {str(e)}")
         return jsonify({
@@ -296,29 +343,29 @@ def login():
             'error': str(e)
         }), 401
 
-@app.route('/logout')
+@views.route('/logout')
 def logout():
     try:
         username = session.get('username', 'unknown')
         session.clear()
         logger.info(f"User logged out: {username}")
-        return redirect(url_for('login'))
+        return redirect(url_for('views.login'))
     except Exception as e:
         logger.error(f"Logout error: {str(e)}")
-        return redirect(url_for('login'))
+        return redirect(url_for('views.login'))
 
-@app.route('/')
+@views.route('/')
 def home():
     if 'user_id' in session:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('views.dashboard'))
     return render_template('home.html')
 
-@app.route('/dashboard')
+@views.route('/dashboard')
 def dashboard():
     if 'user_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('views.login'))
     try:
-        with get_db_connection() as conn:
+        with get_db_connection(user_id=session['user_id']) as conn:
             cursor = conn.cursor()
             cursor.execute(
                 "SELECT topic, correct_count, incorrect_count, avg_response_time FROM user_progress WHERE user_id = ?",
@@ -328,16 +375,16 @@ def dashboard():
         return render_template('dashboard.html', progress_data=progress_data)
     except Exception as e:
         logger.error(f"Dashboard error: {str(e)}")
-        return redirect(url_for('login'))
+        return redirect(url_for('views.login'))
 
-@app.route('/chatbot')
+@views.route('/chatbot')
 def chatbot():
     if 'user_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('views.login'))
     
     subject = request.args.get('subject', 'math').lower()
     if subject not in CONFIG['SUBJECT_MODELS']:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('views.dashboard'))
     
     initial_message = f"Welcome to the {subject.title()} learning session! Please specify a topic you'd like to learn about and select your grade level to begin."
     
@@ -348,7 +395,7 @@ def chatbot():
         username=session.get('username', 'User')
     )
 
-@app.route('/api/chat', methods=['POST'])
+@views.route('/api/chat', methods=['POST'])
 def handle_chat():
     if not llm.server_available:
         return jsonify({'error': 'Ollama server is not available. Chat functionality is disabled.'}), 503
@@ -372,7 +419,7 @@ def handle_chat():
         
         # Get the appropriate model and prompt template for the subject
         model = CONFIG['SUBJECT_MODELS'].get(subject, CONFIG['SUBJECT_MODELS']['math'])
-        prompt_template = PROMPT_TEMPLATES.get(subject, PROMPT_TEMPLATES['math'])
+        prompt_template = prompt_templates().get(subject, prompt_templates()['math'])
         
         # Map difficulty levels to more specific descriptions
         difficulty_mapping = {
@@ -413,51 +460,32 @@ def handle_chat():
             "6. Do not label steps or include instructions to yourself in the response."
         )
         
-        # Get user's interests and learning style if available
+        # Personalise from the cached tutoring profile (preferences and topic success rate)
         try:
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('SELECT interests, learning_style FROM user_preferences WHERE user_id = ?', (user_id,))
-                user_prefs = cursor.fetchone()
-                
-                if user_prefs:
-                    interests = user_prefs[0]
-                    learning_style = user_prefs[1]
-                    
-                    # Append personalization to the system prompt
-                    if interests:
-                        system_prompt += f" This student has expressed interest in {interests}. Try to connect examples to these interests when relevant."
-                        
-                    if learning_style:
-                        system_prompt += f" This student tends to learn best through {learning_style} approaches."
+            profile = profiles.get(user_id)
+            interests = profile['interests']
+            learning_style = profile['learning_style']
+
+            # Append personalization to the system prompt
+            if interests:
+                system_prompt += f" This student has expressed interest in {interests}. Try to connect examples to these interests when relevant."
+
+            if learning_style:
+                system_prompt += f" This student tends to learn best through {learning_style} approaches."
+
+            if profile['preferred_explanation_style'] == 'simplified':
+                system_prompt += " This student has found earlier explanations hard to follow. Use shorter sentences, simpler vocabulary and one idea at a time."
+
+            success_rate = profiles.success_rate(user_id, topic)
+            if success_rate is not None:
+                # Customize difficulty based on past performance
+                if success_rate > 0.8:
+                    system_prompt += f" The student seems to be performing well on this topic (success rate: {success_rate:.0%}). Consider introducing more challenging concepts."
+                elif success_rate < 0.4:
+                    system_prompt += f" The student seems to be struggling with this topic (success rate: {success_rate:.0%}). Focus on building foundational understanding with extra examples."
         except Exception as db_error:
             # If there's an error, just continue without the personalization
-            logger.error(f"Failed to fetch user preferences: {str(db_error)}")
-
-        # Get performance data on this topic if available
-        try:
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT AVG(is_correct) as success_rate 
-                    FROM interactions 
-                    WHERE user_id = ? AND topic LIKE ?
-                    GROUP BY user_id
-                ''', (user_id, f"%{topic}%"))
-                
-                result = cursor.fetchone()
-                
-                if result and result[0] is not None:
-                    success_rate = result[0]
-                    
-                    # Customize difficulty based on past performance
-                    if success_rate > 0.8:
-                        system_prompt += f" The student seems to be performing well on this topic (success rate: {success_rate:.0%}). Consider introducing more challenging concepts."
-                    elif success_rate < 0.4:
-                        system_prompt += f" The student seems to be struggling with this topic (success rate: {success_rate:.0%}). Focus on building foundational understanding with extra examples."
-        except Exception as db_error:
-            # If there's an error, just continue without the performance data
-            logger.error(f"Failed to fetch performance data: {str(db_error)}")
+            logger.error(f"Failed to load tutoring profile: {str(db_error)}")
         
         # Handle different stages of the teaching conversation
         if chat_stage == 'introduction':
@@ -629,22 +657,36 @@ Write directly to the student in a conversational tone. Do NOT include teaching
         
         # Record interaction in database
         try:
-            with get_db_connection() as conn:
+            with get_db_connection(user_id=user_id) as conn:
                 cursor = conn.cursor()
+                topic_id = TopicIndex.resolve(conn, topic)
                 cursor.execute('''
                     INSERT INTO interactions 
-                    (user_id, topic, question, answer, is_correct, response_time, model_used)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    (user_id, topic, topic_id, question, answer, is_correct, response_time, model_used)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                 ''', (
                     user_id,
                     topic,
+                    topic_id,
                     user_message[:500],  # Limit length to prevent DB issues
                     llm_response[:500],   # Limit length to prevent DB issues
                     True,                 # Default to True for chat interactions
                     data.get('response_time', 0),
                     model
                 ))
+                TopicIndex.record_result(conn, user_id, topic_id, True)
                 conn.commit()
+            profiles.record_result(user_id, topic, True)
+            publish_progress_delta(user_id, activity={
+                'activity_type': 'interaction',
+                'topic': topic,
+                'question': user_message[:500],
+                'user_answer': llm_response[:500],
+                'correct_answer': '',
+                'is_correct': True,
+                'response_time': data.get('response_time', 0),
+                'timestamp': sqlite_timestamp()
+            })
         except Exception as db_error:
             logger.error(f"Failed to record interaction: {str(db_error)}")
         
@@ -747,7 +789,7 @@ def clean_teacher_instructions(text):
     return cleaned_text
 
 
-@app.route('/api/feedback', methods=['POST'])
+@views.route('/api/feedback', methods=['POST'])
 def handle_feedback():
     """Endpoint to collect student feedback on the tutoring experience"""
     if 'user_id' not in session:
@@ -765,8 +807,8 @@ def handle_feedback():
         if not interaction_id or not helpful_rating or not clarity_rating or not engagement_rating:
             return jsonify({'error': 'Missing required feedback fields'}), 400
         
-        # Store feedback in database
-        with get_db_connection() as conn:
+        # Store feedback and any resulting preference change in one transaction
+        with get_db_connection(user_id=user_id) as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT INTO feedback
@@ -780,19 +822,17 @@ def handle_feedback():
                 engagement_rating,
                 comments
             ))
-            conn.commit()
         
-        # Use feedback to adjust teaching approach for this student
-        if helpful_rating < 3 or clarity_rating < 3:
-            # If ratings are low, adjust student preferences to simplify explanations
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
+            # Use feedback to adjust teaching approach for this student
+            if helpful_rating < 3 or clarity_rating < 3:
+                # If ratings are low, adjust student preferences to simplify explanations
                 cursor.execute('''
                     UPDATE user_preferences
                     SET preferred_explanation_style = 'simplified'
                     WHERE user_id = ?
                 ''', (user_id,))
-                conn.commit()
+            conn.commit()
+        profiles.invalidate(user_id)
         
         return jsonify({'success': True, 'message': 'Feedback recorded successfully'})
         
@@ -802,7 +842,7 @@ def handle_feedback():
             'error': f"An error occurred while processing your feedback: {str(e)}"
         }), 500
 
-@app.route('/api/rapid_quiz', methods=['POST'])
+@views.route('/api/rapid_quiz', methods=['POST'])
 def rapid_quiz():
     if not llm.server_available:
         return jsonify({'error': 'Ollama server is not available.'}), 503
@@ -818,7 +858,7 @@ def rapid_quiz():
             
         # Get the appropriate model and prompt template
         model = CONFIG['SUBJECT_MODELS'][subject]
-        prompt_template = PROMPT_TEMPLATES.get(subject)
+        prompt_template = prompt_templates().get(subject)
         
         # Modified prompt for more reliable JSON generation
         formatted_prompt = LLMHandler.format_prompt(
@@ -929,7 +969,7 @@ Ensure the correct_answer exactly matches one of the option values."""
         logger.error(f"Rapid quiz error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/save_rapid_quiz', methods=['POST'])
+@views.route('/api/save_rapid_quiz', methods=['POST'])
 def save_rapid_quiz():
     """Save the results of a rapid quiz to the database."""
     try:
@@ -952,15 +992,16 @@ def save_rapid_quiz():
             return jsonify({'status': 'error', 'message': 'Missing required data'}), 400
             
         try:
-            with get_db_connection() as conn:
+            with get_db_connection(user_id=user_id) as conn:
                 # Save to rapid quiz responses
                 cursor = conn.cursor()
+                topic_id = TopicIndex.resolve(conn, topic)
                 cursor.execute('''
                     INSERT INTO rapid_quiz_responses
-                    (user_id, topic, question, user_answer, correct_answer, is_correct, response_time, timestamp)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                    (user_id, topic, topic_id, question, user_answer, correct_answer, is_correct, response_time, timestamp)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
                 ''', (
-                    user_id, topic, question, user_answer, correct_answer, is_correct, response_time
+                    user_id, topic, topic_id, question, user_answer, correct_answer, is_correct, response_time
                 ))
                 
                 # Update user progress
@@ -975,32 +1016,56 @@ def save_rapid_quiz():
                         UPDATE user_progress
                         SET correct_count = correct_count + ?,
                             incorrect_count = incorrect_count + ?,
-                            avg_response_time = (avg_response_time + ?) / 2
+                            avg_response_time = (avg_response_time + ?) / 2,
+                            topic_id = ?
                         WHERE user_id = ? AND topic = ?
                     ''', (
                         1 if is_correct else 0,
                         0 if is_correct else 1,
                         response_time,
+                        topic_id,
                         user_id,
                         topic
                     ))
                 else:
                     cursor.execute('''
                         INSERT INTO user_progress
-                        (user_id, topic, correct_count, incorrect_count, avg_response_time)
-                        VALUES (?, ?, ?, ?, ?)
+                        (user_id, topic, topic_id, correct_count, incorrect_count, avg_response_time)
+                        VALUES (?, ?, ?, ?, ?, ?)
                     ''', (
                         user_id,
                         topic,
+                        topic_id,
                         1 if is_correct else 0,
                         0 if is_correct else 1,
                         response_time
                     ))
+                cursor.execute('''
+                    SELECT topic, correct_count, incorrect_count, avg_response_time
+                    FROM user_progress
+                    WHERE user_id = ? AND topic = ?
+                ''', (user_id, topic))
+                progress_row = dict(cursor.fetchone())
+                mastery = MasteryIndex.update(conn, user_id, topic_id, topic, is_correct, response_time)
+                recommendations = MasteryIndex.recommendations(conn, user_id)
                 conn.commit()
+            profiles.invalidate(user_id)
+
+            publish_progress_delta(user_id, progress=progress_row, activity={
+                'activity_type': 'rapid_quiz',
+                'topic': topic,
+                'question': question,
+                'user_answer': user_answer,
+                'correct_answer': correct_answer,
+                'is_correct': is_correct,
+                'response_time': response_time,
+                'timestamp': sqlite_timestamp()
+            }, recommendations=recommendations)
                 
             return jsonify({
                 'status': 'success',
-                'message': 'Rapid quiz result saved successfully'
+                'message': 'Rapid quiz result saved successfully',
+                'mastery': mastery['mastery'] if mastery else None
             })
         except sqlite3.Error as e:
             logger.error(f"Database error saving rapid quiz: {str(e)}")
@@ -1010,7 +1075,7 @@ def save_rapid_quiz():
         logger.error(f"Error saving rapid quiz result: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/heartbeat')
+@views.route('/api/heartbeat')
 def heartbeat():
     """API endpoint to check if the server is running."""
     return jsonify({
@@ -1020,7 +1085,7 @@ def heartbeat():
         'ollama_available': llm.server_available
     })
 
-@app.route('/api/generate_test', methods=['POST'])
+@views.route('/api/generate_test', methods=['POST'])
 def generate_test():
     if not llm.server_available:
         return jsonify({"error": "Ollama server is not available. Test generation cannot proceed."}), 503
@@ -1043,7 +1108,7 @@ def generate_test():
         if not isinstance(question_count, int) or question_count <= 0:
             return jsonify({"error": "Count must be a positive integer"}), 400
         model = CONFIG['SUBJECT_MODELS'].get(subject)
-        prompt_template = PROMPT_TEMPLATES.get(subject)
+        prompt_template = prompt_templates().get(subject)
         if not prompt_template:
             logger.error(f"No prompt template found for subject: {subject}")
             return jsonify({"error": "Configuration error"}), 500
@@ -1154,7 +1219,7 @@ Return the result as a JSON array with this structure:
                     logger.warning(f"Question {i} correct answer '{q['correct_answer']}' not in options")
                     q['correct_answer'] = q['options'][0]
             
-            return jsonify(questions_data)
+            return jsonify(issue_test(subject, topic, questions_data))
             
         except Exception as e:
             logger.error(f"Failed to parse questions data: {str(e)}")
@@ -1165,19 +1230,94 @@ Return the result as a JSON array with this structure:
                 "correct_answer": "Concept A",
                 "explanation": f"This is a fallback question. The AI response could not be parsed: {str(e)}"
             }]
-            return jsonify(fallback_questions)
+            return jsonify(issue_test(subject, topic, fallback_questions))
             
     except Exception as e:
         logger.error(f"Error in generate_test: {str(e)}")
         return jsonify({"error": f"Failed to generate test: {str(e)}"}), 500
 
-@app.route('/api/get_analytics')
+def issue_test(subject, topic, questions):
+    """Keep the answer key server-side and hand out the questions only"""
+    questions = [q for q in questions if isinstance(q, dict)]
+    test_id = None
+    if 'user_id' in session:
+        with get_db_connection(user_id=session['user_id']) as conn:
+            test_id = Assessments.store(conn, session['user_id'], subject, topic, questions)
+            conn.commit()
+    return {
+        'test_id': test_id,
+        'subject': subject,
+        'topic': topic,
+        'questions': Assessments.public_questions(questions)
+    }
+
+@views.route('/api/submit_test', methods=['POST'])
+def submit_test():
+    """Grade a generated test and record every answer in one transaction"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    user_id = session['user_id']
+    data = request.get_json(silent=True) or {}
+    test_id = data.get('test_id')
+    answers = data.get('answers')
+    if not isinstance(test_id, int) or not isinstance(answers, list):
+        return jsonify({'error': 'test_id and a list of answers are required'}), 400
+    try:
+        with get_db_connection(user_id=user_id) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            summary = Assessments.submit(conn, user_id, test_id, answers)
+            recommendations = MasteryIndex.recommendations(conn, user_id)
+            conn.commit()
+    except TestNotFound as e:
+        return jsonify({'error': str(e)}), 404
+    except TestAlreadySubmitted as e:
+        return jsonify({'error': str(e)}), 409
+    except sqlite3.Error as e:
+        logger.error(f"Database error submitting test: {str(e)}")
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+    profiles.invalidate(user_id)
+
+    timestamp = sqlite_timestamp()
+    for result in summary['results']:
+        publish_progress_delta(user_id, activity={
+            'activity_type': 'rapid_quiz',
+            'topic': summary['topic'],
+            'question': result['question'],
+            'user_answer': result['user_answer'],
+            'correct_answer': result['correct_answer'],
+            'is_correct': result['is_correct'],
+            'response_time': result['response_time'] or 0,
+            'timestamp': timestamp
+        })
+    publish_progress_delta(user_id, progress=summary['progress'], recommendations=recommendations)
+    return jsonify(summary)
+
+@views.route('/api/user_progress', methods=['GET', 'POST'])
+def user_progress():
+    """Mastery, counters and recommendations for one topic, read from the aggregates"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+    else:
+        data = request.args
+    topic = (data.get('topic') or '').strip()
+    if not topic:
+        return jsonify({'error': 'Topic is required'}), 400
+    try:
+        with get_db_connection(user_id=session['user_id']) as conn:
+            return jsonify(Assessments.topic_progress(conn, session['user_id'], topic))
+    except Exception as e:
+        logger.error(f"User progress error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@views.route('/api/get_analytics')
 def get_analytics():
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     user_id = session['user_id']
     try:
-        with get_db_connection() as conn:
+        with get_db_connection(user_id=user_id) as conn:
             cursor = conn.cursor()
             
             # Get all subjects first
@@ -1236,6 +1376,7 @@ def get_analytics():
             return jsonify({
                 'progress': progress_data,
                 'recent_activities': recent_activities,
+                'recommendations': MasteryIndex.recommendations(conn, user_id),
                 'subjects': subjects
             })
     except Exception as e:
@@ -1243,11 +1384,133 @@ def get_analytics():
         return jsonify({
             'progress': [],
             'recent_activities': [],
+            'recommendations': [],
             'subjects': list(CONFIG['SUBJECT_MODELS'].keys()),
             'message': 'Start a learning session to see your progress!'
         })
 
-@app.route('/api/summarize', methods=['POST'])
+@views.route('/api/activity')
+def get_activity():
+    """Cursor-paginated activity history for the recent activity page"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    try:
+        limit = request.args.get('limit', 20, type=int)
+        with get_db_connection(user_id=session['user_id']) as conn:
+            page = ActivityFeed.fetch_page(
+                conn,
+                session['user_id'],
+                limit=limit,
+                cursor=request.args.get('cursor'),
+                activity_type=request.args.get('type'),
+                subject=request.args.get('subject'),
+                since=request.args.get('since'),
+                until=request.args.get('until'),
+                archive=ActivityArchive(shard_router.archive_dir_for(shard_router.path_for(session['user_id'])))
+            )
+        return jsonify(page)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Activity history error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@views.route('/api/search')
+def search_interactions():
+    """Full-text search over the logged-in user's past tutoring conversations"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    text = request.args.get('q', '').strip()
+    if not text:
+        return jsonify({'error': 'Query parameter q is required'}), 400
+    try:
+        with get_db_connection(user_id=session['user_id']) as conn:
+            results = InteractionSearch.search(
+                conn,
+                session['user_id'],
+                text,
+                limit=request.args.get('limit', 20, type=int),
+                topic=request.args.get('topic'),
+                since=request.args.get('since')
+            )
+        return jsonify({'query': text, 'results': results})
+    except Exception as e:
+        logger.error(f"Search error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@views.route('/api/progress_stream')
+def progress_stream():
+    """Server-sent events stream of progress deltas for the logged-in user.
+
+    The stream only carries what the write paths publish, so an idle
+    dashboard costs no database queries; comment lines keep proxies from
+    closing the connection.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    user_id = session['user_id']
+    heartbeat_seconds = CONFIG['SSE_HEARTBEAT_SECONDS']
+
+    def stream():
+        subscription = get_event_bus().subscribe(user_id)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                event = subscription.get(timeout=heartbeat_seconds)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event.get('type', 'message')}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            subscription.close()
+
+    return Response(
+        stream_with_context(stream()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@views.route('/api/export')
+def export_records():
+    """Stream learning records as CSV or NDJSON, optionally gzipped.
+
+    Holders of the export token may pick any users (e.g. a class roster via
+    repeated user_id params); a logged-in student only gets their own rows.
+    The X-Export-Watermark header is the `since` value for the next
+    incremental export.
+    """
+    token = CONFIG['EXPORT_API_TOKEN']
+    auth = request.headers.get('Authorization', '')
+    if token and hmac.compare_digest(auth, f"Bearer {token}"):
+        user_ids = request.args.getlist('user_id', type=int) or None
+    elif 'user_id' in session:
+        user_ids = [session['user_id']]
+    else:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    fmt = request.args.get('format', 'ndjson')
+    tables = request.args.getlist('table') or list(EXPORT_TABLES)
+    compress = request.args.get('gzip', '0').lower() in ('1', 'true', 'yes')
+    exporter = RecordExporter(shard_router, replicas=backups)
+    until = exporter.watermark(user_ids)
+    try:
+        chunks = exporter.stream(tables, fmt, until, request.args.get('since'), user_ids, compress)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    filename = f"{tables[0] if fmt == 'csv' else 'edux_export'}.{fmt}" + ('.gz' if compress else '')
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(chunks),
+        mimetype='application/gzip' if compress else mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'X-Export-Watermark': until,
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@views.route('/api/summarize', methods=['POST'])
 def summarize_text():
     try:
         data = request.get_json()
@@ -1259,235 +1522,278 @@ def summarize_text():
         logger.error(f"Summarization error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/recent-activity')
+@views.route('/recent-activity')
 def recent_activity():
     return render_template('recent_activity.html')
 
-@app.route('/text-summarizer')
+@views.route('/text-summarizer')
 def text_summarizer():
     return render_template('text_summarizer.html')
 
-@app.route('/youtube-extractor')
+@views.route('/youtube-extractor')
 def youtube_extractor():
     return render_template('youtube_extractor.html')
 
-@app.errorhandler(404)
+@views.app_errorhandler(404)
 def page_not_found(e):
     return render_template('errors/404.html'), 404
 
-@app.errorhandler(500)
+@views.app_errorhandler(500)
 def internal_error(e):
     return render_template('errors/500.html'), 500
 
-class SlideExtractor:
-    def __init__(self, video_url, output_dir="static/slides", interval=5, similarity_threshold=0.9, ocr_confidence=30):
-        self.video_url = video_url
-        self.output_dir = output_dir
-        self.interval = interval
-        self.similarity_threshold = similarity_threshold
-        self.ocr_confidence = ocr_confidence
-        self.video_path = os.path.join(self.output_dir, "temp_video.mp4")
-        self.previous_text = ""
-
-        os.makedirs(self.output_dir, exist_ok=True)
-
-    def download_video(self):
-        """Download the YouTube video using yt-dlp"""
-        try:
-            command = [
-                "yt-dlp",
-                "-f", "best[ext=mp4]",
-                "-o", self.video_path,
-                self.video_url
-            ]
-            result = subprocess.run(command, capture_output=True, text=True)
-
-            if result.returncode == 0:
-                print(f"Video downloaded to: {self.video_path}")
-                return True
-            else:
-                print(f"yt-dlp error:\n{result.stderr}")
-                return False
-        except Exception as e:
-            print(f"Error downloading video: {e}")
-            return False
-
-    def extract_slides(self):
-        """Process the video to extract slides"""
-        if not os.path.exists(self.video_path):
-            if not self.download_video():
-                return False
-
-        cap = cv2.VideoCapture(self.video_path)
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        frame_interval = int(fps * self.interval)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        duration = total_frames / fps
-
-        print(f"Video duration: {timedelta(seconds=duration)}")
-        print(f"Processing frames every {self.interval} seconds...")
-
-        prev_frame = None
-        slide_count = 0
-
-        for frame_num in range(0, total_frames, frame_interval):
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
-            ret, frame = cap.read()
-
-            if not ret:
-                continue
-
-            current_time = frame_num / fps
-            timestamp = str(timedelta(seconds=current_time)).split(".")[0]
-
-            if prev_frame is None:
-                self._save_slide(frame, timestamp, slide_count)
-                prev_frame = frame
-                slide_count += 1
-                continue
-
-            if self._is_different_slide(prev_frame, frame):
-                self._save_slide(frame, timestamp, slide_count)
-                prev_frame = frame
-                slide_count += 1
-
-        cap.release()
-        print(f"Extracted {slide_count} slides to {self.output_dir}")
-        return True
-
-    def _is_different_slide(self, frame1, frame2):
-        gray1 = cv2.cvtColor(frame1, cv2.COLOR_BGR2GRAY)
-        gray2 = cv2.cvtColor(frame2, cv2.COLOR_BGR2GRAY)
-
-        similarity, _ = ssim(gray1, gray2, full=True)
-        if similarity < self.similarity_threshold:
-            return True
-
-        text1 = self._extract_text(frame1)
-        text2 = self._extract_text(frame2)
-
-        if text1 and text2:
-            words1 = set(text1.split())
-            words2 = set(text2.split())
-            common_words = words1.intersection(words2)
-            diff_ratio = 1 - len(common_words) / max(len(words1), len(words2))
-
-            if diff_ratio > 0.3:
-                return True
-
-        return False
-
-    def _extract_text(self, frame):
-        try:
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            _, threshold = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY)
-
-            temp_image_path = os.path.join(self.output_dir, "temp_ocr.png")
-            cv2.imwrite(temp_image_path, threshold)
-
-            text = pytesseract.image_to_string(Image.open(temp_image_path), config='--psm 6')
-            return text.strip()
-        except Exception as e:
-            print(f"OCR error: {e}")
-            return ""
-
-    def _save_slide(self, frame, timestamp, count):
-        filename = f"slide_{count:03d}_{timestamp.replace(':', '-')}.png"
-        path = os.path.join(self.output_dir, filename)
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        pil_image = Image.fromarray(rgb_frame)
-        pil_image.save(path)
-        print(f"Saved slide: {filename}")
-
-    def convert_slides_to_pdf(self, pdf_name="slides_output.pdf"):
-        """Convert all extracted slides to a single PDF file."""
-        image_files = sorted([
-            os.path.join(self.output_dir, file)
-            for file in os.listdir(self.output_dir)
-            if file.lower().endswith(".png") and file.startswith("slide_")
-        ])
+def static_url(path):
+    """URL of a file under static/, for job results built outside a request"""
+    return '/' + os.path.relpath(path).replace(os.sep, '/')
+
+def run_slide_extraction(job, report):
+    """Job handler: point the job at the shared slides of its video, extracting them on a miss"""
+    from modules.slides import SLIDE_WORKERS, SlideExtractor  # OpenCV & co. load on first use
+    from modules.ocr import OCR_WORKERS
+    params = job['params']
+    # Up to max_running extractions run at once; each gets its share of the CPUs
+    cpu_share = max(1, (os.cpu_count() or 1) // jobs.max_running)
+    source = params.get('source') or video_key(params['video_url'])
+    key = result_key(source, {'interval': params['interval'], 'threshold': params['threshold']})
+    built = []
+
+    def wait():
+        report(0, None, stage='waiting')
+
+    def build(output_dir, keepalive):
+        built.append(output_dir)
+        extractor = SlideExtractor(
+            video_url=params.get('video_url'),
+            output_dir=output_dir,
+            interval=params['interval'],
+            similarity_threshold=params['threshold'],
+            workers=min(SLIDE_WORKERS, cpu_share),
+            ocr_workers=min(OCR_WORKERS, cpu_share)
+        )
+        extracted = []
+
+        def progress(*args, **details):
+            keepalive()
+            report(*args, **details)
+
+        def download(path):
+            if not extractor.video_url:
+                return False  # an upload evicted before its job ran
+            extractor.video_path = path
+            if extractor.decoder == 'ffmpeg':
+                # Analyze the video while it downloads
+                extracted.append(extractor.extract_slides(progress=progress))
+                return extracted[0] and os.path.exists(path)
+            report(0, None, stage='downloading', slides=0)
+            return extractor.download_video()
+
+        with slide_store.video(source, download, wait) as video_path:
+            if not extracted:
+                extractor.video_path = video_path
+                extracted.append(extractor.extract_slides(progress=progress))
+        if not extracted[0]:
+            raise RuntimeError('Failed to extract slides')
+        return {'slides': [{'time': slide['time'], 'file': os.path.basename(slide['path']), 'text': slide['text'],
+                            'duplicate_of': slide.get('duplicate_of')} for slide in extractor.slides]}
+
+    manifest = slide_store.result(key, build, wait)
+    slide_store.add_view(job['user_id'], job['id'], key)
+    slides = manifest['slides']
+    repeats = sum(slide.get('duplicate_of') is not None for slide in slides)
+    return {
+        'result_key': key,
+        'cached': not built,
+        'slides': [{'time': slide['time'], 'url': static_url(os.path.join(manifest['path'], slide['file'])),
+                    'text': slide['text'], 'duplicate_of': slide.get('duplicate_of')} for slide in slides],
+        'unique_slides': len(slides) - repeats,
+        'dedup_ratio': repeats / len(slides) if slides else 0.0
+    }
 
-        if not image_files:
-            print("No slide images found to convert.")
-            return
+def run_slides_pdf(job, report):
+    """Job handler: build the PDF of a finished extraction, once per shared result"""
+    from modules.slides import SlideExtractor
+    view = slide_store.view(job['params']['extraction_id'], job['user_id'])
+    if view is None:
+        raise RuntimeError('No slides found')
+    page_size = job['params'].get('page_size', 'fit')
+    name = 'slides_output' if page_size == 'fit' else f"slides_output_{page_size.replace(':', 'x')}"
+    pdf_path = os.path.join(view['path'], f'{name}.pdf')
+    if not os.path.exists(pdf_path):
+        # Built under a private name, as other users may want the same PDF
+        staging = SlideExtractor(output_dir=view['path']).convert_slides_to_pdf(
+            f"{name}.{job['id']}.pdf", page_size=page_size,
+            texts={slide['file']: slide['text'] for slide in view['slides']}, progress=report
+        )
+        if not staging or not os.path.exists(staging):
+            raise RuntimeError('Failed to generate PDF')
+        os.replace(staging, pdf_path)
+        slide_store.refresh_size(view['key'])
+    return {'pdf_url': static_url(pdf_path)}
 
-        images = [Image.open(img).convert("RGB") for img in image_files]
-        pdf_path = os.path.join(self.output_dir, pdf_name)
-        images[0].save(pdf_path, save_all=True, append_images=images[1:])
-        print(f"PDF created at: {pdf_path}")
-        return pdf_path
+jobs.register('extract_slides', run_slide_extraction)
+jobs.register('slides_pdf', run_slides_pdf)
 
-@app.route('/api/extract_slides', methods=['POST'])
+def job_accepted(job):
+    return jsonify({
+        'success': True,
+        'job': job,
+        'status_url': url_for('views.get_job', job_id=job['id']),
+        'events_url': url_for('views.job_events', job_id=job['id'])
+    }), 202
+
+VIDEO_UPLOAD_EXTENSIONS = ('.mp4', '.m4v', '.mov', '.mkv', '.webm', '.avi')
+
+def store_upload(upload):
+    """Put an uploaded video into the slide store; returns its source key"""
+    os.makedirs(slide_store.video_dir, exist_ok=True)
+    temp_path = os.path.join(slide_store.video_dir, f'upload.{os.urandom(8).hex()}.tmp')
+    upload.save(temp_path)
+    try:
+        source = file_key(temp_path)
+        # Already there if anyone uploaded the same file before
+        with slide_store.video(source, lambda path: os.replace(temp_path, path) is None):
+            pass
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return source
+
+@views.route('/api/extract_slides', methods=['POST'])
 def extract_slides():
-    """API endpoint to extract slides from a YouTube video"""
+    """Queue slide extraction from a YouTube video or an uploaded file (field 'video'); progress via /api/jobs/<id>"""
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
 
     try:
-        data = request.get_json()
-        video_url = data.get('video_url')
-        interval = data.get('interval', 5)
-        threshold = data.get('threshold', 0.9)
-
-        if not video_url:
-            return jsonify({'error': 'Video URL is required'}), 400
-
-        # Create output directory for this user
-        user_output_dir = os.path.join('static', 'slides', str(session['user_id']))
-        os.makedirs(user_output_dir, exist_ok=True)
-
-        # Initialize and run the slide extractor
-        extractor = SlideExtractor(
-            video_url=video_url,
-            output_dir=user_output_dir,
-            interval=interval,
-            similarity_threshold=threshold
-        )
-
-        if extractor.extract_slides():
-            return jsonify({
-                'success': True,
-                'message': 'Slides extracted successfully',
-                'output_dir': user_output_dir
-            })
+        upload = request.files.get('video')
+        data = request.form if upload else (request.get_json(silent=True) or {})
+        params = {
+            'interval': float(data.get('interval', 5)),
+            'threshold': float(data.get('threshold', 0.9))
+        }
+        if upload:
+            if not upload.filename.lower().endswith(VIDEO_UPLOAD_EXTENSIONS):
+                return jsonify({'error': f"Video must be one of {', '.join(VIDEO_UPLOAD_EXTENSIONS)}"}), 400
+            params.update(source=store_upload(upload), filename=upload.filename)
         else:
-            return jsonify({'error': 'Failed to extract slides'}), 500
-
+            video_url = (data.get('video_url') or '').strip()
+            if not video_url:
+                return jsonify({'error': 'Video URL or file is required'}), 400
+            params['video_url'] = video_url
+        return job_accepted(jobs.submit(session['user_id'], 'extract_slides', params))
+
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid parameters: {str(e)}'}), 400
     except Exception as e:
         logger.error(f"Slide extraction error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/generate_slides_pdf', methods=['POST'])
+@views.route('/api/generate_slides_pdf', methods=['POST'])
 def generate_slides_pdf():
-    """API endpoint to generate a PDF from extracted slides"""
+    """Queue a PDF of an extraction job's slides (default: the latest finished one)"""
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
 
     try:
-        user_output_dir = os.path.join('static', 'slides', str(session['user_id']))
-        
-        if not os.path.exists(user_output_dir):
-            return jsonify({'error': 'No slides found'}), 404
-
-        extractor = SlideExtractor(output_dir=user_output_dir)
-        pdf_path = extractor.convert_slides_to_pdf()
-
-        if pdf_path and os.path.exists(pdf_path):
-            return jsonify({
-                'success': True,
-                'message': 'PDF generated successfully',
-                'pdf_url': url_for('static', filename=f'slides/{session["user_id"]}/slides_output.pdf')
-            })
+        user_id = session['user_id']
+        data = request.get_json(silent=True) or {}
+        if data.get('job_id'):
+            extraction = jobs.get(data['job_id'], user_id)
         else:
-            return jsonify({'error': 'Failed to generate PDF'}), 500
+            extraction = jobs.latest(user_id, 'extract_slides', state='done')
+        if not extraction or extraction['kind'] != 'extract_slides' or extraction['state'] != 'done':
+            return jsonify({'error': 'No slides found'}), 404
+        from modules.pdf import PAGE_SIZES  # imports Pillow
+        page_size = data.get('page_size', 'fit')
+        if page_size not in PAGE_SIZES:
+            return jsonify({'error': f"page_size must be one of {', '.join(PAGE_SIZES)}"}), 400
+        return job_accepted(jobs.submit(user_id, 'slides_pdf', {'extraction_id': extraction['id'],
+                                                                'page_size': page_size}))
 
     except Exception as e:
         logger.error(f"PDF generation error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@views.route('/api/jobs')
+def list_jobs():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    return jsonify({'jobs': jobs.list(session['user_id'], kind=request.args.get('kind'),
+                                      state=request.args.get('state'),
+                                      limit=min(request.args.get('limit', 20, type=int), 100))})
+
+@views.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    job = jobs.get(job_id, session['user_id'])
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'job': job})
+
+@views.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    job = jobs.cancel(job_id, session['user_id'])
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'job': job})
+
+@views.route('/api/jobs/<job_id>', methods=['DELETE'])
+def delete_job(job_id):
+    """Forget a finished job; an extraction's slides go once no job refers to them"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    user_id = session['user_id']
+    job = jobs.get(job_id, user_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if not jobs.delete(job_id, user_id):
+        return jsonify({'error': 'Job is still running'}), 409
+    if job['kind'] == 'extract_slides':
+        slide_store.release_view(job_id, user_id)
+    return jsonify({'success': True})
+
+@views.route('/api/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-sent events with a job's state and progress until it finishes"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    user_id = session['user_id']
+    if jobs.get(job_id, user_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    heartbeat_seconds = CONFIG['SSE_HEARTBEAT_SECONDS']
+
+    def stream():
+        # Subscribe before reading the state so no update falls in between
+        subscription = get_event_bus().subscribe(user_id)
+        try:
+            job = jobs.get(job_id, user_id)
+            yield "retry: 5000\n\n"
+            yield f"event: job\ndata: {json.dumps(job)}\n\n"
+            while job['state'] not in FINAL_STATES:
+                event = subscription.get(timeout=heartbeat_seconds)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event.get('type') != 'job' or event['job']['id'] != job_id:
+                    continue
+                job = event['job']
+                yield f"event: job\ndata: {json.dumps(job)}\n\n"
+        finally:
+            subscription.close()
+
+    return Response(
+        stream_with_context(stream()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 if __name__ == '__main__':
     os.makedirs('templates/auth', exist_ok=True)
     os.makedirs('templates/errors', exist_ok=True)
     os.makedirs('static/css', exist_ok=True)
     os.makedirs('static/js', exist_ok=True)
+    app = create_app()
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
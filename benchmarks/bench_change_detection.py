@@ -0,0 +1,117 @@
+"""Full-resolution SSIM vs the tiered ChangeDetector on synthetic 1080p slide pairs.
+
+    python benchmarks/bench_change_detection.py [--pairs 200] [--seed 1]
+
+Pairs are drawn in lecture-like proportions: mostly the same slide with
+encoder noise, some with a moving cursor or an exposure shift, and a few
+real changes (a revealed bullet, one changed word, a new slide). Prints
+pairs/s for both detectors, the verdicts per kind of pair, and the
+ChangeDetector tier hit rates. 'similar' goes on to the OCR comparison in
+both; a changed pair is only lost if a detector calls it 'identical'.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from collections import Counter, defaultdict
+
+import cv2
+import numpy as np
+from skimage.metrics import structural_similarity as ssim
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.change_detection import ChangeDetector, DIFFERENT, SIMILAR  # noqa: E402
+
+SIZE = (1920, 1080)
+KINDS = [('same', 0.6, False), ('cursor', 0.12, False), ('exposure', 0.08, False),
+         ('bullet', 0.08, True), ('word', 0.06, True), ('new slide', 0.06, True)]
+
+
+def render(slide, lines, word='amet', cursor=None, offset=0, rng=None):
+    width, height = SIZE
+    frame = np.full((height, width, 3), 240, np.uint8)
+    cv2.putText(frame, f"Lecture slide {slide}", (120, 200), cv2.FONT_HERSHEY_SIMPLEX, 4, (30, 30, 30), 8)
+    for line in range(lines):
+        text = f"{slide}.{line} Lorem ipsum dolor sit {word if line == 0 else 'amet'}, consectetur"
+        cv2.putText(frame, text, (160, 380 + 100 * line), cv2.FONT_HERSHEY_SIMPLEX, 1.8, (50, 50, 50), 3)
+    if cursor:
+        cv2.circle(frame, cursor, 14, (0, 0, 230), -1)
+    frame = frame.astype(np.int16) + offset
+    if rng is not None:
+        frame += rng.normal(0, 2, frame.shape).astype(np.int16)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def make_pairs(count, seed):
+    rng = np.random.default_rng(seed)
+    picker = random.Random(seed)
+    kinds, weights = [k[0] for k in KINDS], [k[1] for k in KINDS]
+    pairs = []
+    for index in range(count):
+        kind = picker.choices(kinds, weights)[0]
+        slide = index % 40
+        before = render(slide, 5, rng=rng)
+        if kind == 'same':
+            after = render(slide, 5, rng=rng)
+        elif kind == 'cursor':
+            before = render(slide, 5, cursor=(400, 900), rng=rng)
+            after = render(slide, 5, cursor=(1400, 700), rng=rng)
+        elif kind == 'exposure':
+            after = render(slide, 5, offset=12, rng=rng)
+        elif kind == 'bullet':
+            after = render(slide, 6, rng=rng)
+        elif kind == 'word':
+            after = render(slide, 5, word='elit', rng=rng)
+        else:
+            after = render(slide + 1, 4, rng=rng)
+        pairs.append((kind, before, after))
+    return pairs
+
+
+def full_ssim(before, after, threshold):
+    gray1 = cv2.cvtColor(before, cv2.COLOR_BGR2GRAY)
+    gray2 = cv2.cvtColor(after, cv2.COLOR_BGR2GRAY)
+    similarity, _ = ssim(gray1, gray2, full=True)
+    return DIFFERENT if similarity < threshold else SIMILAR
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pairs', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--threshold', type=float, default=0.9)
+    args = parser.parse_args()
+
+    pairs = make_pairs(args.pairs, args.seed)
+    detector = ChangeDetector(args.threshold)
+    previous = [detector.signature(before) for _, before, _ in pairs]
+    verdicts = defaultdict(lambda: {'old': Counter(), 'new': Counter()})
+
+    started = time.perf_counter()
+    for kind, before, after in pairs:
+        verdicts[kind]['old'][full_ssim(before, after, args.threshold)] += 1
+    old_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for (kind, _, after), signature in zip(pairs, previous):
+        verdicts[kind]['new'][detector.compare(signature, detector.signature(after))] += 1
+    new_seconds = time.perf_counter() - started
+
+    print(f"{len(pairs)} pairs at {SIZE[0]}x{SIZE[1]}")
+    print(f"full SSIM       {len(pairs) / old_seconds:8.1f} pairs/s")
+    print(f"ChangeDetector  {len(pairs) / new_seconds:8.1f} pairs/s  ({old_seconds / new_seconds:.1f}x)")
+    print()
+    print(f"{'kind':<10} {'changed':>7}  {'full SSIM':<34} ChangeDetector")
+    for kind, _, changed in KINDS:
+        if kind in verdicts:
+            old = ', '.join(f"{v} {n}" for v, n in sorted(verdicts[kind]['old'].items()))
+            new = ', '.join(f"{v} {n}" for v, n in sorted(verdicts[kind]['new'].items()))
+            print(f"{kind:<10} {str(changed):>7}  {old:<34} {new}")
+    print()
+    print("tier hit rates: " + ", ".join(f"{tier} {rate:.0%}" for tier, rate in detector.hit_rates().items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""All-at-once Pillow PDF vs the streaming PdfWriter on synthetic 1080p slides.
+
+    python benchmarks/bench_pdf_assembly.py [--slides 500]
+
+Each variant runs in its own process so its peak resident memory can be
+measured; this prints peak RSS, wall time and PDF size per variant. The
+Pillow variant is what convert_slides_to_pdf did before: open every
+slide, then save them in one call.
+"""
+import os
+import sys
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SIZE = (1920, 1080)
+VARIANTS = {
+    'pillow': None,
+    'stream': dict(jpeg_quality=85, max_side=1920),
+    'stream-1280': dict(jpeg_quality=75, max_side=1280),
+    'stream-text': dict(jpeg_quality=85, max_side=1920, text=True),
+    'lossless': dict(jpeg_quality=None, max_side=None),
+}
+
+
+def write_slides(directory, count, seed=0):
+    rng = np.random.default_rng(seed)
+    width, height = SIZE
+    for n in range(count):
+        frame = np.full((height, width, 3), rng.integers(150, 250, 3).tolist(), np.uint8)
+        cv2.rectangle(frame, (0, 0), (width, 140), rng.integers(30, 120, 3).tolist(), -1)
+        cv2.putText(frame, f"Lecture slide {n + 1}", (60, 100), cv2.FONT_HERSHEY_SIMPLEX, 2.5, (255, 255, 255), 5)
+        for line in range(8):
+            cv2.putText(frame, f"- point {line + 1}: {rng.integers(10 ** 6)}", (100, 240 + line * 100),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1.8, (20, 20, 20), 3)
+        x, y = int(rng.integers(1100, 1500)), int(rng.integers(250, 600))
+        cv2.circle(frame, (x, y), 180, rng.integers(0, 255, 3).tolist(), -1)
+        cv2.imwrite(os.path.join(directory, f"slide_{n:03d}_0-00-00.png"), frame)
+
+
+def build(directory, variant):
+    """Runs in the child process"""
+    from PIL import Image
+    from modules.slides import SlideExtractor
+
+    files = sorted(name for name in os.listdir(directory) if name.startswith('slide_'))
+    pdf_path = os.path.join(directory, f'{variant}.pdf')
+    options = VARIANTS[variant]
+    if options is None:
+        images = [Image.open(os.path.join(directory, name)).convert('RGB') for name in files]
+        images[0].save(pdf_path, save_all=True, append_images=images[1:])
+    else:
+        options = dict(options)
+        texts = {name: '\n'.join(f'point {line}: text of {name}' for line in range(8)) for name in files} \
+            if options.pop('text', False) else None
+        extractor = SlideExtractor(output_dir=directory)
+        extractor.convert_slides_to_pdf(f'{variant}.pdf', texts=texts, **options)
+    return pdf_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--slides', type=int, default=500)
+    parser.add_argument('--child', nargs=2, metavar=('DIR', 'VARIANT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        import contextlib
+        with contextlib.redirect_stdout(sys.stderr):
+            pdf_path = build(*args.child)
+        print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, os.path.getsize(pdf_path))
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        write_slides(directory, args.slides)
+        print(f"{args.slides} slides of {SIZE[0]}x{SIZE[1]} written in {time.perf_counter() - started:.0f}s")
+        print(f"{'variant':<12} {'peak RSS':>10} {'seconds':>8} {'PDF size':>10}")
+        for variant in VARIANTS:
+            started = time.perf_counter()
+            result = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', directory, variant],
+                                    capture_output=True, text=True)
+            elapsed = time.perf_counter() - started
+            if result.returncode != 0:
+                print(f"{variant:<12} failed (exit {result.returncode}): {result.stderr.strip()[-200:]}")
+                continue
+            max_rss_kb, pdf_bytes = (int(value) for value in result.stdout.split())
+            print(f"{variant:<12} {max_rss_kb / 1024:>8.0f}MB {elapsed:>8.1f} {pdf_bytes / 1e6:>8.1f}MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Write throughput: one database file vs users split across shards.
+
+    python benchmarks/bench_shard_writes.py [--shards 4] [--workers 8] [--seconds 5]
+
+Each worker process plays one app worker saving quiz answers for random
+users, one transaction per answer as save_rapid_quiz does. The same load
+runs against a single file and then against --shards files created with
+ShardRouter.split. Files go to a temporary directory.
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import migrations  # noqa: E402
+from modules.shards import ShardRouter  # noqa: E402
+from modules.database import BUSY_TIMEOUT_SECONDS  # noqa: E402
+
+
+def writer(job):
+    catalog, users, seconds, seed = job
+    router = ShardRouter(catalog)
+    rng = random.Random(seed)
+    connections = {}
+    writes = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        user_id = rng.randint(1, users)
+        path = router.path_for(user_id)
+        if path not in connections:
+            connections[path] = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SECONDS)
+        conn = connections[path]
+        conn.execute('''
+            INSERT INTO rapid_quiz_responses
+            (user_id, topic, question, user_answer, correct_answer, is_correct, response_time)
+            VALUES (?, 'Fractions', 'What is 1/2 + 1/4?', '3/4', '3/4', 1, 4.2)
+        ''', (user_id,))
+        conn.execute('''
+            UPDATE user_progress SET correct_count = correct_count + 1
+            WHERE user_id = ? AND topic = 'Fractions'
+        ''', (user_id,))
+        conn.commit()
+        writes += 1
+    for conn in connections.values():
+        conn.close()
+    return writes
+
+
+def run(catalog, users, workers, seconds):
+    with Pool(workers) as pool:
+        counts = pool.map(writer, [(catalog, users, seconds, seed) for seed in range(workers)])
+    return sum(counts) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shards', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--users', type=int, default=4000)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        catalog = os.path.join(tmp, 'user_data.db')
+        migrations.upgrade(catalog)
+        conn = sqlite3.connect(catalog)
+        conn.executemany(
+            "INSERT INTO user_progress (user_id, topic, correct_count, incorrect_count) VALUES (?, 'Fractions', 0, 0)",
+            [(user_id,) for user_id in range(1, args.users + 1)]
+        )
+        conn.commit()
+        conn.close()
+
+        single = run(catalog, args.users, args.workers, args.seconds)
+
+        router = ShardRouter(catalog)
+        step = args.users // args.shards
+        for index in range(1, args.shards):
+            router.split(1 + index * step, os.path.join(tmp, f'shard_{index}.db'))
+        sharded = run(catalog, args.users, args.workers, args.seconds)
+
+    print(f"workers={args.workers} users={args.users:,}")
+    print(f"1 file:              {single:10,.0f} writes/s")
+    print(f"{args.shards} shards:            {sharded:10,.0f} writes/s")
+    print(f"scaling: {sharded / single:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
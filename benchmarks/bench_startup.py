@@ -0,0 +1,75 @@
+"""Startup cost: import time, create_app() and time to first request.
+
+    python benchmarks/bench_startup.py [--repeat 5]
+
+Every measurement runs in a fresh interpreter against a scratch database
+directory. "Worker boot" mimics a preloading server: the app is imported
+and built once, then a forked child serves its first request.
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COLD_START = '''
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app(preload=True)
+created = time.perf_counter()
+flask_app.test_client().get('/login')
+served = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create_app': created - imported,
+                  'first_request': served - created, 'total': served - started}))
+'''
+
+WORKER_BOOT = '''
+import os, json, time
+import app
+flask_app = app.create_app(preload=True)
+read_fd, write_fd = os.pipe()
+forked = time.perf_counter()
+pid = os.fork()
+if pid == 0:
+    app.start_worker()
+    flask_app.test_client().get('/login')
+    os.write(write_fd, str(time.perf_counter() - forked).encode())
+    app.stop_worker()
+    os._exit(0)
+os.waitpid(pid, 0)
+print(json.dumps({'worker_boot': float(os.read(read_fd, 64))}))
+'''
+
+
+def measure(script, db_dir):
+    env = dict(os.environ, EDUX_DATABASE_DIR=db_dir, EDUX_DB_PATH=os.path.join(db_dir, 'user_data.db'),
+               SECRET_KEY='bench')
+    output = subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as db_dir:
+        measure(COLD_START, db_dir)  # first run creates the schema and warms the OS file cache
+        runs = [measure(COLD_START, db_dir) for _ in range(args.repeat)]
+        runs += [measure(WORKER_BOOT, db_dir) for _ in range(args.repeat)]
+
+    print(f"median of {args.repeat} runs")
+    for key in ('import', 'create_app', 'first_request', 'total', 'worker_boot'):
+        values = [run[key] for run in runs if key in run]
+        print(f"{key:>14}: {statistics.median(values) * 1000:9.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Fixed-interval scans vs the adaptive transition search on a synthetic lecture.
+
+    python benchmarks/bench_transition_search.py [--minutes 10] [--seed 3] [--fade 0.5]
+
+The video is a deck of visually distinct slides shown for 8-90 s each,
+changing at arbitrary frames, once with hard cuts and once with
+crossfades of --fade seconds, whose in-between frames must not come out
+as slides. For each run this prints frames analyzed (samples plus
+targeted decodes between them), slides found against the true count,
+mean and worst error of the slide start times (the middle of a fade),
+and wall time.
+"""
+import io
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import contextlib
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.slides import SlideExtractor  # noqa: E402
+
+FPS = 30
+SIZE = (1280, 720)
+
+
+def render(slide, rng):
+    width, height = SIZE
+    tone = rng.integers(120, 250, 3).tolist()
+    frame = np.full((height, width, 3), tone, np.uint8)
+    for _ in range(4):
+        x, y = int(rng.integers(0, width - 300)), int(rng.integers(150, height - 200))
+        cv2.rectangle(frame, (x, y), (x + 300, y + 180), rng.integers(0, 255, 3).tolist(), -1)
+    cv2.putText(frame, f"Slide {slide + 1}", (60, 110), cv2.FONT_HERSHEY_SIMPLEX, 3, (20, 20, 20), 6)
+    return frame
+
+
+def write_lecture(path, minutes, seed, fade=0.0):
+    rng = np.random.default_rng(seed)
+    picker = random.Random(seed)
+    total = minutes * 60 * FPS
+    fade_frames = int(round(fade * FPS))
+    starts, frame_num, previous = [], 0, None
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), FPS, SIZE)
+    while frame_num < total:
+        frame = render(len(starts), rng)
+        if previous is not None:
+            for step in range(1, min(total - frame_num, fade_frames) + 1):
+                writer.write(cv2.addWeighted(previous, 1 - step / (fade_frames + 1), frame, step / (fade_frames + 1), 0))
+                frame_num += 1
+        starts.append(frame_num - fade_frames / 2 if previous is not None else 0)
+        for _ in range(min(total - frame_num, picker.randint(8 * FPS, 90 * FPS))):
+            writer.write(frame)
+            frame_num += 1
+        previous = frame
+    writer.release()
+    return [start / FPS for start in starts]
+
+
+def run(video_path, interval, search):
+    with tempfile.TemporaryDirectory() as output_dir:
+        os.symlink(video_path, os.path.join(output_dir, 'temp_video.mp4'))
+        extractor = SlideExtractor(output_dir=output_dir, interval=interval, search=search)
+        log = io.StringIO()
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(log):
+            extractor.extract_slides()
+        elapsed = time.perf_counter() - started
+    analyzed = next(line for line in log.getvalue().splitlines() if line.startswith('Analyzed'))
+    samples, reads = (int(word) for word in analyzed.split() if word.isdigit())
+    return [slide['time'] for slide in extractor.slides], samples + reads, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--minutes', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=3)
+    parser.add_argument('--fade', type=float, default=0.5, help="Crossfade length in seconds")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, fade in (('hard cuts', 0.0), (f'{args.fade:g} s crossfades', args.fade)):
+            video_path = os.path.join(directory, f'lecture_{fade:g}.mp4')
+            truth = write_lecture(video_path, args.minutes, args.seed, fade)
+            print(f"{args.minutes} min lecture, {len(truth)} slides, {name}")
+            print(f"{'search':<10} {'interval':>8} {'frames':>7} {'slides':>7} {'mean err':>9} {'max err':>8} "
+                  f"{'seconds':>8}")
+            for search, interval in (('fixed', 5), ('fixed', 1), ('adaptive', 5)):
+                found, analyzed, elapsed = run(video_path, interval, search)
+                # error of each true start against the nearest slide found
+                errors = [min(abs(start - time_found) for time_found in found) for start in truth]
+                print(f"{search:<10} {interval:>7}s {analyzed:>7} {len(found):>7} {np.mean(errors):>8.2f}s "
+                      f"{max(errors):>7.2f}s {elapsed:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
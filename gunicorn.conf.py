@@ -0,0 +1,22 @@
+"""gunicorn settings for wsgi:app (see wsgi.py)"""
+import os
+
+bind = os.environ.get('EDUX_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('EDUX_WORKERS', (os.cpu_count() or 1) * 2 + 1))
+# Threads per worker keep long-lived progress streams (SSE) from tying up a whole worker
+worker_class = 'gthread'
+threads = int(os.environ.get('EDUX_THREADS', 8))
+# Import and build the app once in the master; workers fork from it in milliseconds
+preload_app = True
+# LLM answers can take a while
+timeout = 180
+
+
+def post_fork(server, worker):
+    from app import start_worker
+    start_worker()
+
+
+def worker_exit(server, worker):
+    from app import stop_worker
+    stop_worker()
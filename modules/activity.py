@@ -0,0 +1,134 @@
+import json
+import heapq
+import base64
+import sqlite3
+import logging
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Each activity stream is read newest-first from a (user_id, timestamp) index;
+# id is the rowid, so it is the implicit last column of that index.
+# {schema} is 'main' for the live database or an attached monthly archive.
+ACTIVITY_STREAMS = {
+    'rapid_quiz': '''
+        SELECT id, 'rapid_quiz' AS activity_type, topic, question, user_answer,
+               correct_answer, is_correct, response_time, timestamp
+        FROM {schema}.rapid_quiz_responses
+    ''',
+    'interaction': '''
+        SELECT id, 'interaction' AS activity_type, topic, question, answer AS user_answer,
+               '' AS correct_answer, is_correct, response_time, timestamp
+        FROM {schema}.interactions
+    ''',
+}
+
+# Tie-break order between streams for rows sharing a timestamp
+STREAM_RANK = {name: rank for rank, name in enumerate(sorted(ACTIVITY_STREAMS))}
+
+MAX_PAGE_SIZE = 100
+
+
+class ActivityFeed:
+    """Keyset-paginated view over a user's quiz answers and chat interactions"""
+
+    @staticmethod
+    def encode_cursor(item: Dict) -> str:
+        key = [item['timestamp'], item['activity_type'], item['id']]
+        return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[str, str, int]:
+        try:
+            timestamp, activity_type, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            if activity_type not in ACTIVITY_STREAMS:
+                raise ValueError(activity_type)
+            return str(timestamp), activity_type, int(row_id)
+        except Exception:
+            raise ValueError("Invalid cursor")
+
+    @staticmethod
+    def _sort_key(item: Dict) -> Tuple[str, int, int]:
+        return (item['timestamp'] or '', STREAM_RANK[item['activity_type']], item['id'])
+
+    @staticmethod
+    def _read_stream(conn: sqlite3.Connection, stream: str, user_id: int, limit: int,
+                     after: Optional[Tuple[str, str, int]], subject: Optional[str],
+                     since: Optional[str], until: Optional[str], schema: str = 'main') -> List[Dict]:
+        """Read one stream in (timestamp DESC, id DESC) order past the cursor"""
+        conditions = ['user_id = ?']
+        params = [user_id]
+        if subject:
+            conditions.append('topic = ?')
+            params.append(subject)
+        if since:
+            conditions.append('timestamp >= ?')
+            params.append(since)
+        if until:
+            conditions.append('timestamp < ?')
+            params.append(until)
+        if after:
+            cursor_ts, cursor_stream, cursor_id = after
+            # Streams ranked below the cursor's stream still have rows at the
+            # cursor timestamp; those ranked above have already emitted them.
+            if STREAM_RANK[stream] < STREAM_RANK[cursor_stream]:
+                conditions.append('timestamp <= ?')
+                params.append(cursor_ts)
+            elif STREAM_RANK[stream] > STREAM_RANK[cursor_stream]:
+                conditions.append('timestamp < ?')
+                params.append(cursor_ts)
+            else:
+                conditions.append('timestamp <= ? AND (timestamp < ? OR id < ?)')
+                params.extend([cursor_ts, cursor_ts, cursor_id])
+
+        query = (
+            f"{ACTIVITY_STREAMS[stream].format(schema=schema)} WHERE {' AND '.join(conditions)} "
+            "ORDER BY timestamp DESC, id DESC LIMIT ?"
+        )
+        params.append(limit)
+        cursor = conn.execute(query, params)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    @staticmethod
+    def fetch_page(conn: sqlite3.Connection, user_id: int, limit: int = 20,
+                   cursor: Optional[str] = None, activity_type: Optional[str] = None,
+                   subject: Optional[str] = None, since: Optional[str] = None,
+                   until: Optional[str] = None, archive=None) -> Dict:
+        """Return one page of activity, newest first, and the cursor for the next one.
+
+        Every stream reads at most limit + 1 rows from its index and the
+        results are merged, so the cost of a page does not depend on how
+        much history the user has or how deep the page is. When an
+        ActivityArchive is given and the live tables run out, older months
+        are attached one at a time; archived months are disjoint and all
+        older than live rows, so their pages simply follow on.
+        """
+        if activity_type and activity_type not in ACTIVITY_STREAMS:
+            raise ValueError(f"Unknown activity type: {activity_type}")
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        after = ActivityFeed.decode_cursor(cursor) if cursor else None
+        streams = [activity_type] if activity_type else sorted(ACTIVITY_STREAMS)
+
+        def read_page(schema, wanted):
+            batches = [
+                ActivityFeed._read_stream(conn, stream, user_id, wanted, after, subject, since, until, schema)
+                for stream in streams
+            ]
+            merged = heapq.merge(*batches, key=ActivityFeed._sort_key, reverse=True)
+            return [item for _, item in zip(range(wanted), merged)]
+
+        items = read_page('main', limit + 1)
+        if archive is not None and len(items) <= limit:
+            before = after[0] if after else until
+            for month in archive.partitions(conn, before=before, since=since):
+                with archive.attached(conn, month) as schema:
+                    items.extend(archive.decode_row(item) for item in read_page(schema, limit + 1 - len(items)))
+                if len(items) > limit:
+                    break
+
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = ActivityFeed.encode_cursor(items[-1])
+        return {'items': items, 'next_cursor': next_cursor}
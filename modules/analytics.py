@@ -1,6 +1,8 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
 import statistics
 import logging
+import sqlite3
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
@@ -61,4 +63,268 @@ class AnalyticsEngine:
             except KeyError as e:
                 logger.warning(f"Missing key in progress data: {str(e)}")
                 continue
-        return recommendations
\ No newline at end of file
+        return recommendations
+
+# Row layout InteractionColumns.load reads from the cursor
+INTERACTION_ROW_DTYPE = np.dtype([
+    ('user_id', np.int64),
+    ('topic_id', np.int64),
+    ('is_correct', np.int8),
+    ('response_time', np.float64),
+    ('timestamp', np.float64),
+])
+
+
+class InteractionColumns:
+    """Interaction rows held as parallel numpy arrays.
+
+    Topics are stored as integer codes into `topic_labels`, response times
+    are float with NaN for missing values, timestamps are epoch seconds.
+    """
+
+    def __init__(self, user_ids: np.ndarray, topic_codes: np.ndarray, is_correct: np.ndarray,
+                 response_times: np.ndarray, timestamps: np.ndarray, topic_labels: np.ndarray):
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.topic_codes = np.asarray(topic_codes, dtype=np.int64)
+        self.is_correct = np.asarray(is_correct, dtype=bool)
+        self.response_times = np.asarray(response_times, dtype=np.float64)
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)
+        self.topic_labels = np.asarray(topic_labels, dtype=object)
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    @classmethod
+    def from_dicts(cls, interactions: List[Dict], user_id: int = 0) -> 'InteractionColumns':
+        """Columns from the dicts AnalyticsEngine.calculate_progress takes"""
+        interactions = [i for i in interactions if 'topic' in i and 'is_correct' in i]
+        labels, codes = np.unique([i['topic'] for i in interactions], return_inverse=True)
+        return cls(
+            [i.get('user_id', user_id) for i in interactions],
+            codes,
+            [bool(i['is_correct']) for i in interactions],
+            [np.nan if i.get('response_time') is None else i['response_time'] for i in interactions],
+            [i.get('timestamp', 0) or 0 for i in interactions],
+            labels
+        )
+
+    @classmethod
+    def load(cls, conn, user_ids: Optional[List[int]] = None, since: Optional[str] = None,
+             table: str = 'interactions') -> 'InteractionColumns':
+        """Read a cohort's rows straight from the cursor into arrays.
+
+        Rows are grouped by canonical topic (the topic index), so aliases of
+        one topic count together.
+        """
+        if table not in ('interactions', 'rapid_quiz_responses'):
+            raise ValueError(f"Unsupported table: {table}")
+        query = f'''
+            SELECT user_id, COALESCE(topic_id, -1), COALESCE(is_correct, 0),
+                   COALESCE(response_time, -1), CAST(strftime('%s', timestamp) AS INTEGER)
+            FROM {table} WHERE user_id IS NOT NULL
+        '''
+        params = []
+        if user_ids:
+            query += f" AND user_id IN ({', '.join('?' for _ in user_ids)})"
+            params.extend(user_ids)
+        if since:
+            query += ' AND timestamp >= ?'
+            params.append(since)
+        rows = np.fromiter(conn.execute(query, params), dtype=INTERACTION_ROW_DTYPE)
+
+        topic_ids, codes = np.unique(rows['topic_id'], return_inverse=True)
+        keys = dict(conn.execute('SELECT id, topic_key FROM topics').fetchall())
+        labels = [keys.get(int(topic_id), 'unknown') for topic_id in topic_ids]
+        response_times = np.where(rows['response_time'] < 0, np.nan, rows['response_time'])
+        return cls(rows['user_id'], codes, rows['is_correct'] != 0, response_times, rows['timestamp'], labels)
+
+    @classmethod
+    def load_sharded(cls, shards, user_ids: Optional[List[int]] = None, since: Optional[str] = None,
+                     table: str = 'interactions', replicas=None) -> 'InteractionColumns':
+        """load() on every shard holding the cohort, in parallel, merged into one set of columns.
+
+        With a BackupService as `replicas`, each shard is read from its read replica when fresh.
+        """
+        def load_shard(db_path):
+            conn = replicas.connect_replica(db_path) if replicas else sqlite3.connect(db_path)
+            conn.row_factory = None
+            try:
+                return cls.load(conn, user_ids, since, table)
+            finally:
+                conn.close()
+        return cls.concat(shards.fan_out(load_shard, shards.paths_for(user_ids)))
+
+    @classmethod
+    def concat(cls, parts: List['InteractionColumns']) -> 'InteractionColumns':
+        """Merge column sets whose topic codes index different label lists"""
+        if not parts:
+            return cls([], [], [], [], [], [])
+        all_labels = np.concatenate([part.topic_labels for part in parts])
+        labels, remap = np.unique(all_labels.astype(str), return_inverse=True)
+        codes = []
+        offset = 0
+        for part in parts:
+            codes.append(remap[offset:offset + len(part.topic_labels)][part.topic_codes])
+            offset += len(part.topic_labels)
+        return cls(
+            np.concatenate([part.user_ids for part in parts]),
+            np.concatenate(codes),
+            np.concatenate([part.is_correct for part in parts]),
+            np.concatenate([part.response_times for part in parts]),
+            np.concatenate([part.timestamps for part in parts]),
+            labels.astype(object)
+        )
+
+
+class CohortStats:
+    """Per-group aggregates from CohortAnalytics.compute, one array entry per group.
+
+    `user_ids`/`topic_codes` identify each group; a column is -1 when the
+    grouping does not split by it. `trend` is the least-squares slope of
+    correctness over time, in accuracy points per day.
+    """
+
+    def __init__(self, user_ids, topic_codes, topic_labels, attempts, correct,
+                 avg_response_time, p50_response_time, p90_response_time, trend):
+        self.user_ids = user_ids
+        self.topic_codes = topic_codes
+        self.topic_labels = topic_labels
+        self.attempts = attempts
+        self.correct = correct
+        self.accuracy = np.divide(correct * 100.0, attempts, out=np.zeros(len(attempts)), where=attempts > 0)
+        self.avg_response_time = avg_response_time
+        self.p50_response_time = p50_response_time
+        self.p90_response_time = p90_response_time
+        self.trend = trend
+
+    def __len__(self) -> int:
+        return len(self.attempts)
+
+    def topic(self, index: int) -> Optional[str]:
+        code = self.topic_codes[index]
+        return None if code < 0 else self.topic_labels[code]
+
+    def to_dicts(self) -> List[dict]:
+        return [self._row(i) for i in range(len(self))]
+
+    def _row(self, i: int) -> dict:
+        def number(value):
+            return None if np.isnan(value) else round(float(value), 3)
+        return {
+            'user_id': None if self.user_ids[i] < 0 else int(self.user_ids[i]),
+            'topic': self.topic(i),
+            'attempts': int(self.attempts[i]),
+            'correct': int(self.correct[i]),
+            'accuracy': round(float(self.accuracy[i]), 1),
+            'avg_response_time': float(self.avg_response_time[i]),
+            'p50_response_time': number(self.p50_response_time[i]),
+            'p90_response_time': number(self.p90_response_time[i]),
+            'trend': round(float(self.trend[i]), 4)
+        }
+
+    def for_user(self, user_id: int) -> Dict[str, dict]:
+        """One user's rows in the calculate_progress format"""
+        progress = {}
+        for i in np.flatnonzero(self.user_ids == user_id):
+            row = self._row(i)
+            progress[row['topic']] = {
+                'correct': row['correct'],
+                'incorrect': row['attempts'] - row['correct'],
+                'avg_response_time': row['avg_response_time'],
+                'accuracy': row['accuracy'],
+                'p50_response_time': row['p50_response_time'],
+                'p90_response_time': row['p90_response_time'],
+                'trend': row['trend']
+            }
+        return progress
+
+
+class CohortAnalytics:
+    """Vectorized AnalyticsEngine for many students at once.
+
+    Every aggregate is one group-by pass over the columns (bincount for
+    sums, a single lexsort for percentiles), so cost grows with the number
+    of rows rather than with rows times groups.
+    """
+
+    GROUPINGS = ('user_topic', 'user', 'topic')
+
+    @staticmethod
+    def compute(columns: InteractionColumns, by: str = 'user_topic',
+                percentiles=(50, 90)) -> CohortStats:
+        if by not in CohortAnalytics.GROUPINGS:
+            raise ValueError(f"Unknown grouping: {by}")
+        n_topics = max(len(columns.topic_labels), 1)
+        if by == 'user_topic':
+            raw_keys = columns.user_ids * n_topics + columns.topic_codes
+        elif by == 'user':
+            raw_keys = columns.user_ids
+        else:
+            raw_keys = columns.topic_codes
+        keys, groups = np.unique(raw_keys, return_inverse=True)
+        n_groups = len(keys)
+
+        attempts = np.bincount(groups, minlength=n_groups)
+        correct = np.bincount(groups, weights=columns.is_correct, minlength=n_groups).astype(np.int64)
+
+        # Latency: mean and percentiles over non-missing values only
+        timed = ~np.isnan(columns.response_times)
+        timed_groups = groups[timed]
+        times = columns.response_times[timed]
+        timed_counts = np.bincount(timed_groups, minlength=n_groups)
+        time_sums = np.bincount(timed_groups, weights=times, minlength=n_groups)
+        avg_response_time = np.divide(time_sums, timed_counts, out=np.zeros(n_groups), where=timed_counts > 0)
+        order = np.lexsort((times, timed_groups))
+        sorted_times = times[order]
+        starts = np.cumsum(timed_counts) - timed_counts
+        p50, p90 = (CohortAnalytics._group_percentile(sorted_times, starts, timed_counts, q)
+                    for q in percentiles)
+
+        # Trend: per-group least-squares slope of correctness against time
+        days = (columns.timestamps - (columns.timestamps.min() if len(columns) else 0)) / 86400.0
+        mean_days = np.bincount(groups, weights=days, minlength=n_groups) / np.maximum(attempts, 1)
+        centered = days - mean_days[groups]
+        sxx = np.bincount(groups, weights=centered * centered, minlength=n_groups)
+        sxy = np.bincount(groups, weights=centered * columns.is_correct, minlength=n_groups)
+        trend = np.divide(sxy * 100.0, sxx, out=np.zeros(n_groups), where=sxx > 0)
+
+        if by == 'user_topic':
+            user_ids, topic_codes = np.divmod(keys, n_topics)
+        elif by == 'user':
+            user_ids, topic_codes = keys, np.full(n_groups, -1)
+        else:
+            user_ids, topic_codes = np.full(n_groups, -1), keys
+        return CohortStats(user_ids, topic_codes, columns.topic_labels, attempts, correct,
+                           avg_response_time, p50, p90, trend)
+
+    @staticmethod
+    def _group_percentile(sorted_values: np.ndarray, starts: np.ndarray, counts: np.ndarray,
+                          q: float) -> np.ndarray:
+        """Linear-interpolated percentile of each group's slice of a group-sorted array"""
+        result = np.full(len(counts), np.nan)
+        has_data = counts > 0
+        if not has_data.any():
+            return result
+        position = (counts[has_data] - 1) * (q / 100.0)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, counts[has_data] - 1)
+        fraction = position - lower
+        base = starts[has_data]
+        result[has_data] = (sorted_values[base + lower] * (1 - fraction)
+                            + sorted_values[base + upper] * fraction)
+        return result
+
+    @staticmethod
+    def generate_recommendations(stats: CohortStats) -> Dict[int, List[str]]:
+        """AnalyticsEngine.generate_recommendations for every user in `stats`"""
+        needs_review = (stats.attempts > 0) & (stats.accuracy < 60)
+        too_fast = (stats.attempts > 0) & ~needs_review & (stats.avg_response_time < 5)
+        recommendations = {}
+        for i in np.flatnonzero(needs_review | too_fast):
+            user_id = int(stats.user_ids[i])
+            if needs_review[i]:
+                message = f"Needs review: {stats.topic(i)} (Accuracy: {stats.accuracy[i]:.1f}%)"
+            else:
+                message = f"Practice deeper thinking: {stats.topic(i)}"
+            recommendations.setdefault(user_id, []).append(message)
+        return recommendations
@@ -0,0 +1,342 @@
+"""Move old activity rows out of the primary database into monthly archives.
+
+    python -m modules.archive run [--horizon-days 180]
+    python -m modules.archive status
+
+Whole calendar months older than the horizon are copied into
+database/archive/activity_YYYY_MM.db and deleted from the primary file.
+Per-month rollups stay behind in activity_rollups. Long text columns are
+stored zlib-compressed in the archives. Afterwards the freed pages are
+returned to the OS with incremental VACUUM.
+"""
+import os
+import sys
+import zlib
+import sqlite3
+import logging
+import argparse
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+from modules.database import USER_DB_PATH, ARCHIVE_DIR, BUSY_TIMEOUT_SECONDS, get_db_connection
+from modules.shards import ShardRouter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HORIZON_DAYS = int(os.environ.get('EDUX_ARCHIVE_AFTER_DAYS', 180))
+DEFAULT_BATCH_SIZE = 2000
+DEFAULT_VACUUM_PAGES = 2000
+COMPRESS_MIN_LENGTH = 64
+
+# Archived tables, their columns and which of those hold long text
+ARCHIVED_TABLES = {
+    'interactions': {
+        'activity_type': 'interaction',
+        'columns': ['id', 'user_id', 'topic', 'topic_id', 'question', 'answer', 'is_correct',
+                    'response_time', 'model_used', 'timestamp'],
+        'text_columns': ['question', 'answer'],
+    },
+    'rapid_quiz_responses': {
+        'activity_type': 'rapid_quiz',
+        'columns': ['id', 'user_id', 'topic', 'topic_id', 'question', 'user_answer', 'correct_answer',
+                    'is_correct', 'response_time', 'timestamp'],
+        'text_columns': ['question', 'user_answer', 'correct_answer'],
+    },
+}
+
+
+def compress_text(value):
+    """Store long strings as zlib blobs; short ones are not worth it"""
+    if not isinstance(value, str) or len(value) < COMPRESS_MIN_LENGTH:
+        return value
+    packed = zlib.compress(value.encode('utf-8'), 6)
+    return packed if len(packed) < len(value) else value
+
+
+def decompress_text(value):
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode('utf-8')
+    return value
+
+
+def month_start(timestamp: datetime) -> datetime:
+    return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+class ActivityArchive:
+    """Monthly cold-storage files for interactions and quiz answers"""
+
+    def __init__(self, archive_dir: str = ARCHIVE_DIR):
+        self.archive_dir = archive_dir
+
+    def partition_path(self, month: str) -> str:
+        return os.path.join(self.archive_dir, f"activity_{month.replace('-', '_')}.db")
+
+    def _open_partition(self, month: str) -> sqlite3.Connection:
+        os.makedirs(self.archive_dir, exist_ok=True)
+        conn = sqlite3.connect(self.partition_path(month), timeout=BUSY_TIMEOUT_SECONDS)
+        for table, spec in ARCHIVED_TABLES.items():
+            # Columns are untyped so compressed blobs and plain text can share them
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(spec['columns'])}, PRIMARY KEY(id))")
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_user_time ON {table}(user_id, timestamp)')
+        return conn
+
+    # --- archiving -----------------------------------------------------------
+
+    def cutoff(self, horizon_days: int = DEFAULT_HORIZON_DAYS, now: Optional[datetime] = None) -> str:
+        """Rows before the start of the month containing now - horizon get archived"""
+        now = now or datetime.utcnow()
+        return month_start(now - timedelta(days=horizon_days)).strftime('%Y-%m-%d %H:%M:%S')
+
+    def archive_table(self, conn: sqlite3.Connection, table: str, cutoff: str,
+                      batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+        """Move rows older than cutoff out of one table; returns rows moved.
+
+        Walks the table in rowid order, relying on ids increasing with
+        timestamps, and stops at the first window with nothing to archive.
+        Each batch is committed to the archive file first and only then
+        rolled up and deleted from the primary in one transaction. A crash
+        in between just re-copies the same rows, which INSERT OR REPLACE
+        absorbs.
+        """
+        spec = ARCHIVED_TABLES[table]
+        columns = spec['columns']
+        moved = 0
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                f"SELECT {', '.join(columns)} FROM {table} WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            old_rows = [row for row in rows if row[-1] and row[-1] < cutoff]
+            if not old_rows:
+                break
+
+            by_month: Dict[str, List[tuple]] = {}
+            for row in old_rows:
+                by_month.setdefault(row[-1][:7], []).append(row)
+
+            text_positions = [columns.index(name) for name in spec['text_columns']]
+            for month, month_rows in by_month.items():
+                archive_conn = self._open_partition(month)
+                try:
+                    packed = []
+                    for row in month_rows:
+                        row = list(row)
+                        for position in text_positions:
+                            row[position] = compress_text(row[position])
+                        packed.append(row)
+                    archive_conn.executemany(
+                        f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) "
+                        f"VALUES ({', '.join('?' for _ in columns)})",
+                        packed
+                    )
+                    archive_conn.commit()
+                finally:
+                    archive_conn.close()
+
+            self._rollup_and_delete(conn, table, spec['activity_type'], by_month)
+            moved += len(old_rows)
+        return moved
+
+    def _rollup_and_delete(self, conn, table, activity_type, by_month):
+        columns = ARCHIVED_TABLES[table]['columns']
+        user_pos, topic_pos, topic_id_pos = columns.index('user_id'), columns.index('topic'), columns.index('topic_id')
+        correct_pos, time_pos = columns.index('is_correct'), columns.index('response_time')
+        try:
+            for month, rows in by_month.items():
+                rollups = {}
+                for row in rows:
+                    if row[user_pos] is None:
+                        continue
+                    key = (row[user_pos], row[topic_pos] or '')
+                    entry = rollups.setdefault(key, [row[topic_id_pos], 0, 0, 0.0])
+                    entry[1] += 1
+                    entry[2] += 1 if row[correct_pos] else 0
+                    entry[3] += row[time_pos] or 0
+                conn.executemany('''
+                    INSERT INTO activity_rollups
+                    (user_id, month, activity_type, topic, topic_id, attempts, correct_count, total_response_time)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(user_id, month, activity_type, topic) DO UPDATE SET
+                        attempts = attempts + excluded.attempts,
+                        correct_count = correct_count + excluded.correct_count,
+                        total_response_time = total_response_time + excluded.total_response_time
+                ''', [(user_id, month, activity_type, topic, *values)
+                      for (user_id, topic), values in rollups.items()])
+                conn.execute(f'''
+                    INSERT INTO archive_partitions (month, path, {table}) VALUES (?, ?, ?)
+                    ON CONFLICT(month) DO UPDATE SET {table} = {table} + excluded.{table},
+                        archived_at = CURRENT_TIMESTAMP
+                ''', (month, self.partition_path(month), len(rows)))
+                conn.executemany(f'DELETE FROM {table} WHERE id = ?', [(row[0],) for row in rows])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def compact(self, conn: sqlite3.Connection, pages: int = DEFAULT_VACUUM_PAGES) -> int:
+        """Release up to `pages` free pages; needs auto_vacuum=INCREMENTAL"""
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            logger.warning("auto_vacuum is not INCREMENTAL; run 'python -m modules.archive enable-incremental-vacuum' once")
+            return 0
+        free_before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        # executescript steps the pragma to completion; execute() frees a single page
+        conn.executescript(f'PRAGMA incremental_vacuum({int(pages)});')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return free_before - conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+    def run(self, db_path: str = USER_DB_PATH, horizon_days: int = DEFAULT_HORIZON_DAYS,
+            batch_size: int = DEFAULT_BATCH_SIZE, vacuum_pages: int = DEFAULT_VACUUM_PAGES) -> Dict[str, int]:
+        cutoff = self.cutoff(horizon_days)
+        result = {}
+        with get_db_connection(db_path) as conn:
+            for table in ARCHIVED_TABLES:
+                result[table] = self.archive_table(conn, table, cutoff, batch_size)
+            result['pages_released'] = self.compact(conn, vacuum_pages)
+        logger.info(f"Archived rows older than {cutoff}: {result}")
+        return result
+
+    # --- moving users between shards -----------------------------------------
+
+    def _counts(self, conn: sqlite3.Connection) -> Dict[str, int]:
+        return {table: conn.execute(f'SELECT COUNT(*) FROM main.{table}').fetchone()[0] for table in ARCHIVED_TABLES}
+
+    def copy_users(self, target: 'ActivityArchive', month: str, user_range: str, params: list) -> Dict[str, int]:
+        """Copy one month's rows of the users matching user_range into target's partition.
+
+        Rows are copied as stored, compressed text included. Returns the row
+        counts of target's partition, so repeating a copy is harmless.
+        """
+        source_path = self.partition_path(month)
+        if not os.path.exists(source_path):
+            return {}
+        conn = target._open_partition(month)
+        try:
+            conn.execute('ATTACH DATABASE ? AS source', (source_path,))
+            for table, spec in ARCHIVED_TABLES.items():
+                columns = ', '.join(spec['columns'])
+                conn.execute(
+                    f'INSERT OR REPLACE INTO main.{table} ({columns}) SELECT {columns} FROM source.{table} '
+                    f'WHERE {user_range}',
+                    params
+                )
+            conn.commit()
+            conn.execute('DETACH DATABASE source')
+            return self._counts(conn)
+        finally:
+            conn.close()
+
+    def delete_users(self, month: str, user_range: str, params: list) -> Dict[str, int]:
+        """Drop one month's rows of the users matching user_range; returns the counts left"""
+        conn = self._open_partition(month)
+        try:
+            for table in ARCHIVED_TABLES:
+                conn.execute(f'DELETE FROM {table} WHERE {user_range}', params)
+            conn.commit()
+            return self._counts(conn)
+        finally:
+            conn.close()
+
+    # --- reading -------------------------------------------------------------
+
+    def partitions(self, conn: sqlite3.Connection, before: Optional[str] = None,
+                   since: Optional[str] = None) -> List[str]:
+        """Archived months overlapping [since, before), newest first"""
+        query = 'SELECT month FROM archive_partitions WHERE 1 = 1'
+        params = []
+        if before:
+            query += ' AND month <= ?'
+            params.append(before[:7])
+        if since:
+            query += ' AND month >= ?'
+            params.append(since[:7])
+        query += ' ORDER BY month DESC'
+        return [row[0] for row in conn.execute(query, params)]
+
+    @contextmanager
+    def attached(self, conn: sqlite3.Connection, month: str) -> Iterator[str]:
+        """Attach one month's archive read-only and yield its schema name"""
+        schema = f"archive_{month.replace('-', '_')}"
+        path = os.path.abspath(self.partition_path(month))
+        conn.execute('ATTACH DATABASE ? AS ' + schema, (f'file:{path}?mode=ro',))
+        try:
+            yield schema
+        finally:
+            conn.execute(f'DETACH DATABASE {schema}')
+
+    @staticmethod
+    def decode_row(row: dict) -> dict:
+        return {key: decompress_text(value) for key, value in row.items()}
+
+    @staticmethod
+    def rollups(conn: sqlite3.Connection, user_id: int, since_month: Optional[str] = None) -> List[dict]:
+        """Monthly totals for archived activity"""
+        query = '''
+            SELECT month, activity_type, topic, attempts, correct_count, total_response_time
+            FROM activity_rollups WHERE user_id = ?
+        '''
+        params = [user_id]
+        if since_month:
+            query += ' AND month >= ?'
+            params.append(since_month)
+        query += ' ORDER BY month DESC, activity_type, topic'
+        cursor = conn.execute(query, params)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def enable_incremental_vacuum(db_path: str = USER_DB_PATH) -> None:
+    """One-off switch for databases created before auto_vacuum was set.
+
+    This rewrites the whole file with VACUUM and holds an exclusive lock
+    while doing so, so run it during a maintenance window.
+    """
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+    try:
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive old EduX activity rows")
+    parser.add_argument('--db', default=USER_DB_PATH, help="Path to the primary database")
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR, help="Directory for monthly archives")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help="Archive rows older than the horizon")
+    run_parser.add_argument('--horizon-days', type=int, default=DEFAULT_HORIZON_DAYS)
+    run_parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    run_parser.add_argument('--vacuum-pages', type=int, default=DEFAULT_VACUUM_PAGES)
+    run_parser.add_argument('--all-shards', action='store_true',
+                            help="Archive every shard listed in the --db catalog, each into its own directory")
+    subparsers.add_parser('status', help="List archived months")
+    subparsers.add_parser('enable-incremental-vacuum', help="Switch an existing database to incremental VACUUM")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    archive = ActivityArchive(args.archive_dir)
+    if args.command == 'run' and args.all_shards:
+        shards = ShardRouter(args.db)
+        for path in shards.all_paths():
+            shard_archive = ActivityArchive(shards.archive_dir_for(path))
+            print(path, shard_archive.run(path, args.horizon_days, args.batch_size, args.vacuum_pages))
+    elif args.command == 'run':
+        print(archive.run(args.db, args.horizon_days, args.batch_size, args.vacuum_pages))
+    elif args.command == 'status':
+        with get_db_connection(args.db) as conn:
+            for row in conn.execute('SELECT * FROM archive_partitions ORDER BY month'):
+                print(dict(row))
+    else:
+        enable_incremental_vacuum(args.db)
+        print(f"Incremental VACUUM enabled for {args.db}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
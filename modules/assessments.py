@@ -0,0 +1,175 @@
+import json
+import sqlite3
+import logging
+from typing import List, Optional
+
+from modules.topics import TopicIndex
+from modules.mastery import MasteryIndex
+
+logger = logging.getLogger(__name__)
+
+MAX_ANSWERS = 200
+
+
+class TestNotFound(LookupError):
+    pass
+
+
+class TestAlreadySubmitted(ValueError):
+    pass
+
+
+class Assessments:
+    """Generated tests, graded server-side against the stored answer key.
+
+    submit() writes every response and the user's aggregates in the
+    caller's transaction: one multi-row insert into rapid_quiz_responses,
+    one upsert into user_progress and one into topic_mastery, so a whole
+    test costs a single commit.
+    """
+
+    @staticmethod
+    def store(conn: sqlite3.Connection, user_id: int, subject: str, topic: str, questions: List[dict]) -> int:
+        cursor = conn.execute(
+            'INSERT INTO generated_tests (user_id, subject, topic, questions) VALUES (?, ?, ?, ?)',
+            (user_id, subject, topic, json.dumps(questions))
+        )
+        return cursor.lastrowid
+
+    @staticmethod
+    def public_questions(questions: List[dict]) -> List[dict]:
+        """Questions as sent to the browser, without answers or explanations"""
+        return [{'question': q.get('question'), 'options': q.get('options', [])} for q in questions]
+
+    @staticmethod
+    def grade(questions: List[dict], answers: List[dict]) -> List[dict]:
+        """Grade every question, matching answers by index (or question text).
+
+        A question without an answer counts as incorrect, so a student cannot
+        pick which questions of an issued test count.
+        """
+        by_text = {q.get('question'): i for i, q in enumerate(questions)}
+        answered = {}
+        for answer in answers[:MAX_ANSWERS]:
+            if not isinstance(answer, dict):
+                continue
+            index = answer.get('index')
+            if not isinstance(index, int):
+                index = by_text.get(answer.get('question'))
+            if index is None or not 0 <= index < len(questions) or index in answered:
+                continue
+            answered[index] = answer
+        results = []
+        for index, question in enumerate(questions):
+            answer = answered.get(index, {})
+            user_answer = answer.get('user_answer')
+            results.append({
+                'index': index,
+                'question': question.get('question'),
+                'user_answer': user_answer,
+                'correct_answer': question.get('correct_answer'),
+                'is_correct': user_answer is not None and user_answer == question.get('correct_answer'),
+                'explanation': question.get('explanation'),
+                'response_time': answer.get('response_time')
+            })
+        return results
+
+    @staticmethod
+    def submit(conn: sqlite3.Connection, user_id: int, test_id: int, answers: List[dict]) -> dict:
+        """Grade a test and record it; the caller commits"""
+        row = conn.execute(
+            'SELECT topic, questions, submitted_at FROM generated_tests WHERE id = ? AND user_id = ?',
+            (test_id, user_id)
+        ).fetchone()
+        if row is None:
+            raise TestNotFound(f"Test {test_id} not found")
+        topic, questions_json, submitted_at = row
+        if submitted_at:
+            raise TestAlreadySubmitted(f"Test {test_id} was already submitted")
+
+        questions = json.loads(questions_json)
+        results = Assessments.grade(questions, answers)
+        correct = sum(1 for r in results if r['is_correct'])
+        topic_id = TopicIndex.resolve(conn, topic)
+        if results:
+            conn.executemany('''
+                INSERT INTO rapid_quiz_responses
+                (user_id, topic, topic_id, question, user_answer, correct_answer, is_correct, response_time, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ''', [
+                (user_id, topic, topic_id, r['question'], r['user_answer'], r['correct_answer'],
+                 r['is_correct'], r['response_time'] or 0)
+                for r in results
+            ])
+            progress = Assessments._add_progress(conn, user_id, topic, topic_id, results, correct)
+            mastery = MasteryIndex.update_many(
+                conn, user_id, topic_id, topic, [(r['is_correct'], r['response_time']) for r in results]
+            )
+        else:
+            progress = mastery = None
+        conn.execute(
+            'UPDATE generated_tests SET submitted_at = CURRENT_TIMESTAMP, score = ? WHERE id = ?',
+            (correct, test_id)
+        )
+        return {
+            'test_id': test_id,
+            'topic': topic,
+            'total': len(questions),
+            'correct': correct,
+            'results': results,
+            'progress': progress,
+            'mastery': mastery['mastery'] if mastery else None
+        }
+
+    @staticmethod
+    def _add_progress(conn, user_id, topic, topic_id, results, correct) -> dict:
+        """Fold a whole test into user_progress with one write, like save_rapid_quiz does per answer"""
+        times = [r['response_time'] for r in results if r['response_time'] is not None]
+        batch_avg = sum(times) / len(times) if times else 0
+        incorrect = len(results) - correct
+        existing = conn.execute(
+            'SELECT id FROM user_progress WHERE user_id = ? AND topic = ?', (user_id, topic)
+        ).fetchone()
+        if existing:
+            conn.execute('''
+                UPDATE user_progress
+                SET correct_count = correct_count + ?,
+                    incorrect_count = incorrect_count + ?,
+                    avg_response_time = (avg_response_time + ?) / 2,
+                    topic_id = ?
+                WHERE id = ?
+            ''', (correct, incorrect, batch_avg, topic_id, existing[0]))
+        else:
+            conn.execute('''
+                INSERT INTO user_progress
+                (user_id, topic, topic_id, correct_count, incorrect_count, avg_response_time)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (user_id, topic, topic_id, correct, incorrect, batch_avg))
+        row = conn.execute('''
+            SELECT topic, correct_count, incorrect_count, avg_response_time
+            FROM user_progress WHERE user_id = ? AND topic = ?
+        ''', (user_id, topic)).fetchone()
+        return dict(zip(('topic', 'correct_count', 'incorrect_count', 'avg_response_time'), row))
+
+    @staticmethod
+    def topic_progress(conn: sqlite3.Connection, user_id: int, topic: str) -> dict:
+        """Mastery and counters for one topic, straight from the aggregate tables"""
+        topic_id = TopicIndex.resolve(conn, topic, create=False)
+        mastery = MasteryIndex.get(conn, user_id, topic_id)
+        # Spelling variants of a topic can each have a row; add them up,
+        # weighting the average time by each row's answers
+        correct_count, incorrect_count, avg_response_time = conn.execute('''
+            SELECT COALESCE(SUM(correct_count), 0), COALESCE(SUM(incorrect_count), 0),
+                   COALESCE(SUM(avg_response_time * (correct_count + incorrect_count))
+                            / NULLIF(SUM(correct_count + incorrect_count), 0), 0)
+            FROM user_progress WHERE user_id = ? AND (topic_id = ? OR topic = ?)
+        ''', (user_id, topic_id, topic)).fetchone()
+        return {
+            'topic': topic,
+            'mastery': mastery['mastery'] if mastery else None,
+            'attempts': mastery['attempts'] if mastery else 0,
+            'correct_count': correct_count,
+            'incorrect_count': incorrect_count,
+            'avg_response_time': avg_response_time,
+            'recommendations': MasteryIndex.recommendations(conn, user_id)
+        }
@@ -0,0 +1,224 @@
+"""Online snapshots and read replicas of the live database files.
+
+    python -m modules.backup snapshot
+    python -m modules.backup replica
+    python -m modules.backup run        # keep both up to date in the foreground
+    python -m modules.backup status
+
+Copies use SQLite's online backup API a few hundred pages per step. The
+copying connection keeps one read transaction open throughout, so in WAL
+mode every step reads the same snapshot and writers carry on committing
+meanwhile; without it each commit would restart the copy. Each copy is
+written to a temporary file, checked and then renamed into place, so a
+snapshot or replica is never seen half-written.
+
+Snapshots rotate under database/backups/<db name>/. Replicas live in
+database/replicas/ and are opened read-only by exports and cohort
+analytics; a replica file's mtime is the moment its contents are
+complete up to. The catalog and every shard are copied, one file at a
+time, so files in one round are not from the same instant.
+"""
+import os
+import sys
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from modules.database import DATABASE_DIR, USER_DB_PATH, BUSY_TIMEOUT_SECONDS, get_db_connection
+from modules.shards import ShardRouter, router as default_router
+
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = os.environ.get('EDUX_BACKUP_DIR', os.path.join(DATABASE_DIR, 'backups'))
+REPLICA_DIR = os.environ.get('EDUX_REPLICA_DIR', os.path.join(DATABASE_DIR, 'replicas'))
+PAGES_PER_STEP = 256
+STEP_PAUSE_SECONDS = 0.005
+KEEP_SNAPSHOTS = int(os.environ.get('EDUX_KEEP_SNAPSHOTS', 7))
+SNAPSHOT_INTERVAL_SECONDS = 6 * 3600
+REPLICA_INTERVAL_SECONDS = 60
+# Older replicas are not used; reads go to the live file instead
+REPLICA_MAX_LAG_SECONDS = 15 * 60
+
+
+def online_copy(source_path: str, target_path: str, pages: int = PAGES_PER_STEP,
+                pause: float = STEP_PAUSE_SECONDS) -> float:
+    """Copy a live database file to target_path; returns the time the copy is complete up to"""
+    tmp_path = target_path + '.tmp'
+    os.makedirs(os.path.dirname(target_path) or '.', exist_ok=True)
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    source = sqlite3.connect(source_path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+    target = sqlite3.connect(tmp_path)
+    try:
+        # Pin one WAL snapshot for every step; otherwise each commit in
+        # between would make SQLite start the copy over
+        source.execute('BEGIN')
+        source.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+        as_of = time.time()
+        source.backup(target, pages=pages, progress=lambda status, remaining, total: time.sleep(pause))
+        source.execute('COMMIT')
+        # A standalone file: no -wal/-shm needed to open it read-only
+        target.execute('PRAGMA journal_mode=DELETE')
+        check = target.execute('PRAGMA quick_check').fetchone()[0]
+    finally:
+        target.close()
+        source.close()
+    if check != 'ok':
+        os.remove(tmp_path)
+        raise sqlite3.DatabaseError(f"Copy of {source_path} failed quick_check: {check}")
+    os.utime(tmp_path, (as_of, as_of))
+    os.replace(tmp_path, target_path)
+    return as_of
+
+
+class BackupService:
+    """Rotating snapshots and read-only replicas of the catalog and every shard"""
+
+    def __init__(self, shards: Optional[ShardRouter] = None, backup_dir: str = BACKUP_DIR,
+                 replica_dir: str = REPLICA_DIR, keep: int = KEEP_SNAPSHOTS,
+                 max_lag_seconds: float = REPLICA_MAX_LAG_SECONDS):
+        self.shards = shards or default_router
+        self.backup_dir = backup_dir
+        self.replica_dir = replica_dir
+        self.keep = keep
+        self.max_lag_seconds = max_lag_seconds
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _name(db_path: str) -> str:
+        return os.path.splitext(os.path.basename(db_path))[0]
+
+    # --- snapshots ------------------------------------------------------------
+
+    def snapshot(self) -> List[str]:
+        """Take a snapshot of every database file and drop the oldest beyond `keep`"""
+        stamp = datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+        written = []
+        for db_path in self.shards.all_paths():
+            name = self._name(db_path)
+            directory = os.path.join(self.backup_dir, name)
+            target = os.path.join(directory, f"{name}-{stamp}.db")
+            online_copy(db_path, target)
+            written.append(target)
+            self._rotate(directory)
+        logger.info(f"Snapshots written: {written}")
+        return written
+
+    def snapshots(self, db_path: str) -> List[str]:
+        """Snapshot files of one database, oldest first"""
+        directory = os.path.join(self.backup_dir, self._name(db_path))
+        if not os.path.isdir(directory):
+            return []
+        return sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.endswith('.db'))
+
+    def _rotate(self, directory: str) -> None:
+        files = sorted(f for f in os.listdir(directory) if f.endswith('.db'))
+        for stale in files[:max(0, len(files) - self.keep)]:
+            os.remove(os.path.join(directory, stale))
+
+    # --- replicas -------------------------------------------------------------
+
+    def replica_path(self, db_path: str) -> str:
+        return os.path.join(self.replica_dir, os.path.basename(db_path))
+
+    def refresh_replicas(self) -> Dict[str, float]:
+        """Recopy every replica; returns the as-of time of each"""
+        return {db_path: online_copy(db_path, self.replica_path(db_path)) for db_path in self.shards.all_paths()}
+
+    def replica_time(self, db_path: str) -> Optional[float]:
+        """Time the replica of db_path is complete up to, or None if it is missing or too old"""
+        try:
+            as_of = os.path.getmtime(self.replica_path(db_path))
+        except OSError:
+            return None
+        return as_of if time.time() - as_of <= self.max_lag_seconds else None
+
+    def as_of(self, paths: List[str]) -> float:
+        """Latest time every read through connect_replica() on paths is complete up to"""
+        now = time.time()
+        return min([now] + [self.replica_time(path) or now for path in paths])
+
+    def connect_replica(self, db_path: str) -> sqlite3.Connection:
+        """Read-only connection to db_path's replica, or to db_path itself if there is no fresh one"""
+        if self.replica_time(db_path) is None:
+            return get_db_connection(db_path)
+        path = os.path.abspath(self.replica_path(db_path))
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True, timeout=BUSY_TIMEOUT_SECONDS)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # --- background loop ------------------------------------------------------
+
+    def start(self, replica_interval: float = REPLICA_INTERVAL_SECONDS,
+              snapshot_interval: float = SNAPSHOT_INTERVAL_SECONDS) -> threading.Thread:
+        """Refresh replicas and take snapshots from a daemon thread"""
+        if self._thread and self._thread.is_alive():
+            return self._thread
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self.run_forever, args=(replica_interval, snapshot_interval),
+            name='edux-backup', daemon=True
+        )
+        self._thread.start()
+        return self._thread
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run_forever(self, replica_interval: float = REPLICA_INTERVAL_SECONDS,
+                    snapshot_interval: float = SNAPSHOT_INTERVAL_SECONDS) -> None:
+        next_snapshot = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.refresh_replicas()
+                if time.monotonic() >= next_snapshot:
+                    self.snapshot()
+                    next_snapshot = time.monotonic() + snapshot_interval
+            except Exception as e:
+                logger.error(f"Backup round failed: {str(e)}")
+            self._stop.wait(replica_interval)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Online backups and read replicas of the EduX databases")
+    parser.add_argument('--db', default=USER_DB_PATH, help="Path to the primary (catalog) database")
+    parser.add_argument('--backup-dir', default=BACKUP_DIR)
+    parser.add_argument('--replica-dir', default=REPLICA_DIR)
+    parser.add_argument('--keep', type=int, default=KEEP_SNAPSHOTS, help="Snapshots to keep per database")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('snapshot', help="Take one rotating snapshot of every database")
+    subparsers.add_parser('replica', help="Refresh the read replicas once")
+    run_parser = subparsers.add_parser('run', help="Keep replicas fresh and snapshot periodically")
+    run_parser.add_argument('--replica-interval', type=float, default=REPLICA_INTERVAL_SECONDS)
+    run_parser.add_argument('--snapshot-interval', type=float, default=SNAPSHOT_INTERVAL_SECONDS)
+    subparsers.add_parser('status', help="List snapshots and replica ages")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    service = BackupService(ShardRouter(args.db), args.backup_dir, args.replica_dir, args.keep)
+    if args.command == 'snapshot':
+        for path in service.snapshot():
+            print(path)
+    elif args.command == 'replica':
+        for db_path, as_of in service.refresh_replicas().items():
+            print(f"{service.replica_path(db_path)}  as of {datetime.utcfromtimestamp(as_of):%Y-%m-%d %H:%M:%S}")
+    elif args.command == 'run':
+        try:
+            service.run_forever(args.replica_interval, args.snapshot_interval)
+        except KeyboardInterrupt:
+            pass
+    else:
+        for db_path in service.shards.all_paths():
+            replica = service.replica_path(db_path)
+            age = f"{time.time() - os.path.getmtime(replica):.0f}s old" if os.path.exists(replica) else "missing"
+            print(f"{db_path}: replica {age}, {len(service.snapshots(db_path))} snapshots")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
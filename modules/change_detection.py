@@ -0,0 +1,87 @@
+"""Tiered slide change detection.
+
+Comparing every sampled frame with full-resolution SSIM is what made slide
+extraction slow. Most pairs are obvious, so the checks run cheapest first:
+
+1. block means: both frames are reduced to a 64x36 grid of block
+   averages (once per frame). No block changed -> identical; a large
+   share of blocks changed -> different. The median difference is
+   subtracted first so an exposure change alone does not count.
+2. SSIM on a grayscale copy at most SSIM_MAX_SIDE pixels wide, without
+   the full similarity map, for whatever tier 1 could not decide.
+
+Frames that come out 'similar' are left to the caller's OCR comparison,
+as before. stats counts how often each tier settled a comparison.
+"""
+import logging
+from collections import namedtuple
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+from skimage.metrics import structural_similarity as ssim
+
+logger = logging.getLogger(__name__)
+
+GRID = (64, 36)
+# A block has changed if its mean moved by more than this many gray levels
+BLOCK_DELTA = 8
+# Share of changed blocks from which two frames are different slides
+DIFFERENT_FRACTION = 0.2
+SSIM_MAX_SIDE = 640
+
+IDENTICAL = 'identical'
+DIFFERENT = 'different'
+SIMILAR = 'similar'
+
+# number: the frame's number, if frame is a reduced copy (see FfmpegSampler)
+FrameSignature = namedtuple('FrameSignature', ['frame', 'gray', 'blocks', 'number'], defaults=(None,))
+
+
+class ChangeDetector:
+    """Decides whether two sampled frames show the same slide"""
+
+    def __init__(self, similarity_threshold: float = 0.9, block_delta: float = BLOCK_DELTA,
+                 different_fraction: float = DIFFERENT_FRACTION, ssim_max_side: int = SSIM_MAX_SIDE):
+        self.similarity_threshold = similarity_threshold
+        self.block_delta = block_delta
+        self.different_fraction = different_fraction
+        self.ssim_max_side = ssim_max_side
+        self.stats = {'blocks_identical': 0, 'blocks_different': 0, 'ssim_different': 0, 'ssim_similar': 0}
+
+    def signature(self, frame: np.ndarray, number: Optional[int] = None) -> FrameSignature:
+        """Everything compare() needs from a frame, computed once per frame"""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        height, width = gray.shape
+        scale = min(1.0, self.ssim_max_side / max(height, width))
+        if scale < 1.0:
+            gray = cv2.resize(gray, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+        blocks = cv2.resize(gray, GRID, interpolation=cv2.INTER_AREA).astype(np.float32)
+        return FrameSignature(frame, gray, blocks, number)
+
+    def changed_fraction(self, previous: np.ndarray, current: np.ndarray) -> float:
+        """Share of blocks whose mean moved by more than block_delta, an overall exposure change aside"""
+        delta = current - previous
+        delta -= np.median(delta)
+        return np.count_nonzero(np.abs(delta) > self.block_delta) / delta.size
+
+    def compare(self, previous: FrameSignature, current: FrameSignature) -> str:
+        """IDENTICAL, DIFFERENT or SIMILAR (same layout, may still differ in text)"""
+        changed = self.changed_fraction(previous.blocks, current.blocks)
+        if changed == 0:
+            self.stats['blocks_identical'] += 1
+            return IDENTICAL
+        if changed >= self.different_fraction or previous.gray.shape != current.gray.shape:
+            self.stats['blocks_different'] += 1
+            return DIFFERENT
+
+        if ssim(previous.gray, current.gray, data_range=255) < self.similarity_threshold:
+            self.stats['ssim_different'] += 1
+            return DIFFERENT
+        self.stats['ssim_similar'] += 1
+        return SIMILAR
+
+    def hit_rates(self) -> Dict[str, float]:
+        """Share of comparisons settled by each tier"""
+        total = sum(self.stats.values())
+        return {tier: count / total for tier, count in self.stats.items()} if total else {}
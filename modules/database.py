@@ -0,0 +1,46 @@
+import os
+import sqlite3
+
+# Database layout
+#
+# Every table the app reads or writes on a request lives in one primary file.
+# Chat turns, quiz answers, progress counters and topic stats are updated
+# together in single transactions, and SQLite only guarantees atomic commits
+# across attached files in rollback-journal mode, not WAL. So splitting the
+# hot tables across files would cost either atomicity or WAL's concurrent
+# readers.
+#
+# Activity older than the retention horizon is moved to monthly files under
+# database/archive/ (see modules/archive.py) and attached read-only only when
+# a query reaches that far back, which keeps the primary file small.
+#
+# Per-user tables can additionally be spread over shard files by user-id
+# range (see modules/shards.py); the primary then acts as the catalog.
+#
+# Backups are taken online into database/backups/, and exports read from
+# periodically refreshed copies in database/replicas/ (see modules/backup.py).
+# Never copy the live files directly: the WAL may hold committed pages that
+# are not in the main file yet.
+#
+# database/edu_chat.db is a leftover from an earlier schema (users, sessions,
+# interactions) and is not opened by the app. It is left on disk untouched so
+# that its data can still be recovered by hand.
+DATABASE_DIR = os.environ.get('EDUX_DATABASE_DIR', 'database')
+USER_DB_PATH = os.environ.get('EDUX_DB_PATH', os.path.join(DATABASE_DIR, 'user_data.db'))
+ARCHIVE_DIR = os.environ.get('EDUX_ARCHIVE_DIR', os.path.join(DATABASE_DIR, 'archive'))
+
+# How long a connection waits on another writer's lock before giving up
+BUSY_TIMEOUT_SECONDS = 10
+
+
+def get_db_connection(db_path=None, user_id=None):
+    """Connection to db_path, else to the shard holding user_id, else to the primary"""
+    if db_path is None:
+        if user_id is None:
+            db_path = USER_DB_PATH
+        else:
+            from modules.shards import router  # shards imports this module
+            db_path = router.path_for(user_id)
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_SECONDS)
+    conn.row_factory = sqlite3.Row
+    return conn
@@ -0,0 +1,129 @@
+import json
+import queue
+import logging
+import threading
+from typing import Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """A single listener's mailbox for events published to one user"""
+
+    def __init__(self, bus: 'LocalEventBus', user_id: int, max_queue_size: int):
+        self.bus = bus
+        self.user_id = user_id
+        self._queue = queue.Queue(maxsize=max_queue_size)
+
+    def put(self, event: dict) -> None:
+        """Queue an event, dropping the oldest one if the listener is falling behind"""
+        while True:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """Block until the next event arrives; returns None on timeout"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self) -> None:
+        self.bus.unsubscribe(self)
+
+
+class LocalEventBus:
+    """In-process pub/sub keyed by user id.
+
+    Good for a single worker process and for tests. Multi-process deployments
+    should use RedisEventBus so that a write handled by one worker reaches
+    dashboards connected to another.
+    """
+
+    def __init__(self, max_queue_size: int = 100):
+        self.max_queue_size = max_queue_size
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(self, user_id, self.max_queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            listeners = self._subscribers.get(subscription.user_id)
+            if listeners is None:
+                return
+            listeners.discard(subscription)
+            if not listeners:
+                del self._subscribers[subscription.user_id]
+
+    def subscriber_count(self, user_id: int) -> int:
+        with self._lock:
+            return len(self._subscribers.get(user_id, ()))
+
+    def publish(self, user_id: int, event: dict) -> None:
+        """Deliver an event to every listener of the given user"""
+        self._deliver(user_id, event)
+
+    def _deliver(self, user_id: int, event: dict) -> None:
+        with self._lock:
+            listeners = list(self._subscribers.get(user_id, ()))
+        for subscription in listeners:
+            subscription.put(event)
+
+
+class RedisEventBus(LocalEventBus):
+    """Event bus that fans out through Redis pub/sub across worker processes.
+
+    Each process keeps its own local subscribers and a single background
+    thread that forwards messages from Redis to them.
+    """
+
+    CHANNEL_PREFIX = 'edux:user:'
+
+    def __init__(self, url: str, max_queue_size: int = 100):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("RedisEventBus requires the 'redis' package (pip install redis)") from e
+        super().__init__(max_queue_size=max_queue_size)
+        self._redis = redis.Redis.from_url(url)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.psubscribe(f"{self.CHANNEL_PREFIX}*")
+        self._listener = threading.Thread(target=self._listen, name='edux-event-bus', daemon=True)
+        self._listener.start()
+
+    def publish(self, user_id: int, event: dict) -> None:
+        try:
+            self._redis.publish(f"{self.CHANNEL_PREFIX}{user_id}", json.dumps(event))
+        except Exception as e:
+            # Fall back to local delivery so this worker's dashboards still update
+            logger.error(f"Redis publish failed, delivering locally only: {str(e)}")
+            self._deliver(user_id, event)
+
+    def _listen(self) -> None:
+        for message in self._pubsub.listen():
+            try:
+                channel = message['channel']
+                if isinstance(channel, bytes):
+                    channel = channel.decode('utf-8')
+                user_id = int(channel[len(self.CHANNEL_PREFIX):])
+                self._deliver(user_id, json.loads(message['data']))
+            except Exception as e:
+                logger.warning(f"Dropping malformed event bus message: {str(e)}")
+
+
+def create_event_bus(url: Optional[str] = None) -> LocalEventBus:
+    """Build the event bus for the configured backend ('redis://...' or local)"""
+    if url and url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisEventBus(url)
+    return LocalEventBus()
@@ -0,0 +1,206 @@
+"""Streaming export of learning records as CSV or NDJSON.
+
+    python -m modules.export --table interactions --format csv --gzip -o interactions.csv.gz
+    python -m modules.export --format ndjson --since "2024-09-01 00:00:00" --user-id 3 --user-id 7
+
+Rows are read in short keyset batches (id > last id), each its own
+statement, so no long-lived read snapshot pins the WAL and writers are
+never blocked. Output is produced by generators, so memory use does not
+grow with the size of the export. Shards are exported one after another;
+ids are only unique within a shard. Given a BackupService, rows are read
+from its read replicas where they are fresh enough, off the live files.
+"""
+import io
+import sys
+import csv
+import json
+import zlib
+import sqlite3
+import logging
+import argparse
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional
+
+from modules.database import USER_DB_PATH, get_db_connection
+from modules.archive import ActivityArchive, ARCHIVED_TABLES
+from modules.shards import ShardRouter, router as default_router
+from modules.backup import BackupService, REPLICA_DIR
+
+logger = logging.getLogger(__name__)
+
+EXPORT_TABLES = {
+    'interactions': ['id', 'user_id', 'topic', 'question', 'answer', 'is_correct',
+                     'response_time', 'model_used', 'timestamp'],
+    'rapid_quiz_responses': ['id', 'user_id', 'topic', 'question', 'user_answer', 'correct_answer',
+                             'is_correct', 'response_time', 'timestamp'],
+    'feedback': ['id', 'user_id', 'interaction_id', 'helpful_rating', 'clarity_rating',
+                 'engagement_rating', 'comments', 'timestamp'],
+}
+FORMATS = ('csv', 'ndjson')
+BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+
+
+class RecordExporter:
+    """Generators that turn table rows into export byte chunks"""
+
+    def __init__(self, shards: Optional[ShardRouter] = None, include_archived: bool = True,
+                 batch_size: int = BATCH_SIZE, replicas: Optional[BackupService] = None):
+        self.shards = shards or default_router
+        self.include_archived = include_archived
+        self.batch_size = batch_size
+        self.replicas = replicas
+
+    def watermark(self, user_ids: Optional[List[int]] = None) -> str:
+        """Upper bound for this export; pass it as `since` to the next incremental one.
+
+        When reading from replicas this is the age of the oldest one involved,
+        so rows a replica has not caught up with yet fall into the next export.
+        """
+        if self.replicas is None:
+            return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        as_of = self.replicas.as_of(self.shards.paths_for(user_ids))
+        return datetime.utcfromtimestamp(as_of).strftime('%Y-%m-%d %H:%M:%S')
+
+    def _iter_schema(self, conn: sqlite3.Connection, schema: str, table: str, until: str,
+                     since: Optional[str], user_ids: Optional[List[int]]) -> Iterator[tuple]:
+        columns = EXPORT_TABLES[table]
+        conditions = ['id > ?', 'timestamp < ?']
+        filters = [until]
+        if since:
+            conditions.append('timestamp >= ?')
+            filters.append(since)
+        if user_ids:
+            conditions.append(f"user_id IN ({', '.join('?' for _ in user_ids)})")
+            filters.extend(user_ids)
+        query = (
+            f"SELECT {', '.join(columns)} FROM {schema}.{table} "
+            f"WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?"
+        )
+        last_id = 0
+        while True:
+            count = 0
+            for row in conn.execute(query, [last_id, *filters, self.batch_size]):
+                count += 1
+                last_id = row[0]
+                yield row
+            if count < self.batch_size:
+                return
+
+    def iter_rows(self, table: str, until: str, since: Optional[str] = None,
+                  user_ids: Optional[List[int]] = None) -> Iterator[tuple]:
+        """Rows of one table with since <= timestamp < until, shard by shard"""
+        if table not in EXPORT_TABLES:
+            raise ValueError(f"Unknown export table: {table}")
+        for db_path in self.shards.paths_for(user_ids):
+            yield from self._iter_shard(db_path, table, until, since, user_ids)
+
+    def _iter_shard(self, db_path, table, until, since, user_ids) -> Iterator[tuple]:
+        """One shard's rows, archived months first"""
+        conn = self.replicas.connect_replica(db_path) if self.replicas else get_db_connection(db_path)
+        conn.row_factory = None
+        try:
+            if self.include_archived and table in ARCHIVED_TABLES:
+                archive = ActivityArchive(self.shards.archive_dir_for(db_path))
+                columns = EXPORT_TABLES[table]
+                for month in reversed(archive.partitions(conn, before=until, since=since)):
+                    with archive.attached(conn, month) as schema:
+                        for row in self._iter_schema(conn, schema, table, until, since, user_ids):
+                            yield tuple(archive.decode_row(dict(zip(columns, row))).values())
+            yield from self._iter_schema(conn, 'main', table, until, since, user_ids)
+        finally:
+            conn.close()
+
+    def iter_csv(self, table: str, until: str, since: Optional[str] = None,
+                 user_ids: Optional[List[int]] = None) -> Iterator[str]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_TABLES[table])
+        for row in self.iter_rows(table, until, since, user_ids):
+            writer.writerow(row)
+            if buffer.tell() >= CHUNK_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    def iter_ndjson(self, tables: Iterable[str], until: str, since: Optional[str] = None,
+                    user_ids: Optional[List[int]] = None) -> Iterator[str]:
+        parts = []
+        size = 0
+        for table in tables:
+            columns = EXPORT_TABLES[table]
+            for row in self.iter_rows(table, until, since, user_ids):
+                record = dict(zip(columns, row))
+                record['table'] = table
+                line = json.dumps(record) + '\n'
+                parts.append(line)
+                size += len(line)
+                if size >= CHUNK_SIZE:
+                    yield ''.join(parts)
+                    parts = []
+                    size = 0
+        yield ''.join(parts)
+
+    def stream(self, tables: List[str], fmt: str, until: str, since: Optional[str] = None,
+               user_ids: Optional[List[int]] = None, compress: bool = False) -> Iterator[bytes]:
+        """Encoded (and optionally gzipped) export chunks"""
+        for table in tables:
+            if table not in EXPORT_TABLES:
+                raise ValueError(f"Unknown export table: {table}")
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        if fmt == 'csv' and len(tables) != 1:
+            raise ValueError("CSV exports cover exactly one table")
+
+        if fmt == 'csv':
+            chunks = self.iter_csv(tables[0], until, since, user_ids)
+        else:
+            chunks = self.iter_ndjson(tables, until, since, user_ids)
+        if not compress:
+            return (chunk.encode('utf-8') for chunk in chunks if chunk)
+        return self._gzip(chunks)
+
+    @staticmethod
+    def _gzip(chunks: Iterator[str]) -> Iterator[bytes]:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+        for chunk in chunks:
+            data = compressor.compress(chunk.encode('utf-8'))
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export EduX learning records")
+    parser.add_argument('--db', default=USER_DB_PATH, help="Path to the primary (catalog) database")
+    parser.add_argument('--table', action='append', choices=sorted(EXPORT_TABLES),
+                        help="Table to export (repeatable; default: all, NDJSON only)")
+    parser.add_argument('--format', choices=FORMATS, default='ndjson')
+    parser.add_argument('--gzip', action='store_true', help="Gzip the output")
+    parser.add_argument('--since', help="Only rows at or after this watermark timestamp")
+    parser.add_argument('--user-id', type=int, action='append', help="Restrict to these users (repeatable)")
+    parser.add_argument('--no-archive', action='store_true', help="Skip archived months")
+    parser.add_argument('--replica-dir', help=f"Read from the read replicas in this directory, e.g. {REPLICA_DIR}")
+    parser.add_argument('-o', '--output', help="Output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    tables = args.table or list(EXPORT_TABLES)
+    shards = ShardRouter(args.db)
+    replicas = BackupService(shards, replica_dir=args.replica_dir) if args.replica_dir else None
+    exporter = RecordExporter(shards, include_archived=not args.no_archive, replicas=replicas)
+    until = exporter.watermark(args.user_id)
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for chunk in exporter.stream(tables, args.format, until, args.since, args.user_id, args.gzip):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+    # The watermark goes to stderr so it never mixes with exported data on stdout
+    print(f"watermark: {until}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
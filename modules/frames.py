@@ -0,0 +1,434 @@
+"""Frame sampling for slide extraction.
+
+Slide extraction looks at one frame every few seconds. There are two ways
+to get those frames out of cv2.VideoCapture:
+
+- sequential: decode straight through with grab() and convert only the
+  sampled frames with retrieve(). Nothing is decoded twice, but every
+  frame in between is decoded.
+- seek: set CAP_PROP_POS_FRAMES before each sample. The decoder restarts
+  from a keyframe before the target (OpenCV's FFmpeg backend also backs
+  off a few frames more), so a seek costs up to a GOP of decoding.
+
+Which one is cheaper depends on the codec, the GOP length and the
+interval, so 'auto' measures both on the file being read: it decodes
+sequentially at first, tries one seek once it knows the cost of a grab,
+and from then on picks, per sample, whichever costs less.
+"""
+import os
+import json
+import time
+import queue
+import shutil
+import logging
+import itertools
+import threading
+import subprocess
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLING_STRATEGIES = ('auto', 'sequential', 'seek')
+READ_AHEAD_FRAMES = 4
+# FrameReader grabs forward instead of seeking for gaps up to this many frames
+GRAB_LIMIT = 24
+# Weight of the newest measurement in the running cost estimates
+COST_SMOOTHING = 0.3
+FFMPEG_CMD = os.environ.get('FFMPEG_CMD', 'ffmpeg')
+FFPROBE_CMD = os.environ.get('FFPROBE_CMD', 'ffprobe')
+# A file still being downloaded is checked for new data this often
+FOLLOW_POLL_SECONDS = 0.5
+FOLLOW_CHUNK_BYTES = 1 << 20
+
+
+class FrameSampler:
+    """Yields (frame_number, frame) for one frame every `interval` seconds, and the last frame.
+
+    start_frame and end_frame (exclusive) limit sampling to one segment.
+    `interval` may be changed while iterating; behind read_ahead() the
+    change takes effect a few samples later.
+    """
+
+    def __init__(self, video_path: str, interval: float = 5, strategy: str = 'auto',
+                 start_frame: int = 0, end_frame: Optional[int] = None):
+        if strategy not in SAMPLING_STRATEGIES:
+            raise ValueError(f"Unknown sampling strategy: {strategy}")
+        self.video_path = video_path
+        self.interval = interval
+        self.strategy = strategy
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        self.fps = 0.0
+        self.total_frames = 0
+        self.stats = {'sampled': 0, 'grabbed': 0, 'seeks': 0, 'seconds': 0.0}
+        self._grab_cost = None
+        self._seek_cost = None
+
+    @property
+    def step(self) -> int:
+        return max(1, int(round(self.fps * self.interval)))
+
+    def _update(self, name: str, seconds: float) -> None:
+        current = getattr(self, name)
+        setattr(self, name, seconds if current is None else current + COST_SMOOTHING * (seconds - current))
+
+    def _should_seek(self, gap: int) -> bool:
+        if self.strategy != 'auto':
+            return self.strategy == 'seek'
+        if gap <= 0 or self._grab_cost is None:
+            return False
+        if self._seek_cost is None:
+            return True  # measure one seek
+        return self._seek_cost < gap * self._grab_cost
+
+    def __iter__(self) -> Iterator[Tuple[int, np.ndarray]]:
+        cap = cv2.VideoCapture(self.video_path)
+        if not cap.isOpened():
+            raise IOError(f"Cannot open video: {self.video_path}")
+        started = time.perf_counter()
+        try:
+            self.fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+            self.total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            if self.fps <= 0:
+                raise IOError(f"Video has no frame rate: {self.video_path}")
+            end = self.total_frames
+            if self.end_frame is not None:
+                end = min(end, self.end_frame) if end > 0 else self.end_frame
+            position = 0  # index of the frame the next grab() decodes
+            if self.start_frame > 0:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, self.start_frame)
+                position = self.start_frame
+            target = self.start_frame
+            last = end - 1
+            while end <= 0 or target <= last:
+                frame = self._read(cap, position, target)
+                position = target + 1
+                if frame is not None:
+                    self.stats['sampled'] += 1
+                    yield target, frame
+                elif end <= 0:
+                    break  # unknown length: a failed read means the end
+                if target < last < target + self.step:
+                    target = last  # also look at the end, which a stride could jump over
+                else:
+                    target += self.step
+        finally:
+            cap.release()
+            self.stats['seconds'] += time.perf_counter() - started
+
+    def _read(self, cap, position: int, target: int) -> Optional[np.ndarray]:
+        gap = target - position
+        if self._should_seek(gap):
+            tick = time.perf_counter()
+            cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+            ok, frame = cap.read()
+            self._update('_seek_cost', time.perf_counter() - tick)
+            self.stats['seeks'] += 1
+            return frame if ok else None
+
+        tick = time.perf_counter()
+        for _ in range(gap):
+            if not cap.grab():
+                return None
+        ok = cap.grab()
+        if gap > 0:
+            self._update('_grab_cost', (time.perf_counter() - tick) / (gap + 1))
+        self.stats['grabbed'] += gap + 1
+        if not ok:
+            return None
+        ok, frame = cap.retrieve()
+        return frame if ok else None
+
+
+class FrameReader:
+    """Single frames by number, for targeted decodes between samples"""
+
+    def __init__(self, video_path: str, grab_limit: int = GRAB_LIMIT):
+        self.video_path = video_path
+        self.grab_limit = grab_limit
+        self.reads = 0
+        self._cap = None
+        self._position = 0
+
+    def read(self, frame_num: int) -> Optional[np.ndarray]:
+        if self._cap is None:
+            self._cap = cv2.VideoCapture(self.video_path)
+            self._position = 0
+        gap = frame_num - self._position
+        if 0 <= gap <= self.grab_limit:
+            for _ in range(gap):
+                self._cap.grab()
+        else:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
+        ok, frame = self._cap.read()
+        self._position = frame_num + 1
+        self.reads += 1
+        return frame if ok else None
+
+    def close(self) -> None:
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which(FFMPEG_CMD) is not None and shutil.which(FFPROBE_CMD) is not None
+
+
+def probe(video_path: str) -> Optional[dict]:
+    """fps, total_frames (None if unknown), width, height and start_time of the first video stream"""
+    result = subprocess.run([
+        FFPROBE_CMD, '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'stream=avg_frame_rate,r_frame_rate,nb_frames,width,height,start_time,duration',
+        '-show_entries', 'format=duration', '-of', 'json', video_path
+    ], capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    info = json.loads(result.stdout or '{}')
+    streams = info.get('streams') or []
+    if not streams or not streams[0].get('width'):
+        return None
+    stream = streams[0]
+    fps = 0.0
+    for field in ('avg_frame_rate', 'r_frame_rate'):
+        numerator, _, denominator = (stream.get(field) or '0/0').partition('/')
+        if float(denominator or 0) > 0 and float(numerator) > 0:
+            fps = float(numerator) / float(denominator)
+            break
+    if fps <= 0:
+        return None
+    total_frames = int(stream['nb_frames']) if str(stream.get('nb_frames', '')).isdigit() else None
+    duration = stream.get('duration') or info.get('format', {}).get('duration')
+    if total_frames is None and duration not in (None, 'N/A'):
+        total_frames = int(float(duration) * fps)
+    return {'fps': fps, 'total_frames': total_frames, 'width': int(stream['width']),
+            'height': int(stream['height']), 'start_time': float(stream.get('start_time') or 0)}
+
+
+def wait_for_probe(video_path: str, growing: Callable[[], bool], poll: float = FOLLOW_POLL_SECONDS) -> Optional[dict]:
+    """probe() of a file still being written, as soon as enough of it is there"""
+    while True:
+        still_growing = growing()
+        if os.path.exists(video_path) and os.path.getsize(video_path) > 0:
+            info = probe(video_path)
+            if info is not None or not still_growing:
+                return info
+        elif not still_growing:
+            return None
+        time.sleep(poll)
+
+
+def scaled_size(width: int, height: int, max_side: int) -> Tuple[int, int]:
+    """Size of a frame scaled to at most max_side, as ChangeDetector.signature() scales it"""
+    scale = min(1.0, max_side / max(width, height))
+    return (round(width * scale), round(height * scale)) if scale < 1.0 else (width, height)
+
+
+class FfmpegSampler:
+    """Yields (frame_number, frame) like FrameSampler, decoded by an ffmpeg process.
+
+    ffmpeg selects the sampled frames itself - every `interval` seconds and
+    the last frame, or with keyframes=True the first keyframe of each
+    interval, decoding no other frames (-skip_frame nokey) - scales them to at most max_side
+    and converts them to grayscale, so only small gray frames cross the
+    pipe, straight into numpy arrays. They are what ChangeDetector needs,
+    not what a slide image should be made of.
+
+    If growing() is given, the file is still being downloaded: it is fed
+    to ffmpeg as it grows, so sampling starts with the first frames there.
+    That only works for files whose index comes first (faststart MP4s, WebM,
+    MPEG-TS); others cannot be probed, and so not sampled, before they end.
+    Changing `interval` while iterating has no effect.
+    """
+
+    def __init__(self, video_path: str, interval: float = 5, keyframes: bool = False, start_frame: int = 0,
+                 end_frame: Optional[int] = None, max_side: int = 640, growing: Optional[Callable[[], bool]] = None):
+        self.video_path = video_path
+        self.interval = interval
+        self.keyframes = keyframes
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        self.max_side = max_side
+        self.growing = growing
+        self.fps = 0.0
+        self.total_frames = 0
+        self.stats = {'sampled': 0, 'grabbed': 0, 'seeks': 0, 'seconds': 0.0}
+
+    def _keyframe_numbers(self, info: dict, start: int, end: Optional[int]) -> List[int]:
+        """Frame numbers of the keyframes in [start, end), from the packet index without decoding"""
+        result = subprocess.run([
+            FFPROBE_CMD, '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'packet=pts_time,flags',
+            '-of', 'csv=p=0', self.video_path
+        ], capture_output=True, text=True)
+        if result.returncode != 0:
+            raise IOError(f"Cannot list keyframes: {result.stderr.strip()}")
+        numbers = set()
+        for line in result.stdout.splitlines():
+            pts_time, _, flags = line.partition(',')
+            if 'K' in flags and pts_time not in ('', 'N/A'):
+                number = int(round((float(pts_time) - info['start_time']) * info['fps']))
+                if number >= start and (end is None or number < end):
+                    numbers.add(number)
+        return sorted(numbers)
+
+    def __iter__(self) -> Iterator[Tuple[int, np.ndarray]]:
+        started = time.perf_counter()
+        info = wait_for_probe(self.video_path, self.growing) if self.growing else probe(self.video_path)
+        if info is None:
+            raise IOError(f"Cannot probe video: {self.video_path}")
+        self.fps = info['fps']
+        self.total_frames = info['total_frames'] or 0
+        end = self.end_frame
+        if info['total_frames']:
+            end = min(end, info['total_frames']) if end is not None else info['total_frames']
+        start = self.start_frame
+        width, height = scaled_size(info['width'], info['height'], self.max_side)
+        step = max(1, int(round(self.fps * self.interval)))
+
+        command = [FFMPEG_CMD, '-nostdin', '-v', 'error']
+        if self.keyframes:
+            numbers = self._keyframe_numbers(info, start, end)
+            command += ['-skip_frame', 'nokey']
+            selection = None
+        else:
+            numbers = None
+            # n counts frames from the seek point; also take the segment's last frame
+            selection = f'not(mod(n\\,{step}))'
+            if end is not None:
+                selection += f'+eq(n\\,{end - start - 1})'
+        if start > 0 and not self.growing:
+            command += ['-ss', f'{start / self.fps:.6f}']
+            self.stats['seeks'] += 1
+        command += ['-i', 'pipe:0' if self.growing else self.video_path]
+        filters = [f'select={selection}'] if selection else []
+        filters += [f'scale={width}:{height}:flags=area', 'format=gray']
+        # -vsync rather than -fps_mode, which only FFmpeg 5.1 and later accept
+        command += ['-an', '-sn', '-vf', ','.join(filters), '-vsync', 'passthrough']
+        if numbers is not None:
+            command += ['-frames:v', str(len(numbers))]
+        elif end is not None:
+            command += ['-frames:v', str(len(range(0, end - start, step)) + ((end - start - 1) % step > 0))]
+        command += ['-f', 'rawvideo', '-pix_fmt', 'gray', 'pipe:1']
+
+        process = subprocess.Popen(command, stdin=subprocess.PIPE if self.growing else subprocess.DEVNULL,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        feeder = None
+        if self.growing:
+            feeder = threading.Thread(target=self._feed, args=(process,), name='edux-ffmpeg-feed', daemon=True)
+            feeder.start()
+        errors = []
+        reader = threading.Thread(target=lambda: errors.append(process.stderr.read()), daemon=True)
+        reader.start()
+        exhausted = False
+        previous = None  # last keyframe yielded
+        try:
+            for index in itertools.count():
+                frame = np.empty((height, width), np.uint8)
+                if not self._fill(process.stdout, memoryview(frame).cast('B')):
+                    exhausted = True
+                    break
+                if numbers is not None:
+                    if index >= len(numbers):
+                        break
+                    number = numbers[index]
+                    # At most one keyframe per interval, and the last one
+                    if previous is not None and number - previous < step and index < len(numbers) - 1:
+                        continue
+                    previous = number
+                else:
+                    number = start + index * step
+                    if end is not None and number >= end:
+                        number = end - 1
+                self.stats['sampled'] += 1
+                yield number, frame
+        finally:
+            # Stopped early (enough frames, or the caller is done): no need to decode the rest
+            if not exhausted and process.poll() is None:
+                process.kill()
+            process.wait()
+            reader.join()
+            if feeder is not None:
+                feeder.join()
+            self.stats['seconds'] += time.perf_counter() - started
+        if exhausted and process.returncode != 0:
+            message = errors[0].decode(errors='replace').strip() if errors else ''
+            raise IOError(f"ffmpeg failed on {self.video_path}: {message[-500:]}")
+
+    @staticmethod
+    def _fill(stream, buffer: memoryview) -> bool:
+        """Read exactly one frame into buffer; False at the end of the stream"""
+        filled = 0
+        while filled < len(buffer):
+            count = stream.readinto(buffer[filled:])
+            if not count:
+                return False
+            filled += count
+        return True
+
+    def _feed(self, process: subprocess.Popen) -> None:
+        """Copy the file into ffmpeg's stdin as it grows, until the download has finished"""
+        stdin = process.stdin
+        try:
+            with open(self.video_path, 'rb') as f:
+                while process.poll() is None:
+                    growing = self.growing()
+                    chunk = f.read(FOLLOW_CHUNK_BYTES)
+                    if chunk:
+                        stdin.write(chunk)
+                    elif not growing:
+                        break
+                    else:
+                        time.sleep(FOLLOW_POLL_SECONDS)
+        except (BrokenPipeError, ValueError, OSError):
+            pass  # ffmpeg has stopped reading
+        finally:
+            try:
+                stdin.close()
+            except OSError:
+                pass
+
+
+def read_ahead(frames: Iterable, depth: int = READ_AHEAD_FRAMES) -> Iterator:
+    """Iterate `frames` in a background thread, up to `depth` items ahead of the caller.
+
+    OpenCV releases the GIL while decoding, so the next frames are decoded
+    while the caller waits on OCR or compares images.
+    """
+    buffer = queue.Queue(maxsize=depth)
+    done = object()
+    stop = threading.Event()
+
+    def put(entry) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in frames:
+                if not put((item, None)):
+                    return
+            put((done, None))
+        except Exception as e:
+            put((done, e))
+
+    thread = threading.Thread(target=produce, name='edux-read-ahead', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,310 @@
+"""Background jobs for long-running work such as slide extraction.
+
+Jobs are rows in the catalog's jobs table, so their state survives a
+restart and any app process can report on a job another one runs. Every
+process started with start() runs a few worker threads that claim queued
+jobs in one IMMEDIATE transaction, which also enforces max_running across
+all processes. A running job's heartbeat is refreshed in the background;
+a job whose heartbeat stops (its process died) is claimed again.
+
+Handlers are registered per kind and called as handler(job, report).
+report(done, total, **details) records progress and raises JobCancelled
+once a cancel has been requested, so handlers stop at their next report.
+Progress is written and published at most every PROGRESS_INTERVAL_SECONDS.
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+from modules.database import USER_DB_PATH, BUSY_TIMEOUT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.environ.get('EDUX_JOB_WORKERS', 2))
+MAX_RUNNING_JOBS = int(os.environ.get('EDUX_MAX_RUNNING_JOBS', 2))
+POLL_SECONDS = 1.0
+HEARTBEAT_SECONDS = 10
+# A running job whose heartbeat is older than this has lost its process
+STALE_SECONDS = 60
+PROGRESS_INTERVAL_SECONDS = 1.0
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+FINAL_STATES = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised from report() inside a handler whose job was cancelled"""
+
+
+def dedup_key(kind: str, params: dict) -> str:
+    return hashlib.sha256(json.dumps([kind, params], sort_keys=True).encode()).hexdigest()
+
+
+class JobQueue:
+    """Persistent job queue with a worker pool in each app process"""
+
+    def __init__(self, db_path: str = USER_DB_PATH, workers: int = JOB_WORKERS,
+                 max_running: int = MAX_RUNNING_JOBS, publish: Optional[Callable[[int, dict], None]] = None):
+        self.db_path = db_path
+        self.workers = workers
+        self.max_running = max_running
+        self.publish = publish
+        self._handlers: Dict[str, Callable] = {}
+        self._running = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def register(self, kind: str, handler: Callable) -> None:
+        self._handlers[kind] = handler
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _to_dict(row) -> dict:
+        job = dict(row)
+        for field in ('params', 'progress', 'result'):
+            job[field] = json.loads(job[field]) if job[field] else None
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        job.pop('dedup_key', None)
+        return job
+
+    # --- API for views ----------------------------------------------------------
+
+    def submit(self, user_id: int, kind: str, params: dict) -> dict:
+        """Queue a job, or return the user's queued or running job with the same kind and params"""
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        key = dedup_key(kind, params)
+        conn = self._connect()
+        try:
+            try:
+                conn.execute(
+                    'INSERT INTO jobs (id, user_id, kind, params, dedup_key, state, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (uuid.uuid4().hex, user_id, kind, json.dumps(params), key, QUEUED, time.time())
+                )
+            except sqlite3.IntegrityError:
+                pass  # an identical job is already queued or running
+            row = conn.execute(
+                f"SELECT * FROM jobs WHERE user_id = ? AND dedup_key = ? AND state IN ('{QUEUED}', '{RUNNING}')",
+                (user_id, key)
+            ).fetchone()
+        finally:
+            conn.close()
+        self._wake.set()
+        # The job may have finished between the insert and the select
+        return self._to_dict(row) if row else self.latest(user_id, kind)
+
+    def get(self, job_id: str, user_id: Optional[int] = None) -> Optional[dict]:
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        finally:
+            conn.close()
+        if row is None or (user_id is not None and row['user_id'] != user_id):
+            return None
+        return self._to_dict(row)
+
+    def latest(self, user_id: int, kind: str, state: Optional[str] = None) -> Optional[dict]:
+        jobs = self.list(user_id, kind=kind, state=state, limit=1)
+        return jobs[0] if jobs else None
+
+    def list(self, user_id: int, kind: Optional[str] = None, state: Optional[str] = None,
+             limit: int = 20) -> List[dict]:
+        query, args = 'SELECT * FROM jobs WHERE user_id = ?', [user_id]
+        if kind:
+            query, args = query + ' AND kind = ?', args + [kind]
+        if state:
+            query, args = query + ' AND state = ?', args + [state]
+        conn = self._connect()
+        try:
+            rows = conn.execute(query + ' ORDER BY created_at DESC LIMIT ?', args + [limit]).fetchall()
+        finally:
+            conn.close()
+        return [self._to_dict(row) for row in rows]
+
+    def cancel(self, job_id: str, user_id: int) -> Optional[dict]:
+        """Cancel a queued job at once; a running one stops at its next progress report"""
+        conn = self._connect()
+        try:
+            conn.execute(
+                f"UPDATE jobs SET state = '{CANCELLED}', finished_at = ? WHERE id = ? AND user_id = ? AND state = '{QUEUED}'",
+                (time.time(), job_id, user_id)
+            )
+            conn.execute(
+                f"UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND user_id = ? AND state = '{RUNNING}'",
+                (job_id, user_id)
+            )
+        finally:
+            conn.close()
+        job = self.get(job_id, user_id)
+        if job:
+            self._publish(job)
+        return job
+
+    def delete(self, job_id: str, user_id: int) -> bool:
+        """Delete a finished, failed or cancelled job; False if it is still queued or running"""
+        conn = self._connect()
+        try:
+            deleted = conn.execute(
+                f"DELETE FROM jobs WHERE id = ? AND user_id = ? AND state IN {FINAL_STATES!r}", (job_id, user_id)
+            ).rowcount
+        finally:
+            conn.close()
+        return bool(deleted)
+
+    # --- workers --------------------------------------------------------------
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            self._threads = [threading.Thread(target=self._work, name=f'edux-job-{n}', daemon=True)
+                             for n in range(self.workers)]
+            self._threads.append(threading.Thread(target=self._beat, name='edux-job-heartbeat', daemon=True))
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stop.set()
+        self._wake.set()
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+
+    def _claim(self) -> Optional[dict]:
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                running = conn.execute(
+                    f"SELECT COUNT(*) FROM jobs WHERE state = '{RUNNING}' AND heartbeat_at >= ?",
+                    (now - STALE_SECONDS,)
+                ).fetchone()[0]
+                row = None
+                if running < self.max_running:
+                    row = conn.execute(
+                        f"""SELECT * FROM jobs WHERE state = '{QUEUED}'
+                            OR (state = '{RUNNING}' AND heartbeat_at < ?)
+                            ORDER BY created_at LIMIT 1""",
+                        (now - STALE_SECONDS,)
+                    ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        f"UPDATE jobs SET state = '{RUNNING}', started_at = ?, heartbeat_at = ? WHERE id = ?",
+                        (now, now, row['id'])
+                    )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            if row is None:
+                return None
+            return self._to_dict(conn.execute('SELECT * FROM jobs WHERE id = ?', (row['id'],)).fetchone())
+        finally:
+            conn.close()
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            try:
+                job = self._claim()
+            except sqlite3.Error as e:
+                logger.error(f"Could not claim a job: {str(e)}")
+                job = None
+            if job is None:
+                self._wake.wait(POLL_SECONDS)
+                self._wake.clear()
+                continue
+            self._run(job)
+
+    def _beat(self) -> None:
+        while not self._stop.wait(HEARTBEAT_SECONDS):
+            with self._lock:
+                running = list(self._running)
+            if not running:
+                continue
+            try:
+                conn = self._connect()
+                try:
+                    conn.executemany('UPDATE jobs SET heartbeat_at = ? WHERE id = ?',
+                                     [(time.time(), job_id) for job_id in running])
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                logger.error(f"Job heartbeat failed: {str(e)}")
+
+    def _run(self, job: dict) -> None:
+        started = time.monotonic()
+        last_report = [0.0]
+
+        def report(done: Optional[float] = None, total: Optional[float] = None, **details) -> None:
+            now = time.monotonic()
+            if now - last_report[0] < PROGRESS_INTERVAL_SECONDS and not (total and done == total):
+                return
+            last_report[0] = now
+            progress = dict(details, done=done, total=total, eta_seconds=None)
+            if done and total:
+                progress['eta_seconds'] = round((now - started) * (total - done) / done)
+            if self._save(job['id'], progress=progress):
+                raise JobCancelled()
+
+        with self._lock:
+            self._running.add(job['id'])
+        self._publish(job)
+        try:
+            result = self._handlers[job['kind']](job, report)
+            self._finish(job['id'], DONE, result=result)
+        except JobCancelled:
+            self._finish(job['id'], CANCELLED)
+        except Exception as e:
+            logger.error(f"Job {job['id']} ({job['kind']}) failed: {str(e)}")
+            self._finish(job['id'], FAILED, error=str(e))
+        finally:
+            with self._lock:
+                self._running.discard(job['id'])
+
+    def _save(self, job_id: str, progress: dict) -> bool:
+        """Store progress and publish it; returns True if the job should be cancelled"""
+        conn = self._connect()
+        try:
+            conn.execute('UPDATE jobs SET progress = ?, heartbeat_at = ? WHERE id = ?',
+                         (json.dumps(progress), time.time(), job_id))
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        finally:
+            conn.close()
+        job = self._to_dict(row)
+        self._publish(job)
+        return job['cancel_requested']
+
+    def _finish(self, job_id: str, state: str, result: Optional[dict] = None, error: Optional[str] = None) -> None:
+        conn = self._connect()
+        try:
+            conn.execute(
+                'UPDATE jobs SET state = ?, result = ?, error = ?, finished_at = ? WHERE id = ?',
+                (state, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+            )
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        finally:
+            conn.close()
+        self._publish(self._to_dict(row))
+
+    def _publish(self, job: dict) -> None:
+        if self.publish is None:
+            return
+        try:
+            self.publish(job['user_id'], {'type': 'job', 'job': job})
+        except Exception as e:
+            logger.error(f"Could not publish job update: {str(e)}")
@@ -15,14 +15,35 @@ class LLMHandler:
         self.timeout = 120  # 2 minutes
         self.max_retries = 2
         self.retry_delay = 5
-        self.server_available = self._verify_connection()
+        self.probe_timeout = 5
+        self.recheck_seconds = 30
+        self._server_available = None
+        self._checked_at = 0.0
+
+    @property
+    def server_available(self) -> bool:
+        """Whether Ollama answers; probed on first use rather than at startup.
+
+        A failed probe is retried after recheck_seconds, so the app notices
+        an Ollama server started after it.
+        """
+        if self._server_available is None or (
+                not self._server_available and time.monotonic() - self._checked_at > self.recheck_seconds):
+            self._server_available = self._verify_connection()
+            self._checked_at = time.monotonic()
+        return self._server_available
+
+    @server_available.setter
+    def server_available(self, value: bool) -> None:
+        self._server_available = value
+        self._checked_at = time.monotonic()
 
     def _verify_connection(self) -> bool:
-        """Verify Ollama is running with increased timeout"""
+        """Verify Ollama is running"""
         try:
             response = requests.get(
                 f"{self.base_url}/api/tags",
-                timeout=self.timeout
+                timeout=self.probe_timeout
             )
             if response.status_code != 200:
                 logger.error("Ollama connection failed - is the service running?")
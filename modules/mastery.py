@@ -0,0 +1,115 @@
+import sqlite3
+import logging
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Exponentially-weighted knowledge tracing: each graded answer moves the
+# estimate a fixed fraction of the way towards 1 (correct) or 0 (wrong),
+# so recent answers count most and an update needs only the current row.
+PRIOR_MASTERY = 0.5
+LEARNING_RATE = 0.3
+RESPONSE_TIME_RATE = 0.3
+
+REVIEW_THRESHOLD = 0.6
+MASTERED_THRESHOLD = 0.85
+FAST_RESPONSE_SECONDS = 5
+DEFAULT_RECOMMENDATIONS = 5
+
+
+class MasteryIndex:
+    """Per-user, per-topic mastery estimates with a ranked recommendation.
+
+    Every row carries its own recommendation text and priority, written at
+    update time, so a user's ranked list is one range scan of the
+    (user_id, priority) index instead of a pass over their history.
+    """
+
+    @staticmethod
+    def confidence(attempts: int) -> float:
+        """Share of the estimate that comes from evidence rather than the prior"""
+        return 1 - (1 - LEARNING_RATE) ** attempts
+
+    @staticmethod
+    def recommend(topic: str, mastery: float, attempts: int, avg_response_time: Optional[float]):
+        """(priority, recommendation) for one topic; priority 0 means nothing to suggest"""
+        confidence = MasteryIndex.confidence(attempts)
+        if mastery < REVIEW_THRESHOLD:
+            # Most urgent first: low mastery we are sure about outranks a single slip
+            return 2 + (1 - mastery) * confidence, f"Needs review: {topic} (Mastery: {mastery * 100:.0f}%)"
+        if mastery < MASTERED_THRESHOLD:
+            return 1 + (1 - mastery) * confidence, f"Keep practicing: {topic} (Mastery: {mastery * 100:.0f}%)"
+        if avg_response_time is not None and avg_response_time < FAST_RESPONSE_SECONDS:
+            return confidence * 0.5, f"Practice deeper thinking: {topic}"
+        return 0, None
+
+    @staticmethod
+    def update(conn: sqlite3.Connection, user_id: int, topic_id: Optional[int], topic: str,
+               is_correct: bool, response_time: Optional[float] = None) -> Optional[dict]:
+        """Fold one graded answer into the user's mastery of a topic.
+
+        Runs inside the caller's transaction; returns the updated row.
+        """
+        return MasteryIndex.update_many(conn, user_id, topic_id, topic, [(is_correct, response_time)])
+
+    @staticmethod
+    def update_many(conn: sqlite3.Connection, user_id: int, topic_id: Optional[int], topic: str,
+                    results: List[Tuple[bool, Optional[float]]]) -> Optional[dict]:
+        """Fold several answers on one topic, in order, with one read and one write"""
+        if topic_id is None or not results:
+            return None
+        row = conn.execute('''
+            SELECT mastery, attempts, correct_count, avg_response_time
+            FROM topic_mastery WHERE user_id = ? AND topic_id = ?
+        ''', (user_id, topic_id)).fetchone()
+        mastery, attempts, correct_count, avg_response_time = row if row else (PRIOR_MASTERY, 0, 0, None)
+
+        for is_correct, response_time in results:
+            mastery += LEARNING_RATE * ((1.0 if is_correct else 0.0) - mastery)
+            attempts += 1
+            correct_count += 1 if is_correct else 0
+            if response_time is not None:
+                avg_response_time = (response_time if avg_response_time is None
+                                     else avg_response_time + RESPONSE_TIME_RATE * (response_time - avg_response_time))
+        priority, recommendation = MasteryIndex.recommend(topic, mastery, attempts, avg_response_time)
+
+        conn.execute('''
+            INSERT OR REPLACE INTO topic_mastery
+            (user_id, topic_id, topic, mastery, attempts, correct_count, avg_response_time,
+             priority, recommendation, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ''', (user_id, topic_id, topic, mastery, attempts, correct_count, avg_response_time,
+              priority, recommendation))
+        return {
+            'topic': topic,
+            'mastery': round(mastery, 4),
+            'attempts': attempts,
+            'correct_count': correct_count,
+            'avg_response_time': avg_response_time,
+            'recommendation': recommendation
+        }
+
+    @staticmethod
+    def get(conn: sqlite3.Connection, user_id: int, topic_id: Optional[int]) -> Optional[dict]:
+        if topic_id is None:
+            return None
+        row = conn.execute('''
+            SELECT topic, mastery, attempts, correct_count, avg_response_time, recommendation
+            FROM topic_mastery WHERE user_id = ? AND topic_id = ?
+        ''', (user_id, topic_id)).fetchone()
+        if not row:
+            return None
+        return dict(zip(('topic', 'mastery', 'attempts', 'correct_count', 'avg_response_time',
+                         'recommendation'), row))
+
+    @staticmethod
+    def recommendations(conn: sqlite3.Connection, user_id: int,
+                        limit: int = DEFAULT_RECOMMENDATIONS) -> List[str]:
+        """The user's ranked recommendations, most urgent first"""
+        rows = conn.execute('''
+            SELECT recommendation FROM topic_mastery
+            WHERE user_id = ? AND priority > 0
+            ORDER BY priority DESC
+            LIMIT ?
+        ''', (user_id, limit)).fetchall()
+        return [row[0] for row in rows]
@@ -0,0 +1,608 @@
+"""Numbered schema migrations for the primary database.
+
+Run pending migrations with:
+
+    python -m modules.migrations upgrade
+    python -m modules.migrations status
+
+Each migration has a schema step, run in one short transaction, and
+optional backfills. Backfills walk the table in rowid batches and commit
+after every batch, so live writers are only ever kept waiting for one batch.
+Backfill progress is saved in the same transaction as each batch, so an
+interrupted upgrade picks up where it stopped.
+"""
+import sys
+import time
+import sqlite3
+import logging
+import argparse
+from typing import Callable, List, Optional
+
+from modules.database import USER_DB_PATH, BUSY_TIMEOUT_SECONDS
+from modules.topics import TopicIndex, TOPIC_TABLES
+from modules.mastery import MasteryIndex
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_BATCH_PAUSE = 0.05  # seconds between batches, lets queued writers in
+
+
+class Backfill:
+    """A resumable data migration over rowid ranges of one table"""
+
+    def __init__(self, name: str, table: str, apply_batch: Callable[[sqlite3.Connection, int, int], None]):
+        self.name = name
+        self.table = table
+        self.apply_batch = apply_batch
+
+
+class Migration:
+    def __init__(self, version: int, name: str, schema: Callable[[sqlite3.Connection], None],
+                 backfills: Optional[List[Backfill]] = None):
+        self.version = version
+        self.name = name
+        self.schema = schema
+        self.backfills = backfills or []
+
+
+# --- 1: initial schema -------------------------------------------------------
+
+def _initial_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE,
+            password_hash TEXT NOT NULL,
+            is_verified BOOLEAN DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            last_login DATETIME
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_progress (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            topic TEXT,
+            correct_count INTEGER DEFAULT 0,
+            incorrect_count INTEGER DEFAULT 0,
+            avg_response_time REAL DEFAULT 0,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS interactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            topic TEXT,
+            question TEXT,
+            answer TEXT,
+            is_correct BOOLEAN,
+            response_time REAL,
+            model_used TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS rapid_quiz_responses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            topic TEXT,
+            question TEXT,
+            user_answer TEXT,
+            correct_answer TEXT,
+            is_correct BOOLEAN,
+            response_time REAL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS feedback (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            interaction_id INTEGER,
+            helpful_rating INTEGER,
+            clarity_rating INTEGER,
+            engagement_rating INTEGER,
+            comments TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id),
+            FOREIGN KEY(interaction_id) REFERENCES interactions(id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_preferences (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER UNIQUE,
+            interests TEXT,
+            learning_style TEXT,
+            preferred_explanation_style TEXT DEFAULT 'standard',
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    ''')
+
+
+# --- 2: activity history indexes ---------------------------------------------
+
+def _activity_indexes(conn):
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_interactions_user_time ON interactions(user_id, timestamp)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_interactions_user_topic_time ON interactions(user_id, topic, timestamp)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_rapid_quiz_user_time ON rapid_quiz_responses(user_id, timestamp)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_rapid_quiz_user_topic_time ON rapid_quiz_responses(user_id, topic, timestamp)')
+
+
+# --- 3: normalized topic index -----------------------------------------------
+
+def _topic_index(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS topics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            topic_key TEXT UNIQUE NOT NULL,
+            display_name TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS topic_aliases (
+            alias TEXT PRIMARY KEY,
+            topic_id INTEGER NOT NULL,
+            FOREIGN KEY(topic_id) REFERENCES topics(id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_topic_stats (
+            user_id INTEGER NOT NULL,
+            topic_id INTEGER NOT NULL,
+            attempts INTEGER DEFAULT 0,
+            correct_count INTEGER DEFAULT 0,
+            PRIMARY KEY(user_id, topic_id),
+            FOREIGN KEY(user_id) REFERENCES users(id),
+            FOREIGN KEY(topic_id) REFERENCES topics(id)
+        ) WITHOUT ROWID
+    ''')
+    for table in TOPIC_TABLES:
+        add_column(conn, table, 'topic_id', 'INTEGER REFERENCES topics(id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_user_progress_user_topic_id ON user_progress(user_id, topic_id)')
+
+
+def _backfill_topic_ids(table):
+    def apply_batch(conn, low, high):
+        rows = conn.execute(
+            f'SELECT id, topic FROM {table} WHERE id > ? AND id <= ? AND topic_id IS NULL AND topic IS NOT NULL',
+            (low, high)
+        ).fetchall()
+        topic_ids = {}
+        updates = []
+        for row_id, name in rows:
+            if name not in topic_ids:
+                topic_ids[name] = TopicIndex.resolve(conn, name)
+            if topic_ids[name] is not None:
+                updates.append((topic_ids[name], row_id))
+        conn.executemany(f'UPDATE {table} SET topic_id = ? WHERE id = ?', updates)
+    return apply_batch
+
+
+def _backfill_topic_stats(conn, low, high):
+    # Rows written after the schema step are counted by the write path itself,
+    # which is why backfills stop at the high-water mark taken at that point.
+    conn.execute('''
+        INSERT INTO user_topic_stats (user_id, topic_id, attempts, correct_count)
+        SELECT user_id, topic_id, COUNT(*), SUM(CASE WHEN is_correct THEN 1 ELSE 0 END)
+        FROM interactions
+        WHERE id > ? AND id <= ? AND user_id IS NOT NULL AND topic_id IS NOT NULL
+        GROUP BY user_id, topic_id
+        ON CONFLICT(user_id, topic_id) DO UPDATE SET
+            attempts = attempts + excluded.attempts,
+            correct_count = correct_count + excluded.correct_count
+    ''', (low, high))
+
+
+# --- 4: activity archival ----------------------------------------------------
+
+def _activity_archive(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS activity_rollups (
+            user_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            activity_type TEXT NOT NULL,
+            topic TEXT NOT NULL DEFAULT '',
+            topic_id INTEGER,
+            attempts INTEGER DEFAULT 0,
+            correct_count INTEGER DEFAULT 0,
+            total_response_time REAL DEFAULT 0,
+            PRIMARY KEY(user_id, month, activity_type, topic),
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archive_partitions (
+            month TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            interactions INTEGER DEFAULT 0,
+            rapid_quiz_responses INTEGER DEFAULT 0,
+            archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+# --- 5: mastery index ---------------------------------------------------------
+
+def _mastery_index(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS topic_mastery (
+            user_id INTEGER NOT NULL,
+            topic_id INTEGER NOT NULL,
+            topic TEXT,
+            mastery REAL NOT NULL,
+            attempts INTEGER DEFAULT 0,
+            correct_count INTEGER DEFAULT 0,
+            avg_response_time REAL,
+            priority REAL DEFAULT 0,
+            recommendation TEXT,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY(user_id, topic_id),
+            FOREIGN KEY(user_id) REFERENCES users(id),
+            FOREIGN KEY(topic_id) REFERENCES topics(id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_topic_mastery_rank ON topic_mastery(user_id, priority)')
+
+
+def _backfill_mastery(conn, low, high):
+    # Replays quiz history in id order, so the estimate weighs the latest
+    # answers most, as the write path does from here on.
+    rows = conn.execute('''
+        SELECT user_id, topic_id, topic, is_correct, response_time
+        FROM rapid_quiz_responses
+        WHERE id > ? AND id <= ? AND user_id IS NOT NULL AND topic_id IS NOT NULL
+        ORDER BY id
+    ''', (low, high)).fetchall()
+    for user_id, topic_id, topic, is_correct, response_time in rows:
+        MasteryIndex.update(conn, user_id, topic_id, topic, bool(is_correct), response_time)
+
+
+# --- 6: interaction search ---------------------------------------------------
+
+def _interaction_search(conn):
+    # External content: the index stores only tokens, text stays in interactions
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS interactions_fts USING fts5(
+            question, answer, user_id,
+            content='interactions', content_rowid='id',
+            tokenize='porter unicode61'
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS interactions_fts_insert AFTER INSERT ON interactions BEGIN
+            INSERT INTO interactions_fts (rowid, question, answer, user_id)
+            VALUES (new.id, new.question, new.answer, new.user_id);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS interactions_fts_delete AFTER DELETE ON interactions BEGIN
+            INSERT INTO interactions_fts (interactions_fts, rowid, question, answer, user_id)
+            VALUES ('delete', old.id, old.question, old.answer, old.user_id);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS interactions_fts_update
+        AFTER UPDATE OF question, answer, user_id ON interactions BEGIN
+            INSERT INTO interactions_fts (interactions_fts, rowid, question, answer, user_id)
+            VALUES ('delete', old.id, old.question, old.answer, old.user_id);
+            INSERT INTO interactions_fts (rowid, question, answer, user_id)
+            VALUES (new.id, new.question, new.answer, new.user_id);
+        END
+    ''')
+
+
+def _backfill_interaction_search(conn, low, high):
+    conn.execute('''
+        INSERT INTO interactions_fts (rowid, question, answer, user_id)
+        SELECT id, question, answer, user_id FROM interactions WHERE id > ? AND id <= ?
+    ''', (low, high))
+
+
+# --- 7: generated tests ------------------------------------------------------
+
+def _generated_tests(conn):
+    # Answer keys stay server-side so submitted tests are graded here
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS generated_tests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            subject TEXT,
+            topic TEXT,
+            questions TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            submitted_at DATETIME,
+            score INTEGER,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    ''')
+
+
+# --- 8: shard map ------------------------------------------------------------
+
+def _shard_map(conn):
+    # Read from the primary only; see modules/shards.py
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS shard_map (
+            low_user_id INTEGER PRIMARY KEY,
+            path TEXT NOT NULL UNIQUE,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+# --- 9: background jobs -----------------------------------------------------
+
+def _jobs(conn):
+    # Catalog only: workers in every process claim jobs from this table
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            params TEXT NOT NULL,
+            dedup_key TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT 'queued',
+            progress TEXT,
+            result TEXT,
+            error TEXT,
+            cancel_requested INTEGER DEFAULT 0,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            heartbeat_at REAL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs(state, created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_user ON jobs(user_id, created_at)')
+    # At most one queued or running copy of the same job per user
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active ON jobs(user_id, dedup_key)
+        WHERE state IN ('queued', 'running')
+    ''')
+
+
+# --- 10: shared slide cache -------------------------------------------------
+
+def _slide_cache(conn):
+    # Catalog only; see modules/slide_store.py
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS slide_cache (
+            key TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            path TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT 'building',
+            size_bytes INTEGER DEFAULT 0,
+            refs INTEGER DEFAULT 0,
+            manifest TEXT,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_slide_cache_lru ON slide_cache(refs, last_used)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS slide_views (
+            job_id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            result_key TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            FOREIGN KEY(result_key) REFERENCES slide_cache(key)
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_slide_views_user ON slide_views(user_id, created_at)')
+
+
+MIGRATIONS = [
+    Migration(1, 'initial_schema', _initial_schema),
+    Migration(2, 'activity_indexes', _activity_indexes),
+    Migration(3, 'topic_index', _topic_index, [
+        *[Backfill(f'topic_ids_{table}', table, _backfill_topic_ids(table)) for table in TOPIC_TABLES],
+        Backfill('user_topic_stats', 'interactions', _backfill_topic_stats),
+    ]),
+    Migration(4, 'activity_archive', _activity_archive),
+    Migration(5, 'mastery_index', _mastery_index, [
+        Backfill('topic_mastery', 'rapid_quiz_responses', _backfill_mastery),
+    ]),
+    Migration(6, 'interaction_search', _interaction_search, [
+        Backfill('interactions_fts', 'interactions', _backfill_interaction_search),
+    ]),
+    Migration(7, 'generated_tests', _generated_tests),
+    Migration(8, 'shard_map', _shard_map),
+    Migration(9, 'jobs', _jobs),
+    Migration(10, 'slide_cache', _slide_cache),
+]
+
+# Databases set up before this engine existed record their state only in
+# PRAGMA user_version; map that onto the migrations it already covers.
+LEGACY_USER_VERSIONS = {1: 3}
+
+
+# --- engine ------------------------------------------------------------------
+
+def add_column(conn, table, column, definition):
+    """ALTER TABLE ADD COLUMN unless the column is already there"""
+    columns = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+    if column not in columns:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+def connect(db_path=USER_DB_PATH):
+    # Autocommit mode: the engine issues BEGIN/COMMIT itself so DDL is transactional
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+    if conn.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()[0] == 0:
+        # Only takes effect before the first table exists; lets archival hand pages back
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_backfills (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL,
+            high_water INTEGER NOT NULL,
+            completed INTEGER DEFAULT 0
+        )
+    ''')
+    return conn
+
+
+def current_version(conn) -> int:
+    version = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()[0]
+    if version is not None:
+        return version
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Read again under the write lock: another process may have just recorded it
+        version = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()[0]
+        legacy = LEGACY_USER_VERSIONS.get(conn.execute('PRAGMA user_version').fetchone()[0])
+        if version is None and legacy:
+            conn.executemany(
+                'INSERT INTO schema_version (version, name) VALUES (?, ?)',
+                [(m.version, m.name) for m in MIGRATIONS if m.version <= legacy]
+            )
+            version = legacy
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return version or 0
+
+
+def _is_applied(conn, migration) -> bool:
+    return conn.execute('SELECT 1 FROM schema_version WHERE version = ?', (migration.version,)).fetchone() is not None
+
+
+def _run_backfill(conn, backfill, batch_size, pause):
+    """Apply a backfill batch by batch.
+
+    Each batch reads its starting point under the write lock, so processes
+    upgrading the same file at once share the batches instead of repeating
+    them; additive backfills such as _backfill_topic_stats would otherwise
+    count rows twice.
+    """
+    batches = 0
+    while True:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            last_id, high_water, completed = conn.execute(
+                'SELECT last_id, high_water, completed FROM schema_backfills WHERE name = ?',
+                (backfill.name,)
+            ).fetchone()
+            if completed or last_id >= high_water:
+                conn.execute('UPDATE schema_backfills SET completed = 1 WHERE name = ?', (backfill.name,))
+                conn.execute('COMMIT')
+                break
+            upper = min(last_id + batch_size, high_water)
+            backfill.apply_batch(conn, last_id, upper)
+            conn.execute('UPDATE schema_backfills SET last_id = ? WHERE name = ?', (upper, backfill.name))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        batches += 1
+        if pause:
+            time.sleep(pause)
+    if batches or not completed:
+        logger.info(f"Backfill {backfill.name} finished in {batches} batches")
+
+
+def apply_migration(conn, migration, batch_size=DEFAULT_BATCH_SIZE, pause=DEFAULT_BATCH_PAUSE) -> bool:
+    """Apply one migration; False if another process had already applied it"""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if _is_applied(conn, migration):
+            conn.execute('ROLLBACK')
+            return False
+        migration.schema(conn)
+        for backfill in migration.backfills:
+            high_water = conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM {backfill.table}').fetchone()[0]
+            conn.execute(
+                'INSERT OR IGNORE INTO schema_backfills (name, last_id, high_water) VALUES (?, 0, ?)',
+                (backfill.name, high_water)
+            )
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+    for backfill in migration.backfills:
+        _run_backfill(conn, backfill, batch_size, pause)
+
+    # A process that started this migration alongside us may have finished it first
+    if conn.execute('INSERT OR IGNORE INTO schema_version (version, name) VALUES (?, ?)',
+                    (migration.version, migration.name)).rowcount:
+        logger.info(f"Applied migration {migration.version:03d}_{migration.name}")
+    return True
+
+
+def upgrade(db_path=USER_DB_PATH, target: Optional[int] = None,
+            batch_size=DEFAULT_BATCH_SIZE, pause=DEFAULT_BATCH_PAUSE) -> int:
+    """Apply pending migrations up to target (default: latest); returns the new version"""
+    conn = connect(db_path)
+    try:
+        version = current_version(conn)
+        for migration in MIGRATIONS:
+            if migration.version <= version:
+                continue
+            if target is not None and migration.version > target:
+                break
+            apply_migration(conn, migration, batch_size, pause)
+            version = migration.version
+        return version
+    finally:
+        conn.close()
+
+
+def status(db_path=USER_DB_PATH) -> List[dict]:
+    conn = connect(db_path)
+    try:
+        version = current_version(conn)
+        applied = {row[0]: row[1] for row in conn.execute('SELECT version, applied_at FROM schema_version')}
+        return [{
+            'version': m.version,
+            'name': m.name,
+            'applied': m.version <= version,
+            'applied_at': applied.get(m.version)
+        } for m in MIGRATIONS]
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the EduX database schema")
+    parser.add_argument('--db', default=USER_DB_PATH, help="Path to the SQLite database")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help="List migrations and whether they are applied")
+    upgrade_parser = subparsers.add_parser('upgrade', help="Apply pending migrations")
+    upgrade_parser.add_argument('--target', type=int, help="Stop after this version")
+    upgrade_parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                                help="Rows per backfill transaction")
+    upgrade_parser.add_argument('--pause', type=float, default=DEFAULT_BATCH_PAUSE,
+                                help="Seconds to sleep between backfill batches")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.command == 'status':
+        for entry in status(args.db):
+            mark = 'x' if entry['applied'] else ' '
+            print(f"[{mark}] {entry['version']:03d}_{entry['name']}  {entry['applied_at'] or ''}")
+    else:
+        version = upgrade(args.db, args.target, args.batch_size, args.pause)
+        print(f"Database {args.db} is at schema version {version}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""OCR of video frames without touching the disk.
+
+Frames are thresholded and PNG-encoded in memory and piped to the
+tesseract binary (`tesseract stdin stdout`); pytesseract would write a
+temporary file per call. Each call is its own tesseract process, so the
+pool is a set of threads that each drive one process at a time, and the
+caller keeps decoding while they run. Results are cached by a hash of
+the thresholded image, so a frame that was already read - typically the
+previous slide - is never OCRed twice.
+"""
+import os
+import hashlib
+import logging
+import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TESSERACT_CMD = os.environ.get('TESSERACT_CMD', 'tesseract')
+OCR_WORKERS = int(os.environ.get('EDUX_OCR_WORKERS', os.cpu_count() or 1))
+OCR_CACHE_SIZE = 512
+OCR_TIMEOUT_SECONDS = 60
+BINARY_THRESHOLD = 150
+
+
+def _tesseract(png: bytes, psm: int) -> str:
+    # One thread per tesseract process; more would only oversubscribe the pool
+    env = dict(os.environ, OMP_THREAD_LIMIT='1')
+    result = subprocess.run([TESSERACT_CMD, 'stdin', 'stdout', '--psm', str(psm)], input=png,
+                            capture_output=True, env=env, timeout=OCR_TIMEOUT_SECONDS)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode(errors='replace').strip())
+    return result.stdout.decode(errors='replace').strip()
+
+
+class OcrStage:
+    """Cached OCR of frames in a pool of tesseract processes"""
+
+    def __init__(self, workers: int = OCR_WORKERS, cache_size: int = OCR_CACHE_SIZE, psm: int = 6):
+        self.workers = workers
+        self.cache_size = cache_size
+        self.psm = psm
+        self.stats = {'runs': 0, 'cache_hits': 0, 'errors': 0}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = None
+
+    @staticmethod
+    def _prepare(frame: np.ndarray) -> np.ndarray:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        _, binary = cv2.threshold(gray, BINARY_THRESHOLD, 255, cv2.THRESH_BINARY)
+        return binary
+
+    def _run(self, binary: np.ndarray) -> str:
+        try:
+            ok, png = cv2.imencode('.png', binary)
+            if not ok:
+                raise RuntimeError("PNG encoding failed")
+            return _tesseract(png.tobytes(), self.psm)
+        except Exception as e:
+            with self._lock:
+                self.stats['errors'] += 1
+            logger.warning(f"OCR error: {str(e)}")
+            return ""
+
+    def submit(self, frame: np.ndarray) -> Future:
+        """Future for the frame's text; completed at once on a cache hit"""
+        binary = self._prepare(frame)
+        digest = hashlib.blake2b(repr(binary.shape).encode(), digest_size=16)
+        digest.update(np.packbits(binary).tobytes())
+        key = digest.digest()
+        with self._lock:
+            future = self._cache.get(key)
+            if future is not None:
+                self._cache.move_to_end(key)
+                self.stats['cache_hits'] += 1
+                return future
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='edux-ocr')
+            future = self._pool.submit(self._run, binary)
+            self.stats['runs'] += 1
+            self._cache[key] = future
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return future
+
+    def text(self, frame: np.ndarray) -> str:
+        return self.submit(frame).result()
+
+    def close(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
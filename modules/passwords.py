@@ -0,0 +1,197 @@
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+logger = logging.getLogger(__name__)
+
+# scrypt with werkzeug's default N and r; calibration only raises p, which
+# adds time linearly without adding memory per hash
+SCRYPT_N = 2 ** 15
+SCRYPT_R = 8
+MAX_SCRYPT_P = 16
+DEFAULT_METHOD = f'scrypt:{SCRYPT_N}:{SCRYPT_R}:1'
+TARGET_HASH_SECONDS = int(os.environ.get('EDUX_PASSWORD_HASH_TARGET_MS', 250)) / 1000
+# Pins the method and skips calibration, e.g. so all workers agree exactly
+HASH_METHOD = os.environ.get('EDUX_PASSWORD_HASH_METHOD')
+
+HASH_WORKERS = int(os.environ.get('EDUX_PASSWORD_WORKERS', min(4, os.cpu_count() or 1)))
+MAX_PENDING_PER_WORKER = 8
+WAIT_SECONDS = 10
+
+
+class HashingBusy(RuntimeError):
+    """The hashing queue is full or too slow; the caller should retry later"""
+    retry_after = 2
+
+
+def _hash(password: str, method: str) -> str:
+    return generate_password_hash(password, method=method)
+
+
+def _verify(password_hash: str, password: str) -> bool:
+    return check_password_hash(password_hash, password)
+
+
+def _noop() -> None:
+    pass
+
+
+def _calibrate(target_seconds: float) -> str:
+    """The scrypt method whose hashes take about target_seconds on this machine"""
+    started = time.perf_counter()
+    generate_password_hash('calibration', method=DEFAULT_METHOD)
+    elapsed = time.perf_counter() - started
+    p = max(1, min(MAX_SCRYPT_P, round(target_seconds / elapsed)))
+    return f'scrypt:{SCRYPT_N}:{SCRYPT_R}:{p}'
+
+
+def _cost(method: str) -> Optional[int]:
+    """Relative work factor of a werkzeug scrypt method string; None for other algorithms"""
+    parts = method.split(':')
+    if parts[0] != 'scrypt':
+        return None
+    n, r, p = (int(part) for part in parts[1:4]) if len(parts) >= 4 else (SCRYPT_N, SCRYPT_R, 1)
+    return n * r * p
+
+
+class PasswordHasher:
+    """Password hashing and verification in a bounded pool of worker processes.
+
+    KDF work never runs on a request thread, and at most max_pending jobs
+    wait for the pool: beyond that callers get HashingBusy at once instead
+    of queueing behind a login burst. The pool is forked by start(), which
+    should run once at startup before request threads exist. The cost is
+    calibrated in the pool against a target latency; until that finishes
+    DEFAULT_METHOD is used.
+    """
+
+    def __init__(self, workers: int = HASH_WORKERS, max_pending: Optional[int] = None,
+                 method: Optional[str] = HASH_METHOD, target_seconds: float = TARGET_HASH_SECONDS):
+        self.workers = workers
+        self.max_pending = max_pending or workers * MAX_PENDING_PER_WORKER
+        self.target_seconds = target_seconds
+        self._method = method
+        self._calibration = None
+        self._pool = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('fork'))
+                # The workers fork on the first submit, not here; make that happen now
+                self._pool.submit(_noop)
+                if self._method is None and self._calibration is None:
+                    self._calibration = self._pool.submit(_calibrate, self.target_seconds)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+    @property
+    def method(self) -> str:
+        if self._method is None and self._calibration is not None and self._calibration.done():
+            try:
+                self._method = self._calibration.result()
+                logger.info(f"Password hashing calibrated to {self._method}")
+            except Exception as e:
+                logger.error(f"Password hash calibration failed: {str(e)}")
+                self._method = DEFAULT_METHOD
+        return self._method or DEFAULT_METHOD
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy("Too many sign-ins in progress, please try again")
+        try:
+            self.start()
+            try:
+                future = self._pool.submit(fn, *args)
+            except BrokenProcessPool:
+                logger.error("Password hashing pool died; starting a new one")
+                with self._lock:
+                    self._pool = None
+                self.start()
+                future = self._pool.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the work is done or cancelled: a caller that
+        # gives up waiting cannot stop a hash that is already running
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=WAIT_SECONDS)
+        except FutureTimeout:
+            future.cancel()
+            raise HashingBusy("Sign-in is taking too long, please try again")
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password, self.method)
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        if not password_hash:
+            return False
+        return self._run(_verify, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """True if the stored hash is weaker than what hash() would produce now"""
+        stored = _cost(password_hash.split('$', 1)[0])
+        current = _cost(self.method)
+        return stored is None or (current is not None and stored < current)
+
+
+class LoginThrottle:
+    """Token buckets per client IP and per account, checked before any hashing.
+
+    Every attempt from an IP takes a token from that IP's bucket; the IP
+    bucket is sized for a classroom behind one school NAT. Only failed
+    attempts take a token from the account's bucket, so ordinary sign-ins
+    never drain it, while repeated guessing at one account is cut off even
+    across many IPs. Buckets live in this process, like LocalProfileStore.
+    """
+
+    def __init__(self, ip_capacity: int = 60, ip_per_second: float = 1.0,
+                 account_capacity: int = 5, account_per_second: float = 1 / 60,
+                 max_entries: int = 100000):
+        self.rates = {'ip': (ip_capacity, ip_per_second), 'account': (account_capacity, account_per_second)}
+        self.max_entries = max_entries
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _level(self, kind: str, key: str, now: float) -> float:
+        capacity, per_second = self.rates[kind]
+        tokens, updated = self._buckets.get((kind, key), (capacity, now))
+        return min(capacity, tokens + (now - updated) * per_second)
+
+    def retry_after(self, ip: Optional[str], account: Optional[str]) -> int:
+        """Seconds until an attempt for (ip, account) is allowed; 0 means go ahead"""
+        now = time.monotonic()
+        wait = 0.0
+        with self._lock:
+            for kind, key in (('ip', ip), ('account', account)):
+                if key and self._level(kind, key, now) < 1:
+                    wait = max(wait, (1 - self._level(kind, key, now)) / self.rates[kind][1])
+        return int(wait) + 1 if wait else 0
+
+    def hit(self, kind: str, key: Optional[str]) -> None:
+        if not key:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._buckets[(kind, key)] = (self._level(kind, key, now) - 1, now)
+            self._buckets.move_to_end((kind, key))
+            while len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+
+
+hasher = PasswordHasher()
@@ -0,0 +1,157 @@
+"""Streaming PDF writer for slide decks.
+
+Pages are written to the file as they are added - image, content stream
+and page object - and only the page tree, catalog and cross-reference
+table are written on close, so memory holds one page at a time however
+long the deck. Images are re-encoded as JPEG (DCTDecode), optionally
+downscaled, or embedded losslessly (FlateDecode) with jpeg_quality=None.
+
+A page may carry the slide's OCR text as an invisible text layer (text
+render mode 3), which makes the PDF searchable and copyable. OCR text
+comes without word positions, so lines are laid out top to bottom over
+the page rather than over the words they were read from.
+"""
+import io
+import zlib
+from typing import List, Optional, Tuple, Union
+
+from PIL import Image
+
+# Page sizes in points; slides are landscape. None fits the page to the image.
+PAGE_SIZES = {
+    'fit': None,
+    'a4': (841.89, 595.28),
+    'letter': (792.0, 612.0),
+    '16:9': (960.0, 540.0),
+}
+DEFAULT_JPEG_QUALITY = 85
+# Longest image side in pixels; larger slides are downscaled before encoding
+DEFAULT_MAX_SIDE = 1920
+# Resolution of 'fit' pages: an image of this many pixels per inch fills the page
+FIT_DPI = 150
+TEXT_FONT_SIZE = 12
+
+
+def _escape(text: str) -> bytes:
+    data = text.encode('latin-1', errors='replace')
+    return data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+class PdfWriter:
+    """Writes a PDF one page at a time: add_page() for each slide, then close()"""
+
+    def __init__(self, path: str, page_size: str = 'fit', jpeg_quality: Optional[int] = DEFAULT_JPEG_QUALITY,
+                 max_side: Optional[int] = DEFAULT_MAX_SIDE):
+        if page_size not in PAGE_SIZES:
+            raise ValueError(f"Unknown page size: {page_size}")
+        self.path = path
+        self.page_size = page_size
+        self.jpeg_quality = jpeg_quality
+        self.max_side = max_side
+        self.pages = 0
+        self._file = open(path, 'wb')
+        self._offsets = {}
+        self._kids: List[int] = []
+        # 1 and 2 are the catalog and page tree, written last
+        self._next_id = 3
+        self._font_id = None
+        self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+    def _write(self, data: bytes) -> None:
+        self._file.write(data)
+
+    def _object(self, body: bytes, stream: Optional[bytes] = None, object_id: Optional[int] = None) -> int:
+        if object_id is None:
+            object_id, self._next_id = self._next_id, self._next_id + 1
+        self._offsets[object_id] = self._file.tell()
+        self._write(b'%d 0 obj\n' % object_id)
+        if stream is None:
+            self._write(body + b'\nendobj\n')
+        else:
+            self._write(body[:-2] + b' /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream\nendobj\n')
+        return object_id
+
+    def _font(self) -> int:
+        if self._font_id is None:
+            self._font_id = self._object(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica '
+                                         b'/Encoding /WinAnsiEncoding >>')
+        return self._font_id
+
+    def _encode(self, image: Image.Image) -> Tuple[bytes, bytes, Tuple[int, int]]:
+        """Image XObject dictionary, data and the original pixel size"""
+        size = image.size
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        if self.max_side and max(image.size) > self.max_side:
+            image = image.copy()
+            image.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+        width, height = image.size
+        color = b'/DeviceRGB' if image.mode == 'RGB' else b'/DeviceGray'
+        if self.jpeg_quality is None:
+            data, codec = zlib.compress(image.tobytes(), 6), b'/FlateDecode'
+        else:
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=self.jpeg_quality, optimize=True)
+            data, codec = buffer.getvalue(), b'/DCTDecode'
+        header = (b'<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace %s '
+                  b'/BitsPerComponent 8 /Filter %s >>' % (width, height, color, codec))
+        return header, data, size
+
+    def add_page(self, image: Union[str, Image.Image], text: Optional[str] = None) -> None:
+        """Add a page showing image (a path or PIL image), with text as an invisible layer"""
+        if isinstance(image, str):
+            with Image.open(image) as opened:
+                header, data, size = self._encode(opened)
+        else:
+            header, data, size = self._encode(image)
+        image_id = self._object(header, data)
+
+        # The image keeps its aspect ratio, centred on the page; downscaling
+        # lowers its resolution, not its size
+        if PAGE_SIZES[self.page_size] is None:
+            scale = 72.0 / FIT_DPI
+            page_width, page_height = size[0] * scale, size[1] * scale
+        else:
+            page_width, page_height = PAGE_SIZES[self.page_size]
+            scale = min(page_width / size[0], page_height / size[1])
+        width, height = size[0] * scale, size[1] * scale
+        x, y = (page_width - width) / 2, (page_height - height) / 2
+        content = b'q %.2f 0 0 %.2f %.2f %.2f cm /Im0 Do Q\n' % (width, height, x, y)
+
+        resources = b'/XObject << /Im0 %d 0 R >>' % image_id
+        lines = [line for line in (text or '').splitlines() if line.strip()]
+        if lines:
+            size_pt = min(TEXT_FONT_SIZE, height / (len(lines) + 1))
+            content += b'BT 3 Tr /F1 %.2f Tf %.2f TL %.2f %.2f Td\n' % (size_pt, size_pt, x, y + height - size_pt)
+            content += b''.join(b'(%s) Tj T*\n' % _escape(line) for line in lines) + b'ET\n'
+            resources += b' /Font << /F1 %d 0 R >>' % self._font()
+        content_id = self._object(b'<< >>', content)
+
+        self._kids.append(self._object(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] /Resources << %s >> /Contents %d 0 R >>'
+            % (page_width, page_height, resources, content_id)
+        ))
+        self.pages += 1
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        kids = b' '.join(b'%d 0 R' % kid for kid in self._kids)
+        self._object(b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(self._kids)), object_id=2)
+        self._object(b'<< /Type /Catalog /Pages 2 0 R >>', object_id=1)
+        xref = self._file.tell()
+        count = self._next_id
+        self._write(b'xref\n0 %d\n0000000000 65535 f \n' % count)
+        for object_id in range(1, count):
+            self._write(b'%010d 00000 n \n' % self._offsets[object_id])
+        self._write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%EOF\n' % (count, xref))
+        self._file.close()
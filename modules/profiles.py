@@ -0,0 +1,166 @@
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from modules.topics import TopicIndex
+
+logger = logging.getLogger(__name__)
+
+
+class LocalProfileStore:
+    """Bounded in-process LRU with a TTL.
+
+    The TTL caps how long another worker's write can go unnoticed when
+    several processes each keep their own cache.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, profile = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return profile
+
+    def set(self, user_id: int, profile: dict) -> None:
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl_seconds, profile)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+class RedisProfileStore:
+    """Profiles shared by all workers, so one worker's invalidation is seen by all"""
+
+    KEY_PREFIX = 'edux:profile:'
+
+    def __init__(self, url: str, ttl_seconds: float = 300):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("RedisProfileStore requires the 'redis' package (pip install redis)") from e
+        self._redis = redis.Redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, user_id: int) -> Optional[dict]:
+        value = self._redis.get(f"{self.KEY_PREFIX}{user_id}")
+        return json.loads(value) if value else None
+
+    def set(self, user_id: int, profile: dict) -> None:
+        self._redis.set(f"{self.KEY_PREFIX}{user_id}", json.dumps(profile), ex=int(self.ttl_seconds))
+
+    def delete(self, user_id: int) -> None:
+        self._redis.delete(f"{self.KEY_PREFIX}{user_id}")
+
+
+def create_profile_store(url: Optional[str] = None, max_entries: int = 10000, ttl_seconds: float = 300):
+    if url and url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisProfileStore(url, ttl_seconds=ttl_seconds)
+    return LocalProfileStore(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+
+class ProfileService:
+    """Everything handle_chat needs to personalise a prompt, loaded once per user.
+
+    A profile holds the user's preferences, their per-topic results keyed by
+    canonical topic key, and every alias of those topics, so a chat turn can
+    be personalised without touching the database.
+    """
+
+    def __init__(self, connect: Callable[[int], object], store=None):
+        self.connect = connect
+        self.store = store if store is not None else LocalProfileStore()
+
+    def get(self, user_id: int) -> dict:
+        profile = self.store.get(user_id)
+        if profile is None:
+            profile = self._load(user_id)
+            self.store.set(user_id, profile)
+        return profile
+
+    def _load(self, user_id: int) -> dict:
+        profile = {
+            'interests': None,
+            'learning_style': None,
+            'preferred_explanation_style': 'standard',
+            'topics': {},
+            'aliases': {}
+        }
+        with self.connect(user_id) as conn:
+            prefs = conn.execute('''
+                SELECT interests, learning_style, preferred_explanation_style
+                FROM user_preferences WHERE user_id = ?
+            ''', (user_id,)).fetchone()
+            if prefs:
+                profile['interests'] = prefs[0]
+                profile['learning_style'] = prefs[1]
+                profile['preferred_explanation_style'] = prefs[2] or 'standard'
+
+            rows = conn.execute('''
+                SELECT t.topic_key, a.alias, s.correct_count, s.attempts
+                FROM user_topic_stats s
+                JOIN topics t ON t.id = s.topic_id
+                LEFT JOIN topic_aliases a ON a.topic_id = s.topic_id
+                WHERE s.user_id = ?
+            ''', (user_id,)).fetchall()
+            for topic_key, alias, correct, attempts in rows:
+                profile['topics'][topic_key] = [correct, attempts]
+                if alias:
+                    profile['aliases'][alias] = topic_key
+        return profile
+
+    @staticmethod
+    def _topic_key(profile: dict, topic: str) -> Optional[str]:
+        """Same resolution order as TopicIndex.resolve: alias first, then canonical key"""
+        if not topic or not topic.strip():
+            return None
+        key = profile['aliases'].get(TopicIndex.normalize_alias(topic))
+        if key is None:
+            key = TopicIndex.canonical_key(topic)
+        return key if key in profile['topics'] else None
+
+    @classmethod
+    def _topic_entry(cls, profile: dict, topic: str) -> Optional[list]:
+        key = cls._topic_key(profile, topic)
+        return profile['topics'][key] if key else None
+
+    def success_rate(self, user_id: int, topic: str) -> Optional[float]:
+        entry = self._topic_entry(self.get(user_id), topic)
+        if not entry or not entry[1]:
+            return None
+        return entry[0] / entry[1]
+
+    def record_result(self, user_id: int, topic: str, is_correct: bool) -> None:
+        """Write-through for a freshly stored interaction, so the next turn stays a cache hit"""
+        profile = self.store.get(user_id)
+        if profile is None:
+            return
+        key = self._topic_key(profile, topic)
+        if key is None:
+            # First result on this topic; alias bookkeeping lives in the database
+            self.store.delete(user_id)
+            return
+        profile['topics'][key][0] += 1 if is_correct else 0
+        profile['topics'][key][1] += 1
+        self.store.set(user_id, profile)
+
+    def invalidate(self, user_id: int) -> None:
+        self.store.delete(user_id)
@@ -0,0 +1,90 @@
+import re
+import sqlite3
+import logging
+from typing import List, Optional
+
+from markupsafe import escape
+
+logger = logging.getLogger(__name__)
+
+MAX_RESULTS = 50
+SNIPPET_TOKENS = 16
+
+# Column weights for bm25(): the student's question counts double
+QUESTION_WEIGHT = 2.0
+ANSWER_WEIGHT = 1.0
+
+# Control characters mark match boundaries in raw snippets; they cannot
+# occur in stored text, so escaping never touches them
+_MATCH_START = '\x02'
+_MATCH_END = '\x03'
+
+
+class InteractionSearch:
+    """Full-text search over a student's own tutoring conversations.
+
+    interactions_fts is an external-content FTS5 index of interactions,
+    kept in step by triggers (see migration 6). user_id is an indexed
+    column of the index, so the per-user filter is part of the MATCH and
+    the ranking only ever sees that student's rows. Rows moved to the
+    monthly archive leave the index with them.
+    """
+
+    @staticmethod
+    def build_query(text: str, user_id: int) -> Optional[str]:
+        """Turn free text into an FTS5 query in which every word must match.
+
+        Words are quoted so FTS5 operators typed by the student are taken
+        literally; the porter stemmer already matches "fraction" to "fractions".
+        """
+        terms = re.findall(r'\w+', text.lower())
+        if not terms:
+            return None
+        quoted = ' '.join(f'"{term}"' for term in terms)
+        # Scoped to the text columns, or a term equal to the user id would match every row
+        return f'user_id:"{int(user_id)}" AND {{question answer}}: ({quoted})'
+
+    @staticmethod
+    def _highlight(snippet: Optional[str]) -> str:
+        if not snippet:
+            return ''
+        return str(escape(snippet)).replace(_MATCH_START, '<mark>').replace(_MATCH_END, '</mark>')
+
+    @staticmethod
+    def search(conn: sqlite3.Connection, user_id: int, text: str, limit: int = 20,
+               topic: Optional[str] = None, since: Optional[str] = None) -> List[dict]:
+        """Best-matching interactions for one user, with HTML-safe highlighted snippets"""
+        query = InteractionSearch.build_query(text or '', user_id)
+        if query is None:
+            return []
+        limit = max(1, min(limit, MAX_RESULTS))
+        sql = f'''
+            SELECT i.id, i.topic, i.timestamp,
+                   snippet(interactions_fts, 0, ?, ?, '…', {SNIPPET_TOKENS}) AS question,
+                   snippet(interactions_fts, 1, ?, ?, '…', {SNIPPET_TOKENS}) AS answer,
+                   bm25(interactions_fts, {QUESTION_WEIGHT}, {ANSWER_WEIGHT}, 0.0) AS score
+            FROM interactions_fts
+            JOIN interactions i ON i.id = interactions_fts.rowid
+            WHERE interactions_fts MATCH ?
+        '''
+        params = [_MATCH_START, _MATCH_END, _MATCH_START, _MATCH_END, query]
+        if topic:
+            sql += ' AND i.topic = ?'
+            params.append(topic)
+        if since:
+            sql += ' AND i.timestamp >= ?'
+            params.append(since)
+        sql += ' ORDER BY score LIMIT ?'
+        params.append(limit)
+
+        return [
+            {
+                'id': row[0],
+                'topic': row[1],
+                'timestamp': row[2],
+                'question': InteractionSearch._highlight(row[3]),
+                'answer': InteractionSearch._highlight(row[4]),
+                'score': -row[5]  # bm25() is lower-is-better; flip for readers
+            }
+            for row in conn.execute(sql, params)
+        ]
@@ -0,0 +1,354 @@
+"""Per-user-range shard files and the router that picks one per user.
+
+    python -m modules.shards status
+    python -m modules.shards split --from-user 50000 --path database/shards/shard_2.db
+    python -m modules.shards upgrade
+
+The primary database doubles as the catalog: it keeps the users table for
+login and the shard_map of user-id ranges. A user's rows (chat turns, quiz
+answers, progress, mastery, ...) all live in one shard file, so every
+per-user transaction stays inside one file and keeps its atomicity, while
+different shards commit under different write locks. With an empty
+shard_map everything stays in the primary file.
+
+A split copies a range's rows to a new file while the app keeps writing,
+then holds the source's write lock only for the final catch-up, installs
+fence triggers so a worker with a stale map cannot write a moved user's
+row to the old file, and finally deletes the moved rows in batches.
+The moved users' archived months (modules/archive.py) are copied into the
+new shard's archive directory and registered there, and their monthly
+rollups move with them, so history reads keep finding everything through
+the user's current shard. Do not run the archive job on the source shard
+while it is being split.
+"""
+import os
+import sys
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional
+
+from modules.database import USER_DB_PATH, ARCHIVE_DIR, BUSY_TIMEOUT_SECONDS
+from modules import migrations
+
+logger = logging.getLogger(__name__)
+
+SHARD_DIR = os.environ.get('EDUX_SHARD_DIR', os.path.join(os.path.dirname(USER_DB_PATH) or '.', 'shards'))
+MAP_REFRESH_SECONDS = 1.0
+DEFAULT_BATCH_SIZE = 2000
+DEFAULT_BATCH_PAUSE = 0.02
+
+# Per-user tables. Append-only ones are bulk-copied by id while the app
+# runs; ones updated in place are recopied whole under the switch lock.
+APPEND_ONLY_TABLES = ('interactions', 'rapid_quiz_responses', 'feedback')
+MUTABLE_TABLES = ('user_progress', 'user_preferences', 'user_topic_stats', 'topic_mastery',
+                  'generated_tests', 'activity_rollups')
+# Copied whole so topic ids in moved rows stay valid in the new shard
+SHARED_TABLES = ('topics', 'topic_aliases')
+
+
+class ShardRouter:
+    """Maps user ids to shard files using the catalog's shard_map"""
+
+    def __init__(self, catalog_path: str = USER_DB_PATH, refresh_seconds: float = MAP_REFRESH_SECONDS):
+        self.catalog_path = catalog_path
+        self.refresh_seconds = refresh_seconds
+        self._bounds = []
+        self._paths = []
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> None:
+        now = time.monotonic()
+        if self._loaded_at is not None and now - self._loaded_at < self.refresh_seconds:
+            return
+        with self._lock:
+            try:
+                conn = sqlite3.connect(self.catalog_path, timeout=BUSY_TIMEOUT_SECONDS)
+                try:
+                    rows = conn.execute('SELECT low_user_id, path FROM shard_map ORDER BY low_user_id').fetchall()
+                finally:
+                    conn.close()
+            except sqlite3.OperationalError:
+                rows = []  # catalog not migrated yet: everything is in the primary
+            self._bounds = [row[0] for row in rows]
+            self._paths = [row[1] for row in rows]
+            self._loaded_at = now
+
+    def invalidate(self) -> None:
+        self._loaded_at = None
+
+    def path_for(self, user_id: Optional[int]) -> str:
+        if user_id is None:
+            return self.catalog_path
+        self._load()
+        index = bisect_right(self._bounds, user_id) - 1
+        return self._paths[index] if index >= 0 else self.catalog_path
+
+    def all_paths(self) -> List[str]:
+        self._load()
+        paths = [self.catalog_path]
+        for path in self._paths:
+            if path not in paths:
+                paths.append(path)
+        return paths
+
+    def paths_for(self, user_ids: Optional[Iterable[int]] = None) -> List[str]:
+        """Shards holding any of user_ids (all shards when None), in catalog order"""
+        if user_ids is None:
+            return self.all_paths()
+        wanted = {self.path_for(user_id) for user_id in user_ids}
+        return [path for path in self.all_paths() if path in wanted]
+
+    def range_of(self, path: str):
+        """(low, high) user-id bounds served by a shard file; high is exclusive or None"""
+        self._load()
+        if path not in self._paths:
+            return None
+        index = self._paths.index(path)
+        high = self._bounds[index + 1] if index + 1 < len(self._bounds) else None
+        return self._bounds[index], high
+
+    def archive_dir_for(self, path: str) -> str:
+        """Each shard archives into its own directory so monthly files never collide"""
+        if os.path.abspath(path) == os.path.abspath(self.catalog_path):
+            return ARCHIVE_DIR
+        return os.path.join(ARCHIVE_DIR, os.path.splitext(os.path.basename(path))[0])
+
+    def fan_out(self, fn: Callable[[str], object], paths: Optional[List[str]] = None,
+                max_workers: Optional[int] = None) -> list:
+        """Run fn(shard_path) on every shard in a thread pool; results in shard order.
+
+        fn opens its own connection: sqlite3 connections stay on their thread.
+        """
+        paths = paths if paths is not None else self.all_paths()
+        if len(paths) == 1:
+            return [fn(paths[0])]
+        with ThreadPoolExecutor(max_workers=max_workers or len(paths)) as pool:
+            return list(pool.map(fn, paths))
+
+    def upgrade_all(self, **kwargs) -> dict:
+        """Bring the catalog and every shard to the latest schema version"""
+        versions = {self.catalog_path: migrations.upgrade(self.catalog_path, **kwargs)}
+        for path in self.all_paths()[1:]:
+            versions[path] = migrations.upgrade(path, **kwargs)
+        return versions
+
+    # --- splitting ------------------------------------------------------------
+
+    def split(self, low_user_id: int, path: str, batch_size: int = DEFAULT_BATCH_SIZE,
+              pause: float = DEFAULT_BATCH_PAUSE) -> dict:
+        """Move users >= low_user_id (up to the next boundary) into a new shard file"""
+        self.invalidate()
+        if low_user_id in self._bounds_snapshot():
+            raise ValueError(f"A shard already starts at user {low_user_id}")
+        if os.path.abspath(path) in {os.path.abspath(p) for p in self.all_paths()}:
+            raise ValueError(f"{path} is already a shard")
+        source = self.path_for(low_user_id)
+        high = next((b for b in self._bounds if b > low_user_id), None)
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        migrations.upgrade(path)
+        conn = migrations.connect(source)
+        conn.execute('ATTACH DATABASE ? AS dest', (path,))
+        user_range, params = self._range_sql(low_user_id, high)
+        copied = {}
+        try:
+            self._copy_shared(conn)
+            last_ids = {table: self._bulk_copy(conn, table, user_range, params, 0, batch_size, pause)
+                        for table in APPEND_ONLY_TABLES}
+            archived = self._copy_archives(conn, source, path, user_range, params)
+
+            # Final catch-up: writers to the source wait here for a moment
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._copy_shared(conn)
+                for table in APPEND_ONLY_TABLES:
+                    self._bulk_copy(conn, table, user_range, params, last_ids[table], None, 0)
+                for table in MUTABLE_TABLES:
+                    columns = self._columns(conn, table)
+                    conn.execute(f'DELETE FROM dest.{table} WHERE {user_range}', params)
+                    conn.execute(
+                        f'INSERT INTO dest.{table} ({columns}) SELECT {columns} FROM main.{table} WHERE {user_range}',
+                        params
+                    )
+                for month, counts in archived.items():
+                    conn.execute('''
+                        INSERT INTO dest.archive_partitions (month, path, interactions, rapid_quiz_responses)
+                        VALUES (?, ?, ?, ?)
+                        ON CONFLICT(month) DO UPDATE SET interactions = excluded.interactions,
+                            rapid_quiz_responses = excluded.rapid_quiz_responses
+                    ''', (month, counts['path'], counts['interactions'], counts['rapid_quiz_responses']))
+                for table in APPEND_ONLY_TABLES + MUTABLE_TABLES:
+                    copied[table] = conn.execute(
+                        f'SELECT COUNT(*) FROM dest.{table} WHERE {user_range}', params
+                    ).fetchone()[0]
+                self._install_fences(conn, low_user_id, high)
+                if os.path.abspath(source) == os.path.abspath(self.catalog_path):
+                    self._register(conn, low_user_id, path)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            if os.path.abspath(source) != os.path.abspath(self.catalog_path):
+                # If this step is lost, rerunning the split redoes the copy idempotently
+                catalog = migrations.connect(self.catalog_path)
+                try:
+                    catalog.execute('BEGIN IMMEDIATE')
+                    self._register(catalog, low_user_id, path)
+                    catalog.execute('COMMIT')
+                finally:
+                    catalog.close()
+            self.invalidate()
+            logger.info(f"Users {low_user_id}..{high or 'max'} moved from {source} to {path}: {copied}")
+
+            # Moved rows are fenced off now; drop them from the source
+            for table in APPEND_ONLY_TABLES:
+                self._delete_moved(conn, table, user_range, params, batch_size, pause)
+            conn.execute('BEGIN IMMEDIATE')
+            for table in MUTABLE_TABLES:
+                conn.execute(f'DELETE FROM main.{table} WHERE {user_range}', params)
+            conn.execute('COMMIT')
+            self._delete_archived(conn, source, archived, user_range, params)
+        finally:
+            conn.execute('DETACH DATABASE dest')
+            conn.close()
+        return {'source': source, 'path': path, 'low_user_id': low_user_id, 'high_user_id': high,
+                'rows': copied, 'archived_months': sorted(archived)}
+
+    def _bounds_snapshot(self) -> List[int]:
+        self._load()
+        return list(self._bounds)
+
+    @staticmethod
+    def _range_sql(low, high):
+        if high is None:
+            return 'user_id >= ?', [low]
+        return 'user_id >= ? AND user_id < ?', [low, high]
+
+    @staticmethod
+    def _columns(conn, table) -> str:
+        # Explicit lists: legacy files may have columns in a different order
+        return ', '.join(row[1] for row in conn.execute(f'PRAGMA main.table_info({table})'))
+
+    def _copy_shared(self, conn) -> None:
+        for table in SHARED_TABLES:
+            columns = self._columns(conn, table)
+            conn.execute(f'INSERT OR IGNORE INTO dest.{table} ({columns}) SELECT {columns} FROM main.{table}')
+
+    def _bulk_copy(self, conn, table, user_range, params, last_id, batch_size, pause) -> int:
+        """Copy rows with id > last_id in id batches; returns the last id copied"""
+        columns = self._columns(conn, table)
+        while True:
+            limit = '' if batch_size is None else f' LIMIT {int(batch_size)}'
+            upper = conn.execute(
+                f'SELECT MAX(id) FROM (SELECT id FROM main.{table} WHERE id > ? AND {user_range} ORDER BY id{limit})',
+                [last_id, *params]
+            ).fetchone()[0]
+            if upper is None:
+                return last_id
+            conn.execute(
+                f'INSERT OR IGNORE INTO dest.{table} ({columns}) SELECT {columns} FROM main.{table} '
+                f'WHERE id > ? AND id <= ? AND {user_range}',
+                [last_id, upper, *params]
+            )
+            last_id = upper
+            if batch_size is None:
+                return last_id
+            if pause:
+                time.sleep(pause)
+
+    def _copy_archives(self, conn, source, path, user_range, params) -> dict:
+        """Copy the range's archived months into the new shard's archive directory"""
+        from modules.archive import ActivityArchive  # archive imports this module
+
+        source_archive = ActivityArchive(self.archive_dir_for(source))
+        dest_archive = ActivityArchive(self.archive_dir_for(path))
+        archived = {}
+        for (month,) in conn.execute('SELECT month FROM main.archive_partitions ORDER BY month').fetchall():
+            counts = source_archive.copy_users(dest_archive, month, user_range, params)
+            if counts.get('interactions') or counts.get('rapid_quiz_responses'):
+                archived[month] = dict(counts, path=dest_archive.partition_path(month))
+        return archived
+
+    def _delete_archived(self, conn, source, archived, user_range, params) -> None:
+        """Drop the moved users from the source's archived months once the new shard serves them"""
+        from modules.archive import ActivityArchive
+
+        source_archive = ActivityArchive(self.archive_dir_for(source))
+        for month in archived:
+            counts = source_archive.delete_users(month, user_range, params)
+            conn.execute(
+                'UPDATE main.archive_partitions SET interactions = ?, rapid_quiz_responses = ? WHERE month = ?',
+                (counts['interactions'], counts['rapid_quiz_responses'], month)
+            )
+
+    @staticmethod
+    def _install_fences(conn, low, high) -> None:
+        condition = f'NEW.user_id >= {int(low)}' + ('' if high is None else f' AND NEW.user_id < {int(high)}')
+        for table in APPEND_ONLY_TABLES + MUTABLE_TABLES:
+            for event in ('INSERT', 'UPDATE'):
+                conn.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS main.shard_fence_{table}_{event.lower()}_{int(low)}
+                    BEFORE {event} ON {table} WHEN {condition}
+                    BEGIN SELECT RAISE(ABORT, 'user moved to another shard'); END
+                ''')
+
+    @staticmethod
+    def _register(conn, low, path) -> None:
+        conn.execute('INSERT INTO main.shard_map (low_user_id, path) VALUES (?, ?)', (low, path))
+
+    @staticmethod
+    def _delete_moved(conn, table, user_range, params, batch_size, pause) -> None:
+        while True:
+            conn.execute('BEGIN IMMEDIATE')
+            deleted = conn.execute(
+                f'DELETE FROM main.{table} WHERE id IN '
+                f'(SELECT id FROM main.{table} WHERE {user_range} LIMIT {int(batch_size)})',
+                params
+            ).rowcount
+            conn.execute('COMMIT')
+            if deleted < batch_size:
+                return
+            if pause:
+                time.sleep(pause)
+
+
+router = ShardRouter()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage EduX shard files")
+    parser.add_argument('--db', default=USER_DB_PATH, help="Path to the primary (catalog) database")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help="List shards and their user ranges")
+    subparsers.add_parser('upgrade', help="Migrate the catalog and every shard")
+    split_parser = subparsers.add_parser('split', help="Move a user-id range to a new shard file")
+    split_parser.add_argument('--from-user', type=int, required=True, help="First user id of the new shard")
+    split_parser.add_argument('--path', help="New shard file (default: database/shards/shard_<id>.db)")
+    split_parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    split_parser.add_argument('--pause', type=float, default=DEFAULT_BATCH_PAUSE)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    shard_router = ShardRouter(args.db)
+    if args.command == 'status':
+        print(f"{shard_router.catalog_path}  (catalog; users below the first range)")
+        for path in shard_router.all_paths()[1:]:
+            low, high = shard_router.range_of(path)
+            print(f"{path}  users {low}..{high - 1 if high else 'max'}")
+    elif args.command == 'upgrade':
+        for path, version in shard_router.upgrade_all().items():
+            print(f"{path}: schema version {version}")
+    else:
+        path = args.path or os.path.join(SHARD_DIR, f"shard_{args.from_user}.db")
+        print(shard_router.split(args.from_user, path, args.batch_size, args.pause))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""Per-video index of saved slides, for spotting a slide shown again later.
+
+Slide extraction compares each frame with the previous slide only, so a
+lecturer flipping back to an earlier slide, or cutting between a slide
+and the camera, produced the same slide many times. Every saved slide is
+added here, and each new one is looked up before it is saved.
+
+Each slide is kept as a 64-bit perceptual hash (DCT of a 32x32 gray
+thumbnail), its ChangeDetector block means and, if OCR read any words, a
+MinHash of them. Lookups do not scan all slides: the hash is split into
+PHASH_BANDS bands and the MinHash into MINHASH_BANDS bands, and only
+slides sharing a band are compared. With 8-bit bands, any two hashes
+within PHASH_DISTANCE bits share a band, so no visual match is missed.
+
+A candidate is the same slide if its hash is within PHASH_DISTANCE bits
+and no block changed, or if its words are nearly the same
+(TEXT_MATCH) and few blocks changed, as when the slide comes back with a
+pointer or annotation on it. Different words (below TEXT_MIN) always
+make it a different slide.
+"""
+import re
+import hashlib
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from modules.change_detection import ChangeDetector, FrameSignature
+
+PHASH_BANDS = 8
+# Hashes this close are candidates; 7 bits with 8 bands guarantees a shared band
+PHASH_DISTANCE = 7
+MINHASH_PERMUTATIONS = 32
+MINHASH_BANDS = 8
+# Estimated word-set similarity that makes slides with a few changed blocks the same
+TEXT_MATCH = 0.9
+# Below this the words disagree and the slides are different, however they look
+TEXT_MIN = 0.7
+
+_rng = np.random.default_rng(2024)
+_SEEDS = _rng.integers(0, 2 ** 63, MINHASH_PERMUTATIONS, dtype=np.uint64)
+_MULTIPLIERS = _rng.integers(0, 2 ** 63, MINHASH_PERMUTATIONS, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_WORD = re.compile(r'[a-z0-9]{2,}')
+
+
+def phash(gray: np.ndarray) -> int:
+    thumbnail = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(thumbnail)[:8, :8].flatten()
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def minhash(text: str) -> Optional[np.ndarray]:
+    """MINHASH_PERMUTATIONS minimums over the words of text, or None without words"""
+    words = set(_WORD.findall(text.lower()))
+    if not words:
+        return None
+    hashes = np.array([int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), 'big')
+                       for word in words], dtype=np.uint64)
+    # Multiply-xorshift hashes, one per permutation; uint64 arithmetic wraps
+    mixed = (hashes[None, :] ^ _SEEDS[:, None]) * _MULTIPLIERS[:, None]
+    return (mixed ^ (mixed >> np.uint64(29))).min(axis=1)
+
+
+class SlideIndex:
+    """Finds an earlier slide that a new one repeats"""
+
+    def __init__(self, detector: Optional[ChangeDetector] = None):
+        self.detector = detector or ChangeDetector()
+        self._phashes: List[int] = []
+        self._blocks: List[np.ndarray] = []
+        self._minhashes: List[Optional[np.ndarray]] = []
+        self._phash_bands: List[Dict[int, List[int]]] = [defaultdict(list) for _ in range(PHASH_BANDS)]
+        self._minhash_bands: List[Dict[bytes, List[int]]] = [defaultdict(list) for _ in range(MINHASH_BANDS)]
+        self.stats = {'slides': 0, 'duplicates': 0, 'candidates': 0}
+
+    def __len__(self) -> int:
+        return len(self._phashes)
+
+    @staticmethod
+    def _phash_keys(value: int):
+        return [(value >> (8 * band)) & 0xFF for band in range(PHASH_BANDS)]
+
+    @staticmethod
+    def _minhash_keys(signature: np.ndarray):
+        return [row.tobytes() for row in np.split(signature, MINHASH_BANDS)]
+
+    def find(self, signature: FrameSignature, text: str = '') -> Optional[int]:
+        """Index of an earlier slide this one repeats, or None; counts it either way"""
+        self.stats['slides'] += 1
+        value, words = phash(signature.gray), minhash(text)
+        candidates = set()
+        for band, key in zip(self._phash_bands, self._phash_keys(value)):
+            candidates.update(band.get(key, ()))
+        if words is not None:
+            for band, key in zip(self._minhash_bands, self._minhash_keys(words)):
+                candidates.update(band.get(key, ()))
+        self.stats['candidates'] += len(candidates)
+
+        for index in sorted(candidates):
+            if self._blocks[index].shape != signature.blocks.shape:
+                continue
+            similarity = None
+            if words is not None and self._minhashes[index] is not None:
+                similarity = np.count_nonzero(words == self._minhashes[index]) / MINHASH_PERMUTATIONS
+                if similarity < TEXT_MIN:
+                    continue
+            changed = self.detector.changed_fraction(self._blocks[index], signature.blocks)
+            if (bin(value ^ self._phashes[index]).count('1') <= PHASH_DISTANCE and changed == 0) or \
+                    (similarity is not None and similarity >= TEXT_MATCH and changed < self.detector.different_fraction):
+                self.stats['duplicates'] += 1
+                return index
+        return None
+
+    def add(self, signature: FrameSignature, text: str = '') -> int:
+        """Index a saved slide; returns its index"""
+        index = len(self._phashes)
+        value, words = phash(signature.gray), minhash(text)
+        self._phashes.append(value)
+        self._blocks.append(signature.blocks)
+        self._minhashes.append(words)
+        for band, key in zip(self._phash_bands, self._phash_keys(value)):
+            band[key].append(index)
+        if words is not None:
+            for band, key in zip(self._minhash_bands, self._minhash_keys(words)):
+                band[key].append(index)
+        return index
+
+    def dedup_ratio(self) -> float:
+        """Share of slides found to repeat an earlier one"""
+        return self.stats['duplicates'] / self.stats['slides'] if self.stats['slides'] else 0.0
@@ -0,0 +1,337 @@
+"""Content-addressed cache of lecture videos and extracted slides.
+
+    python -m modules.slide_store status
+    python -m modules.slide_store evict
+
+Videos are keyed by YouTube video id (or a hash of the URL or file), and
+extraction results by the video key plus the extraction parameters, so a
+lecture extracted by many students is downloaded and processed once.
+Each result directory holds the slide images, and its manifest (slide
+times, files and OCR text) is kept in the catalog's slide_cache table.
+
+A user's extraction is a view: a slide_views row pointing at a result,
+which holds one reference to it. Unreferenced entries - every video once
+its extraction is done, and results nobody views any more - are evicted
+least recently used first whenever the cache is over its quota.
+
+Entries are built by whoever asks first: the 'building' row is the lock,
+everyone else waits for it to become 'ready'. A build that stops
+refreshing its row for BUILD_STALE_SECONDS is taken over.
+"""
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import hashlib
+import logging
+import argparse
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+from urllib.parse import parse_qs, urlparse
+
+from modules.database import USER_DB_PATH, BUSY_TIMEOUT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+RESULT_DIR = os.environ.get('EDUX_SLIDE_STORE_DIR', os.path.join('static', 'slides', 'store'))
+VIDEO_DIR = os.environ.get('EDUX_VIDEO_CACHE_DIR', os.path.join('cache', 'videos'))
+QUOTA_BYTES = int(os.environ.get('EDUX_SLIDE_CACHE_QUOTA_MB', 5120)) * 1024 * 1024
+MAX_VIEWS_PER_USER = 50
+BUILD_STALE_SECONDS = 900
+WAIT_POLL_SECONDS = 2
+# Bump when extraction output changes, so old results are not reused
+EXTRACTOR_VERSION = 2
+
+YOUTUBE_ID = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+
+def video_key(url: str) -> str:
+    """'yt:<id>' for YouTube links in any of their forms, else a hash of the URL"""
+    parsed = urlparse(url.strip())
+    host = (parsed.hostname or '').lower()
+    candidate = None
+    if host.endswith('youtu.be'):
+        candidate = parsed.path.strip('/').split('/')[0]
+    elif host.endswith('youtube.com') or host.endswith('youtube-nocookie.com'):
+        candidate = parse_qs(parsed.query).get('v', [None])[0]
+        parts = parsed.path.strip('/').split('/')
+        if candidate is None and len(parts) >= 2 and parts[0] in ('embed', 'shorts', 'live', 'v'):
+            candidate = parts[1]
+    if candidate and YOUTUBE_ID.match(candidate):
+        return f'yt:{candidate}'
+    return 'url:' + hashlib.sha256(url.strip().encode()).hexdigest()
+
+
+def file_key(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return 'sha256:' + digest.hexdigest()
+
+
+def result_key(source_key: str, params: dict) -> str:
+    return hashlib.sha256(json.dumps([EXTRACTOR_VERSION, source_key, params], sort_keys=True).encode()).hexdigest()
+
+
+def _size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def _remove(path: str) -> None:
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+class SlideStore:
+    """Shared, reference-counted store of videos and extraction results"""
+
+    def __init__(self, db_path: str = USER_DB_PATH, result_dir: str = RESULT_DIR, video_dir: str = VIDEO_DIR,
+                 quota_bytes: int = QUOTA_BYTES, max_views_per_user: int = MAX_VIEWS_PER_USER):
+        self.db_path = db_path
+        self.result_dir = result_dir
+        self.video_dir = video_dir
+        self.quota_bytes = quota_bytes
+        self.max_views_per_user = max_views_per_user
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def video_path(self, key: str) -> str:
+        return os.path.join(self.video_dir, hashlib.sha256(key.encode()).hexdigest()[:32] + '.mp4')
+
+    def result_path(self, key: str) -> str:
+        return os.path.join(self.result_dir, key[:2], key)
+
+    # --- building -------------------------------------------------------------
+
+    def _acquire(self, key: str, kind: str, path: str, build: Callable[[str, Callable[[], None]], Optional[dict]],
+                 wait: Callable[[], None], pin: bool) -> sqlite3.Row:
+        """The ready entry for key, built here if nobody else has or is building it"""
+        while True:
+            now = time.time()
+            conn = self._connect()
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                row = conn.execute('SELECT * FROM slide_cache WHERE key = ?', (key,)).fetchone()
+                if row is not None and row['state'] == 'ready' and os.path.exists(row['path']):
+                    conn.execute('UPDATE slide_cache SET last_used = ?, refs = refs + ? WHERE key = ?',
+                                 (now, int(pin), key))
+                    conn.execute('COMMIT')
+                    return row
+                mine = row is None or row['state'] == 'ready' or row['last_used'] < now - BUILD_STALE_SECONDS
+                if mine:
+                    # Keeps the refs of views on a result whose files went missing
+                    conn.execute('''
+                        INSERT INTO slide_cache (key, kind, path, state, refs, created_at, last_used)
+                        VALUES (?, ?, ?, 'building', ?, ?, ?)
+                        ON CONFLICT(key) DO UPDATE SET state = 'building', refs = refs + excluded.refs,
+                            last_used = excluded.last_used
+                    ''', (key, kind, path, int(pin), now, now))
+                conn.execute('COMMIT')
+            finally:
+                conn.close()
+            if mine:
+                return self._build(key, path, build, pin)
+            wait()
+            time.sleep(WAIT_POLL_SECONDS)
+
+    def _build(self, key: str, path: str, build, pin: bool) -> sqlite3.Row:
+        base, ext = os.path.splitext(path)
+        staging = f"{base}.{uuid.uuid4().hex[:8]}.tmp{ext}"
+        last_touch = [time.monotonic()]
+
+        def keepalive():
+            if time.monotonic() - last_touch[0] > BUILD_STALE_SECONDS / 10:
+                last_touch[0] = time.monotonic()
+                self._execute('UPDATE slide_cache SET last_used = ? WHERE key = ?', (time.time(), key))
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            manifest = build(staging, keepalive)
+            _remove(path)
+            os.replace(staging, path)
+        except BaseException:
+            _remove(staging)
+            self._execute('UPDATE slide_cache SET refs = MAX(refs - ?, 0) WHERE key = ?', (int(pin), key))
+            self._execute("DELETE FROM slide_cache WHERE key = ? AND state = 'building' AND refs = 0", (key,))
+            # Still referenced: leave it to be rebuilt by the next caller
+            self._execute("UPDATE slide_cache SET last_used = 0 WHERE key = ? AND state = 'building'", (key,))
+            raise
+        self._execute(
+            "UPDATE slide_cache SET state = 'ready', size_bytes = ?, manifest = ?, last_used = ? WHERE key = ?",
+            (_size(path), json.dumps(manifest) if manifest is not None else None, time.time(), key)
+        )
+        self.evict()
+        conn = self._connect()
+        try:
+            return conn.execute('SELECT * FROM slide_cache WHERE key = ?', (key,)).fetchone()
+        finally:
+            conn.close()
+
+    def _execute(self, sql: str, args: tuple = ()) -> None:
+        conn = self._connect()
+        try:
+            conn.execute(sql, args)
+        finally:
+            conn.close()
+
+    @contextmanager
+    def video(self, key: str, download: Callable[[str], bool], wait: Callable[[], None] = lambda: None) -> Iterator[str]:
+        """Path of the cached video, downloaded by download(path) on a miss; not evicted while in use"""
+        def build(staging, keepalive):
+            if not download(staging):
+                raise RuntimeError('Failed to download video')
+
+        row = self._acquire(key, 'video', self.video_path(key), build, wait, pin=True)
+        try:
+            yield row['path']
+        finally:
+            self._execute('UPDATE slide_cache SET refs = MAX(refs - 1, 0), last_used = ? WHERE key = ?',
+                          (time.time(), key))
+
+    def result(self, key: str, build: Callable[[str, Callable[[], None]], dict],
+               wait: Callable[[], None] = lambda: None) -> dict:
+        """Manifest of the result for key; on a miss build(directory, keepalive) writes it and returns it"""
+        row = self._acquire(key, 'result', self.result_path(key), build, wait, pin=False)
+        return dict(json.loads(row['manifest']), path=row['path'])
+
+    def refresh_size(self, key: str) -> None:
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT path FROM slide_cache WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                conn.execute('UPDATE slide_cache SET size_bytes = ? WHERE key = ?', (_size(row['path']), key))
+        finally:
+            conn.close()
+
+    # --- views ----------------------------------------------------------------
+
+    def add_view(self, user_id: int, job_id: str, key: str) -> None:
+        """Point one user's extraction at a result; the user's oldest views beyond the cap are released"""
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            added = conn.execute('''
+                INSERT INTO slide_views (job_id, user_id, result_key, created_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(job_id) DO NOTHING
+            ''', (job_id, user_id, key, time.time())).rowcount
+            # A job run again after its process died may already hold the view
+            conn.execute('UPDATE slide_cache SET refs = refs + ?, last_used = ? WHERE key = ?', (added, time.time(), key))
+            stale = conn.execute(
+                'SELECT job_id FROM slide_views WHERE user_id = ? ORDER BY created_at DESC LIMIT -1 OFFSET ?',
+                (user_id, self.max_views_per_user)
+            ).fetchall()
+            for row in stale:
+                self._release(conn, row['job_id'])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def view(self, job_id: str, user_id: int) -> Optional[dict]:
+        """Manifest and directory of the result a user's extraction points at"""
+        conn = self._connect()
+        try:
+            row = conn.execute('''
+                SELECT c.key, c.path, c.manifest FROM slide_views v JOIN slide_cache c ON c.key = v.result_key
+                WHERE v.job_id = ? AND v.user_id = ? AND c.state = 'ready'
+            ''', (job_id, user_id)).fetchone()
+            if row is None:
+                return None
+            conn.execute('UPDATE slide_cache SET last_used = ? WHERE key = ?', (time.time(), row['key']))
+        finally:
+            conn.close()
+        return dict(json.loads(row['manifest']), key=row['key'], path=row['path'])
+
+    def release_view(self, job_id: str, user_id: int) -> None:
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            if conn.execute('SELECT 1 FROM slide_views WHERE job_id = ? AND user_id = ?', (job_id, user_id)).fetchone():
+                self._release(conn, job_id)
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _release(conn: sqlite3.Connection, job_id: str) -> None:
+        row = conn.execute('DELETE FROM slide_views WHERE job_id = ? RETURNING result_key', (job_id,)).fetchone()
+        if row is not None:
+            conn.execute('UPDATE slide_cache SET refs = MAX(refs - 1, 0) WHERE key = ?', (row['result_key'],))
+
+    # --- eviction -------------------------------------------------------------
+
+    def usage(self) -> dict:
+        conn = self._connect()
+        try:
+            rows = conn.execute('''
+                SELECT kind, COUNT(*) AS entries, COALESCE(SUM(size_bytes), 0) AS bytes, SUM(refs > 0) AS referenced
+                FROM slide_cache WHERE state = 'ready' GROUP BY kind
+            ''').fetchall()
+        finally:
+            conn.close()
+        kinds = {row['kind']: dict(row) for row in rows}
+        return {'quota_bytes': self.quota_bytes, 'bytes': sum(k['bytes'] for k in kinds.values()), 'kinds': kinds}
+
+    def evict(self) -> int:
+        """Delete unreferenced entries, least recently used first, until under quota; returns bytes freed"""
+        freed = 0
+        conn = self._connect()
+        try:
+            total = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM slide_cache WHERE state = 'ready'").fetchone()[0]
+            while total > self.quota_bytes:
+                conn.execute('BEGIN IMMEDIATE')
+                row = conn.execute(
+                    "SELECT key, path, size_bytes FROM slide_cache WHERE state = 'ready' AND refs = 0 "
+                    "ORDER BY last_used LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    conn.execute('COMMIT')
+                    break
+                conn.execute('DELETE FROM slide_cache WHERE key = ?', (row['key'],))
+                conn.execute('COMMIT')
+                _remove(row['path'])
+                total -= row['size_bytes']
+                freed += row['size_bytes']
+        finally:
+            conn.close()
+        if freed:
+            logger.info(f"Slide cache evicted {freed} bytes")
+        return freed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shared cache of lecture videos and extracted slides")
+    parser.add_argument('--db', default=USER_DB_PATH, help="Path to the primary (catalog) database")
+    parser.add_argument('--quota-mb', type=int, default=QUOTA_BYTES // (1024 * 1024))
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help="Show cache usage")
+    subparsers.add_parser('evict', help="Evict unreferenced entries down to the quota")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    store = SlideStore(args.db, quota_bytes=args.quota_mb * 1024 * 1024)
+    if args.command == 'evict':
+        print(f"Freed {store.evict() / 1e6:.1f} MB")
+    usage = store.usage()
+    print(f"{usage['bytes'] / 1e6:.1f} MB of {usage['quota_bytes'] / 1e6:.0f} MB")
+    for kind, entry in sorted(usage['kinds'].items()):
+        print(f"  {kind}: {entry['entries']} entries, {entry['referenced']} referenced, {entry['bytes'] / 1e6:.1f} MB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
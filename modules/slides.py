@@ -0,0 +1,443 @@
+import os
+import sys
+import argparse
+import subprocess
+import multiprocessing
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import timedelta
+
+import cv2
+import numpy as np
+
+from modules.change_detection import ChangeDetector, DIFFERENT, IDENTICAL, SIMILAR
+from modules.frames import (SAMPLING_STRATEGIES, FfmpegSampler, FrameReader, FrameSampler, ffmpeg_available, probe,
+                            read_ahead, wait_for_probe)
+from modules.ocr import OCR_WORKERS, OcrStage
+from modules.slide_index import SlideIndex
+from modules.pdf import DEFAULT_JPEG_QUALITY, DEFAULT_MAX_SIDE, PdfWriter
+
+# In static stretches the sampling interval doubles up to this many times `interval`
+MAX_STRIDE_FACTOR = 4
+# Anything on screen for less than this between two slides (a crossfade or wipe) is part of the transition
+MIN_SLIDE_SECONDS = 1.0
+# Videos are processed in segments of this length, one decoder each
+SEGMENT_SECONDS = 300
+SLIDE_WORKERS = int(os.environ.get('EDUX_SLIDE_WORKERS', os.cpu_count() or 1))
+# 'ffmpeg' pipes reduced gray samples out of an ffmpeg process; 'auto' uses it if installed
+DECODERS = ("auto", "opencv", "ffmpeg")
+YT_DLP_CMD = os.environ.get('YT_DLP_CMD', 'yt-dlp')
+
+
+def _scan_segment(options, start, end, on_sample=None, growing=None):
+    """Runs SlideExtractor(**options)._scan_segment(...), in a worker process or inline"""
+    extractor = SlideExtractor(**options)
+    try:
+        return extractor._scan_segment(start, end, on_sample, growing)
+    finally:
+        extractor.ocr.close()
+
+
+class SlideExtractor:
+    def __init__(self, video_url=None, output_dir="static/slides", interval=5, similarity_threshold=0.9, ocr_confidence=30,
+                 sampling="auto", search="adaptive", workers=SLIDE_WORKERS, segment_seconds=SEGMENT_SECONDS,
+                 video_path=None, dedup=True, decoder="auto", ocr_workers=OCR_WORKERS):
+        if decoder not in DECODERS:
+            raise ValueError(f"Unknown decoder: {decoder}")
+        if decoder == "auto":
+            decoder = "ffmpeg" if ffmpeg_available() else "opencv"
+        if sampling == "keyframes" and decoder != "ffmpeg":
+            raise ValueError("Keyframe sampling needs the ffmpeg decoder")
+        self.video_url = video_url
+        self.output_dir = output_dir
+        self.interval = interval
+        self.similarity_threshold = similarity_threshold
+        self.ocr_confidence = ocr_confidence
+        self.sampling = sampling
+        self.search = search
+        self.workers = workers
+        self.segment_seconds = segment_seconds
+        self.dedup = dedup
+        self.decoder = decoder
+        self.detector = ChangeDetector(similarity_threshold)
+        self.index = SlideIndex(self.detector)
+        self.ocr = OcrStage(ocr_workers)
+        self.video_path = video_path or os.path.join(self.output_dir, "temp_video.mp4")
+        self.previous_text = ""
+        self.slides = []
+        self._reader = None
+
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def download_video(self):
+        """Download the YouTube video using yt-dlp"""
+        try:
+            command = [
+                YT_DLP_CMD,
+                "-f", "best[ext=mp4]",
+                "-o", self.video_path,
+                self.video_url
+            ]
+            result = subprocess.run(command, capture_output=True, text=True)
+
+            if result.returncode == 0:
+                print(f"Video downloaded to: {self.video_path}")
+                return True
+            else:
+                print(f"yt-dlp error:\n{result.stderr}")
+                return False
+        except Exception as e:
+            print(f"Error downloading video: {e}")
+            return False
+
+    def start_download(self):
+        """Start downloading the video into video_path, for analysis while it downloads"""
+        try:
+            # --no-part: write to video_path itself, which is read as it grows
+            return subprocess.Popen(
+                [YT_DLP_CMD, "-f", "best[ext=mp4]", "--no-part", "-o", self.video_path, self.video_url],
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+            )
+        except Exception as e:
+            print(f"Error downloading video: {e}")
+            return None
+
+    def _video_info(self, growing=None):
+        """(fps, total frames) of the video, or None if it cannot be read"""
+        if self.decoder == "ffmpeg":
+            info = wait_for_probe(self.video_path, growing) if growing else probe(self.video_path)
+            return (info["fps"], info["total_frames"] or 0) if info else None
+        cap = cv2.VideoCapture(self.video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        return (fps, total_frames) if fps > 0 else None
+
+    def extract_slides(self, progress=None):
+        """Process the video to extract slides.
+
+        progress, if given, is called as progress(frames_done, total_frames,
+        stage=..., slides=...) while the video is processed; an exception it
+        raises aborts the extraction. With the ffmpeg decoder a video that
+        is not on disk yet is analyzed while it downloads, in one segment.
+        """
+        download = None
+        if not os.path.exists(self.video_path):
+            if progress:
+                progress(0, None, stage="downloading", slides=0)
+            if self.decoder == "ffmpeg" and self.video_url:
+                download = self.start_download()
+                if download is None:
+                    return False
+            elif not self.download_video():
+                return False
+        growing = (lambda: download.poll() is None) if download else None
+
+        try:
+            info = self._video_info(growing)
+            if info is None:
+                print(f"Cannot read video: {self.video_path}")
+                return False
+            fps, total_frames = info
+            if download:
+                # Stream order: one segment, scanned as the file arrives
+                segments = [(0, total_frames or None)]
+            else:
+                segment_frames = max(1, int(round(self.segment_seconds * fps)))
+                segments = [(start, min(start + segment_frames, total_frames))
+                            for start in range(0, total_frames, segment_frames)] or [(0, None)]
+            extracted = self._extract(progress, fps, total_frames, segments, growing)
+        except BaseException:
+            if download and download.poll() is None:
+                download.kill()
+            raise
+        finally:
+            if download:
+                _, errors = download.communicate()
+                if download.returncode == 0:
+                    print(f"Video downloaded to: {self.video_path}")
+                else:
+                    print(f"yt-dlp error:\n{errors}")
+        return extracted and (download is None or download.returncode == 0)
+
+    def _extract(self, progress, fps, total_frames, segments, growing=None):
+        duration = total_frames / fps
+        workers = 1 if growing else max(1, min(self.workers, len(segments)))
+
+        print(f"Video duration: {timedelta(seconds=duration)}")
+        print(f"Processing frames every {self.interval} seconds in {len(segments)} segments on {workers} workers...")
+
+        # Segment processes share this extraction's OCR threads rather than each taking as many
+        options = dict(output_dir=self.output_dir, interval=self.interval,
+                       similarity_threshold=self.similarity_threshold, ocr_confidence=self.ocr_confidence,
+                       sampling=self.sampling, search=self.search, workers=1, video_path=self.video_path,
+                       decoder=self.decoder, ocr_workers=max(1, self.ocr.workers // workers))
+        slide = None  # signature of the last saved slide
+        slide_count = 0
+
+        def report(frames_done):
+            if progress:
+                progress(frames_done, total_frames, stage="analyzing", slides=slide_count)
+
+        pool = None
+        if workers > 1:
+            pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+            futures = [pool.submit(_scan_segment, options, start, end) for start, end in segments]
+            results = self._in_order(futures, segments, report)
+        else:
+            results = (_scan_segment(options, start, end, report, growing) for start, end in segments)
+
+        totals = Counter()
+        self.slides = []
+        self.index = SlideIndex(self.detector)
+        positions = []  # position in self.slides of each indexed slide
+        saved = 0
+        try:
+            # Segments are scanned independently and stitched in order, so
+            # the slides do not depend on the number of workers
+            for found, counters in results:
+                totals.update(counters)
+                for index, (start, png, text) in enumerate(found):
+                    if self.dedup or index in (0, len(found) - 1):
+                        current = self.detector.signature(cv2.imdecode(np.frombuffer(png, np.uint8), cv2.IMREAD_COLOR))
+                    # A segment opens on whatever is on screen: drop it if the
+                    # previous segment ended on the same slide
+                    if index == 0 and slide is not None and not self._is_different_slide(slide, current):
+                        continue
+                    timestamp = str(timedelta(seconds=start / fps)).split(".")[0]
+                    # A slide shown again later refers to the first showing
+                    # instead of being saved twice
+                    original = self.index.find(current, text) if self.dedup else None
+                    if original is None:
+                        path = self._save_slide(png, timestamp, saved)
+                        self.index.add(current, text)
+                        positions.append(len(self.slides))
+                        self.slides.append({"time": start / fps, "path": path, "text": text})
+                        saved += 1
+                    else:
+                        first = self.slides[positions[original]]
+                        print(f"Slide at {timestamp} repeats {os.path.basename(first['path'])}")
+                        self.slides.append({"time": start / fps, "path": first["path"], "text": text,
+                                            "duplicate_of": positions[original]})
+                    slide_count += 1
+                if found:
+                    slide = current
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+            self.ocr.close()
+
+        report(total_frames)
+        for tier in self.detector.stats:
+            self.detector.stats[tier] += totals[tier]
+        print(f"Analyzed {totals['sampled']} samples and {totals['reads']} frames between them")
+        print(f"Grabbed {totals['grabbed']} frames and made {totals['seeks']} seeks")
+        rates = ", ".join(f"{tier} {rate:.0%}" for tier, rate in self.detector.hit_rates().items())
+        print(f"Change detection: {rates}")
+        print(f"OCR: {totals['ocr_runs'] + self.ocr.stats['runs']} runs, "
+              f"{totals['ocr_cache_hits'] + self.ocr.stats['cache_hits']} cache hits")
+        print(f"Extracted {saved} slides to {self.output_dir}")
+        if self.dedup:
+            print(f"Slides shown again: {slide_count - saved} of {slide_count} "
+                  f"(dedup ratio {self.index.dedup_ratio():.0%}, {self.index.stats['candidates']} candidates checked)")
+        return True
+
+    @staticmethod
+    def _in_order(futures, segments, report):
+        """Results of the segment futures in video order, reporting progress as any of them finish"""
+        for future in futures:
+            while True:
+                report(sum(end - start for f, (start, end) in zip(futures, segments) if f.done()))
+                if future.done():
+                    break
+                wait([f for f in futures if not f.done()], timeout=1.0, return_when=FIRST_COMPLETED)
+            yield future.result()
+
+    def _scan_segment(self, start_frame, end_frame, on_sample=None, growing=None):
+        """Slides starting in frames [start_frame, end_frame) as [(first frame, PNG bytes, text)], and counters"""
+        slide = None  # signature of the last slide found
+        last_seen = None  # (frame_num, signature) of the latest sample showing it
+        found = []
+
+        if self.decoder == "ffmpeg":
+            # Samples come reduced and gray; slide images are read at full size
+            sampler = FfmpegSampler(self.video_path, self.interval, self.sampling == "keyframes", start_frame,
+                                    end_frame, self.detector.ssim_max_side, growing)
+        else:
+            sampler = FrameSampler(self.video_path, self.interval, self.sampling, start_frame, end_frame)
+        reader = self._reader = FrameReader(self.video_path)
+        # The adaptive stride must take effect at the very next sample, or
+        # where it lands would depend on thread timing; only fixed-interval
+        # scans decode ahead, and ffmpeg decodes ahead in its own process
+        frames = sampler if self.search == "adaptive" or self.decoder == "ffmpeg" else read_ahead(sampler)
+        try:
+            for frame_num, frame in frames:
+                if on_sample:
+                    on_sample(frame_num)
+                current = self.detector.signature(frame, frame_num if self.decoder == "ffmpeg" else None)
+                verdict = DIFFERENT if slide is None else self._compare(slide, current)
+
+                if verdict == DIFFERENT:
+                    if self.search == "adaptive" and last_seen is not None:
+                        min_frames = max(2, int(round(sampler.fps * MIN_SLIDE_SECONDS)))
+                        starts = self._find_transitions(reader, last_seen, (frame_num, current, current), min_frames)
+                    else:
+                        starts = [(frame_num, current)]
+                    for start, representative in starts:
+                        image = self._full_frame(representative)
+                        # Read the new slide now, while the next frames decode
+                        found.append((start, cv2.imencode('.png', image)[1].tobytes(), self.ocr.submit(image)))
+                    slide = starts[-1][1]
+                    sampler.interval = self.interval
+                elif verdict == IDENTICAL and self.search == "adaptive":
+                    sampler.interval = min(sampler.interval * 2, self.interval * MAX_STRIDE_FACTOR)
+                last_seen = (frame_num, current)
+        finally:
+            reader.close()
+            self._reader = None
+        found = [(start, png, text.result()) for start, png, text in found]
+
+        counters = dict(self.detector.stats, reads=reader.reads, ocr_runs=self.ocr.stats['runs'],
+                        ocr_cache_hits=self.ocr.stats['cache_hits'])
+        counters.update((key, sampler.stats[key]) for key in ('sampled', 'grabbed', 'seeks'))
+        return found, counters
+
+    def _full_frame(self, signature):
+        """The signature's frame in full size and color, read again if the sample was reduced"""
+        if signature.number is None or self._reader is None:
+            return signature.frame
+        frame = self._reader.read(signature.number)
+        if frame is None:
+            height, width = signature.frame.shape[:2]
+            print(f"Warning: could not read frame {signature.number} at full size; "
+                  f"using its {width}x{height} gray sample for the slide image and OCR")
+            return signature.frame
+        return frame
+
+    def _compare(self, previous, current):
+        """DIFFERENT, IDENTICAL or SIMILAR for two ChangeDetector signatures, reading text if needed"""
+        verdict = self.detector.compare(previous, current)
+        if verdict != SIMILAR:
+            return verdict
+
+        pending = self.ocr.submit(self._full_frame(previous)), self.ocr.submit(self._full_frame(current))
+        text1, text2 = (future.result() for future in pending)
+
+        if text1 and text2:
+            words1 = set(text1.split())
+            words2 = set(text2.split())
+            common_words = words1.intersection(words2)
+            diff_ratio = 1 - len(common_words) / max(len(words1), len(words2))
+
+            if diff_ratio > 0.3:
+                return DIFFERENT
+
+        return SIMILAR
+
+    def _is_different_slide(self, previous, current):
+        return self._compare(previous, current) == DIFFERENT
+
+    def _find_transitions(self, reader, left, right, min_frames):
+        """Bisect between two differing samples for the frames where slides change.
+
+        left is (frame_num, signature) of a sample still showing the old
+        slide; right is (frame_num, signature, representative) of one showing
+        another. Returns [(first frame, representative signature)] for every
+        slide that starts in (left, right], found by decoding midpoints. A
+        midpoint that matches neither side may be a slide of its own, so both
+        halves are searched - unless the span is under min_frames, and
+        anything found there that lasts under min_frames is dropped: those
+        are the in-between frames of a crossfade, not slides.
+        """
+        left_num, left_sig = left
+        right_num, right_sig, representative = right
+        if right_num - left_num <= 1:
+            return [(right_num, representative)]
+        middle_num = (left_num + right_num) // 2
+        frame = reader.read(middle_num)
+        if frame is None:
+            return [(right_num, representative)]
+        middle = self.detector.signature(frame)
+        if not self._is_different_slide(left_sig, middle):
+            return self._find_transitions(reader, (middle_num, middle), right, min_frames)
+        if not self._is_different_slide(middle, right_sig):
+            return self._find_transitions(reader, left, (middle_num, middle, representative), min_frames)
+        if right_num - left_num <= min_frames:
+            return [(right_num, representative)]
+        starts = (self._find_transitions(reader, left, (middle_num, middle, middle), min_frames)
+                  + self._find_transitions(reader, (middle_num, middle), right, min_frames))
+        # The last start is the sampled slide itself and is always kept
+        return [start for start, following in zip(starts, starts[1:]) if following[0] - start[0] >= min_frames] \
+            + starts[-1:]
+
+    def _extract_text(self, frame):
+        return self.ocr.text(frame)
+
+    def _save_slide(self, png, timestamp, count):
+        filename = f"slide_{count:03d}_{timestamp.replace(':', '-')}.png"
+        path = os.path.join(self.output_dir, filename)
+        with open(path, "wb") as f:
+            f.write(png)
+        print(f"Saved slide: {filename}")
+        return path
+
+    def convert_slides_to_pdf(self, pdf_name="slides_output.pdf", page_size="fit", jpeg_quality=DEFAULT_JPEG_QUALITY,
+                              max_side=DEFAULT_MAX_SIDE, texts=None, progress=None):
+        """Convert all extracted slides to a single PDF file, one page at a time.
+
+        texts maps slide file names to OCR text for an invisible text layer;
+        progress, if given, is called as progress(pages_done, total_pages).
+        """
+        image_files = sorted([
+            os.path.join(self.output_dir, file)
+            for file in os.listdir(self.output_dir)
+            if file.lower().endswith(".png") and file.startswith("slide_")
+        ])
+
+        if not image_files:
+            print("No slide images found to convert.")
+            return
+
+        pdf_path = os.path.join(self.output_dir, pdf_name)
+        with PdfWriter(pdf_path, page_size, jpeg_quality, max_side) as pdf:
+            for done, image_file in enumerate(image_files, 1):
+                pdf.add_page(image_file, (texts or {}).get(os.path.basename(image_file)))
+                if progress:
+                    progress(done, len(image_files))
+        print(f"PDF created at: {pdf_path}")
+        return pdf_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract the slides of a lecture video from a local file or a URL")
+    parser.add_argument('source', help="Path of a video file, or a YouTube URL")
+    parser.add_argument('--output-dir', default='slides_output')
+    parser.add_argument('--interval', type=float, default=5, help="Seconds between sampled frames")
+    parser.add_argument('--threshold', type=float, default=0.9, help="SSIM below which frames are different slides")
+    parser.add_argument('--decoder', choices=DECODERS, default='auto')
+    parser.add_argument('--sampling', choices=SAMPLING_STRATEGIES + ('keyframes',), default='auto')
+    parser.add_argument('--workers', type=int, default=SLIDE_WORKERS)
+    parser.add_argument('--pdf', action='store_true', help="Also write the slides to a PDF")
+    args = parser.parse_args(argv)
+
+    local = os.path.exists(args.source)
+    extractor = SlideExtractor(
+        video_url=None if local else args.source,
+        output_dir=args.output_dir,
+        interval=args.interval,
+        similarity_threshold=args.threshold,
+        sampling=args.sampling,
+        workers=args.workers,
+        video_path=args.source if local else None,
+        decoder=args.decoder
+    )
+    if not extractor.extract_slides():
+        return 1
+    if args.pdf:
+        extractor.convert_slides_to_pdf(texts={os.path.basename(slide['path']): slide['text']
+                                               for slide in extractor.slides})
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import re
+import sqlite3
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Tables whose free-text topic column gets a topic_id foreign key
+TOPIC_TABLES = ('interactions', 'rapid_quiz_responses', 'user_progress')
+
+
+class TopicIndex:
+    """Canonical topics, their aliases and per-user running success rates.
+
+    Free-text topics typed by students ("Fractions", "fractions ", "FRACTIONS!")
+    resolve to one canonical row through the alias table, so per-topic
+    lookups are exact indexed fetches instead of LIKE scans.
+    """
+
+    @staticmethod
+    def normalize_alias(name: str) -> str:
+        return ' '.join(name.lower().split())
+
+    @staticmethod
+    def canonical_key(name: str) -> str:
+        """Lowercase, drop punctuation and collapse whitespace"""
+        return ' '.join(re.sub(r'[^\w\s]', ' ', name.lower()).split())
+
+    @staticmethod
+    def resolve(conn: sqlite3.Connection, name: Optional[str], create: bool = True) -> Optional[int]:
+        """Map a free-text topic to its topic id, registering it if new"""
+        if not name or not name.strip():
+            return None
+        alias = TopicIndex.normalize_alias(name)
+        row = conn.execute('SELECT topic_id FROM topic_aliases WHERE alias = ?', (alias,)).fetchone()
+        if row:
+            return row[0]
+
+        key = TopicIndex.canonical_key(name)
+        if not key:
+            return None
+        row = conn.execute('SELECT id FROM topics WHERE topic_key = ?', (key,)).fetchone()
+        if row:
+            topic_id = row[0]
+        elif create:
+            cursor = conn.execute(
+                'INSERT INTO topics (topic_key, display_name) VALUES (?, ?)',
+                (key, name.strip())
+            )
+            topic_id = cursor.lastrowid
+        else:
+            return None
+        if create:
+            conn.execute(
+                'INSERT OR IGNORE INTO topic_aliases (alias, topic_id) VALUES (?, ?)',
+                (alias, topic_id)
+            )
+        return topic_id
+
+    @staticmethod
+    def add_alias(conn: sqlite3.Connection, alias: str, topic: str) -> int:
+        """Point an extra spelling (e.g. 'maths') at an existing or new topic"""
+        topic_id = TopicIndex.resolve(conn, topic)
+        conn.execute(
+            'INSERT OR REPLACE INTO topic_aliases (alias, topic_id) VALUES (?, ?)',
+            (TopicIndex.normalize_alias(alias), topic_id)
+        )
+        return topic_id
+
+    @staticmethod
+    def record_result(conn: sqlite3.Connection, user_id: int, topic_id: Optional[int], is_correct: bool) -> None:
+        """Fold one graded interaction into the user's running success rate"""
+        if topic_id is None:
+            return
+        conn.execute('''
+            INSERT INTO user_topic_stats (user_id, topic_id, attempts, correct_count)
+            VALUES (?, ?, 1, ?)
+            ON CONFLICT(user_id, topic_id) DO UPDATE SET
+                attempts = attempts + 1,
+                correct_count = correct_count + excluded.correct_count
+        ''', (user_id, topic_id, 1 if is_correct else 0))
+
+    @staticmethod
+    def success_rate(conn: sqlite3.Connection, user_id: int, name: str) -> Optional[float]:
+        """Success rate for a user on a topic, or None if there is no history"""
+        if not name or not name.strip():
+            return None
+        row = conn.execute('''
+            SELECT s.correct_count, s.attempts
+            FROM topic_aliases a
+            JOIN user_topic_stats s ON s.topic_id = a.topic_id
+            WHERE a.alias = ? AND s.user_id = ?
+        ''', (TopicIndex.normalize_alias(name), user_id)).fetchone()
+        if not row or not row[1]:
+            return None
+        return row[0] / row[1]
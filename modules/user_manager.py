@@ -1,12 +1,13 @@
 import sqlite3
 import logging
-from werkzeug.security import generate_password_hash, check_password_hash
 from typing import Optional, Dict, List
+from modules.database import USER_DB_PATH
+from modules.passwords import hasher
 
 logger = logging.getLogger(__name__)
 
 class UserManager:
-    def __init__(self, db_path: str = 'database/user_data.db'):
+    def __init__(self, db_path: str = USER_DB_PATH):
         self.db_path = db_path
 
     def _get_connection(self) -> sqlite3.Connection:
@@ -17,7 +18,7 @@ class UserManager:
     def create_user(self, username: str, email: str, password: str) -> bool:
         """Create new user with hashed password"""
         try:
-            password_hash = generate_password_hash(password)
+            password_hash = hasher.hash(password)
             with self._get_connection() as conn:
                 conn.execute(
                     "INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)",
@@ -42,10 +43,17 @@ class UserManager:
                 (username_or_email, username_or_email)
             )
             user = cursor.fetchone()
-            
-            if user and check_password_hash(user['password_hash'], password):
-                return dict(user)
+
+        if not user or not hasher.verify(user['password_hash'], password):
             return None
+        if hasher.needs_rehash(user['password_hash']):
+            with self._get_connection() as conn:
+                conn.execute(
+                    "UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?",
+                    (hasher.hash(password), user['id'], user['password_hash'])
+                )
+                conn.commit()
+        return dict(user)
 
     def get_user_stats(self, user_id: int) -> List[Dict]:
         """Get user progress statistics"""
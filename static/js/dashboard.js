@@ -1,16 +1,64 @@
 document.addEventListener('DOMContentLoaded', function () {
     // Initialize
     let refreshTimer = null;
+    let progressStream = null;
     let isRequestInProgress = false;
     let lastFetchTime = 0;
+    let currentProgress = [];
+    let currentActivities = [];
     const FETCH_COOLDOWN = 30000; // 30 seconds cooldown
-    const REFRESH_INTERVAL = 60000; // 60 seconds refresh interval
+    const REFRESH_INTERVAL = 60000; // Polling fallback for browsers without EventSource
+    const MAX_RECENT_ACTIVITIES = 10;
 
     function initializeDashboard() {
         loadAnalytics(); // Initial load
         setupEventListeners();
-        // Start auto-refresh with a longer interval
-        startAutoRefresh();
+        // Server pushes deltas when progress changes; poll only if SSE is unsupported
+        if (window.EventSource) {
+            connectProgressStream();
+        } else {
+            startAutoRefresh();
+        }
+    }
+
+    function connectProgressStream() {
+        progressStream = new EventSource('/api/progress_stream');
+        let hadError = false;
+
+        progressStream.addEventListener('progress', function (event) {
+            applyProgressDelta(JSON.parse(event.data));
+        });
+        progressStream.addEventListener('open', function () {
+            // Deltas published while disconnected were missed, so resync once
+            if (hadError) {
+                hadError = false;
+                lastFetchTime = 0;
+                loadAnalytics();
+            }
+        });
+        progressStream.addEventListener('error', function () {
+            hadError = true;
+        });
+    }
+
+    function applyProgressDelta(delta) {
+        if (delta.progress) {
+            const index = currentProgress.findIndex(item => item.topic === delta.progress.topic);
+            if (index !== -1) {
+                currentProgress[index] = delta.progress;
+            } else {
+                // First answer on a topic the student has just started
+                currentProgress.push(delta.progress);
+            }
+            renderCharts(currentProgress);
+        }
+        if (delta.activity) {
+            currentActivities = [delta.activity, ...currentActivities].slice(0, MAX_RECENT_ACTIVITIES);
+            renderRecentActivity(currentActivities);
+        }
+        if (delta.recommendations) {
+            renderRecommendations(delta.recommendations);
+        }
     }
 
     function startAutoRefresh() {
@@ -57,9 +105,12 @@ document.addEventListener('DOMContentLoaded', function () {
             .then(data => {
                 if (!data) throw new Error('No data received');
                 if (data.progress) {
+                    currentProgress = data.progress;
                     renderCharts(data.progress);
                 }
+                renderRecommendations(data.recommendations || []);
                 if (data.recent_activities) {
+                    currentActivities = data.recent_activities;
                     renderRecentActivity(data.recent_activities);
                 } else {
                     showNoDataMessage();
@@ -85,11 +136,20 @@ document.addEventListener('DOMContentLoaded', function () {
 
     // Clean up on page unload or navigation
     document.addEventListener('visibilitychange', function () {
-        if (!document.hidden) {
+        if (!document.hidden && !progressStream) {
             loadAnalytics(); // Refresh when page becomes visible
         }
     });
 
+    window.addEventListener('beforeunload', function () {
+        if (progressStream) {
+            progressStream.close();
+        }
+        if (refreshTimer) {
+            clearInterval(refreshTimer);
+        }
+    });
+
     // Initialize dashboard
     initializeDashboard();
     // Add this function after initializeDashboard()
@@ -295,6 +355,23 @@ function renderCharts(progressData) {
 }
 
 // Render recent activity
+function renderRecommendations(recommendations) {
+    const recommendationsElement = document.getElementById('dashboardRecommendations');
+    if (!recommendationsElement) return;
+
+    if (recommendations.length === 0) {
+        recommendationsElement.innerHTML = '<p>Continue practicing to receive personalized recommendations.</p>';
+        return;
+    }
+    const list = document.createElement('ul');
+    recommendations.forEach(text => {
+        const item = document.createElement('li');
+        item.textContent = text;
+        list.appendChild(item);
+    });
+    recommendationsElement.replaceChildren(list);
+}
+
 function renderRecentActivity(activities) {
     const recentActivitiesElement = document.getElementById('recentActivities');
     if (!recentActivitiesElement) return;
@@ -354,6 +431,8 @@ function loadTestQuestions(subject, topic) {
         .then(data => {
             if (data.questions?.length > 0) {
                 sessionStorage.setItem('testQuestions', JSON.stringify(data.questions));
+                sessionStorage.setItem('testId', JSON.stringify(data.test_id));
+                sessionStorage.setItem('testAnswers', '{}');
                 displayQuestion(0);
                 if (loadingElement) loadingElement.style.display = 'none';
                 if (contentElement) contentElement.style.display = 'block';
@@ -385,6 +464,7 @@ function displayQuestion(index) {
     }
 
     const question = testQuestions[index];
+    const answers = JSON.parse(sessionStorage.getItem('testAnswers') || '{}');
     // Implement question display logic here
     questionElement.innerHTML = `
             <div class="question">
@@ -393,7 +473,9 @@ function displayQuestion(index) {
                 <div class="options">
                     ${question.options.map((option, i) => `
                         <div class="option">
-                            <input type="radio" name="answer" id="option${i}" value="${option}">
+                            <input type="radio" name="answer" id="option${i}" value="${option}"
+                                ${answers[index] === option ? 'checked' : ''}
+                                onchange="recordTestAnswer(${index}, this.value)">
                             <label for="option${i}">${option}</label>
                         </div>
                     `).join('')}
@@ -471,39 +553,36 @@ window.displayQuestion = displayQuestion;
 
 // Function for test submission (referenced in displayQuestion but not implemented)
 // Replace the existing submitTest function
+window.recordTestAnswer = function (index, value) {
+    const answers = JSON.parse(sessionStorage.getItem('testAnswers') || '{}');
+    answers[index] = value;
+    sessionStorage.setItem('testAnswers', JSON.stringify(answers));
+};
+
 window.submitTest = function () {
-    const testQuestions = JSON.parse(sessionStorage.getItem('testQuestions') || '[]');
-    const answers = [];
-    const radioButtons = document.querySelectorAll('input[name="answer"]:checked');
-
-    radioButtons.forEach((radio, index) => {
-        answers.push({
-            question: testQuestions[index].question,
-            user_answer: radio.value,
-            correct_answer: testQuestions[index].correct_answer
-        });
-    });
+    const testId = JSON.parse(sessionStorage.getItem('testId') || 'null');
+    const savedAnswers = JSON.parse(sessionStorage.getItem('testAnswers') || '{}');
+    // Answers are graded on the server against the stored answer key
+    const answers = Object.entries(savedAnswers).map(([index, value]) => ({
+        index: parseInt(index, 10),
+        user_answer: value
+    }));
 
     fetch('/api/submit_test', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ answers })
+        body: JSON.stringify({ test_id: testId, answers })
     })
         .then(response => response.json())
         .then(data => {
+            if (data.error) throw new Error(data.error);
             document.getElementById('testInterface').style.display = 'none';
-            loadAnalytics(); // Refresh analytics after test submission
-            alert('Test submitted successfully!');
+            sessionStorage.removeItem('testAnswers');
+            // Updated progress arrives over the progress stream
+            alert(`Test submitted! You scored ${data.correct}/${data.total}.`);
         })
         .catch(error => {
             console.error('Error submitting test:', error);
             alert('Error submitting test. Please try again.');
         });
 };
-
-// Cleanup on page unload
-window.addEventListener('beforeunload', function () {
-    if (refreshTimer) {
-        clearInterval(refreshTimer);
-    }
-});
\ No newline at end of file
@@ -0,0 +1,91 @@
+document.addEventListener('DOMContentLoaded', function () {
+    const PAGE_SIZE = 20;
+    const filtersForm = document.getElementById('activityFilters');
+    const activityList = document.getElementById('activityList');
+    const loadMoreBtn = document.getElementById('loadMoreActivity');
+    let nextCursor = null;
+    let isLoading = false;
+
+    function buildQuery(cursor) {
+        const params = new URLSearchParams({ limit: PAGE_SIZE });
+        const type = document.getElementById('activityType').value;
+        const subject = document.getElementById('activitySubject').value.trim();
+        const since = document.getElementById('activitySince').value;
+        const until = document.getElementById('activityUntil').value;
+        if (type) params.set('type', type);
+        if (subject) params.set('subject', subject.toLowerCase());
+        if (since) params.set('since', since);
+        if (until) {
+            // Make the "To" date inclusive by asking for everything before the next day
+            const end = new Date(until);
+            end.setDate(end.getDate() + 1);
+            params.set('until', end.toISOString().slice(0, 10));
+        }
+        if (cursor) params.set('cursor', cursor);
+        return params.toString();
+    }
+
+    function renderActivity(activity) {
+        const date = new Date(activity.timestamp.replace(' ', 'T') + 'Z').toLocaleString();
+        const statusClass = activity.is_correct ? 'correct' : 'incorrect';
+        const label = activity.activity_type === 'rapid_quiz' ? 'Quiz' : 'Chat';
+        const card = document.createElement('div');
+        card.className = `activity-card ${statusClass}`;
+        card.innerHTML = `
+            <div class="activity-header">
+                <span class="activity-type"></span>
+                <span class="activity-time">${date}</span>
+            </div>
+            <div class="activity-content">
+                <p class="activity-question"></p>
+                <div class="activity-answers">
+                    <p class="activity-response"></p>
+                </div>
+            </div>
+        `;
+        card.querySelector('.activity-type').textContent = `${label} · ${(activity.topic || '').toUpperCase()}`;
+        card.querySelector('.activity-question').textContent = activity.question || '';
+        card.querySelector('.activity-response').textContent = activity.user_answer || 'No answer provided';
+        return card;
+    }
+
+    function loadPage(reset) {
+        if (isLoading) return;
+        isLoading = true;
+        if (reset) {
+            nextCursor = null;
+            activityList.innerHTML = '';
+        }
+
+        fetch(`/api/activity?${buildQuery(nextCursor)}`)
+            .then(response => {
+                if (!response.ok) throw new Error(`Server responded with status: ${response.status}`);
+                return response.json();
+            })
+            .then(data => {
+                data.items.forEach(activity => activityList.appendChild(renderActivity(activity)));
+                if (reset && data.items.length === 0) {
+                    activityList.innerHTML = '<div class="no-activity-message"><p>No activity found.</p></div>';
+                }
+                nextCursor = data.next_cursor;
+                loadMoreBtn.style.display = nextCursor ? 'inline-block' : 'none';
+            })
+            .catch(error => {
+                console.error('Error loading activity:', error);
+                activityList.insertAdjacentHTML('beforeend', '<div class="error-message">Failed to load activity.</div>');
+            })
+            .finally(() => {
+                isLoading = false;
+            });
+    }
+
+    filtersForm.addEventListener('submit', function (e) {
+        e.preventDefault();
+        loadPage(true);
+    });
+    loadMoreBtn.addEventListener('click', function () {
+        loadPage(false);
+    });
+
+    loadPage(true);
+});
@@ -28,8 +28,12 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Test state
     let questions = [];
+    let testId = null;
     let currentQuestionIndex = 0;
     let userAnswers = [];
+    let questionSeconds = [];
+    let questionShownAt = null;
+    let gradedResults = [];
     let startTime;
     let timerInterval;
     let secondsElapsed = 0;
@@ -92,8 +96,12 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Reset test state
         questions = [];
+        testId = null;
         currentQuestionIndex = 0;
         userAnswers = [];
+        questionSeconds = [];
+        questionShownAt = null;
+        gradedResults = [];
         secondsElapsed = 0;
         testActive = true;
         
@@ -107,12 +115,17 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Generate questions
         generateQuestions(subject, topic)
-            .then(generatedQuestions => {
-                // Save questions
-                questions = generatedQuestions;
+            .then(data => {
+                // The answer key stays on the server; keep the id to submit against
+                questions = data.questions || [];
+                testId = data.test_id;
+                if (questions.length === 0) {
+                    throw new Error('No questions were generated');
+                }
                 
-                // Initialize user answers array
+                // Initialize user answers and per-question time
                 userAnswers = new Array(questions.length).fill(null);
+                questionSeconds = new Array(questions.length).fill(0);
                 
                 // Start timer
                 startTimer();
@@ -291,9 +304,20 @@ document.addEventListener('DOMContentLoaded', function() {
         return mockQuestions;
     }
 
+    function recordQuestionTime() {
+        if (questionShownAt !== null) {
+            questionSeconds[currentQuestionIndex] += (new Date() - questionShownAt) / 1000;
+            questionShownAt = null;
+        }
+    }
+
     function showQuestion(index) {
         const question = questions[index];
         
+        // Time spent on the question being left counts as its response time
+        recordQuestionTime();
+        questionShownAt = new Date();
+        
         // Update question counter
         questionCounter.textContent = `Question ${index + 1}/${questions.length}`;
         
@@ -399,30 +423,56 @@ document.addEventListener('DOMContentLoaded', function() {
         clearInterval(timerInterval);
     }
 
-    function submitTest() {
-        // Stop timer
-        stopTimer();
-        
-        // Calculate score
-        const score = calculateScore();
-        
-        // Show results
-        showResults(score);
+    async function submitTest() {
+        if (testId === null) {
+            alert('Please log in to submit a test.');
+            return;
+        }
         
-        // Test is no longer active
-        testActive = false;
-    }
-
-    function calculateScore() {
-        let correctCount = 0;
+        recordQuestionTime();
+        submitTestBtn.disabled = true;
+        
+        // Answers are graded on the server against the stored answer key
+        const answers = [];
+        userAnswers.forEach((optIndex, index) => {
+            if (optIndex !== null) {
+                answers.push({
+                    index: index,
+                    user_answer: questions[index].options[optIndex],
+                    response_time: Math.round(questionSeconds[index] * 10) / 10
+                });
+            }
+        });
         
-        for (let i = 0; i < questions.length; i++) {
-            if (userAnswers[i] === questions[i].correctIndex) {
-                correctCount++;
+        try {
+            const response = await fetch('/api/submit_test', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({ test_id: testId, answers: answers }),
+            });
+            const data = await response.json();
+            if (!response.ok) {
+                throw new Error(data.error || 'Failed to submit test');
             }
+            
+            // Stop timer
+            stopTimer();
+            gradedResults = data.results;
+            
+            // Show results
+            showResults(data.correct);
+            
+            // Test is no longer active
+            testActive = false;
+        } catch (error) {
+            console.error('Error submitting test:', error);
+            alert(`Error: ${error.message}`);
+            questionShownAt = new Date();
+        } finally {
+            submitTestBtn.disabled = false;
         }
-        
-        return correctCount;
     }
 
     function showResults(score) {
@@ -450,9 +500,16 @@ document.addEventListener('DOMContentLoaded', function() {
         questionsReview.innerHTML = '';
         
         // Generate review for each question
+        const resultsByIndex = {};
+        gradedResults.forEach(result => {
+            resultsByIndex[result.index] = result;
+        });
+        
         questions.forEach((question, index) => {
             const userAnswer = userAnswers[index];
-            const isCorrect = userAnswer === question.correctIndex;
+            const result = resultsByIndex[index];
+            const isCorrect = Boolean(result && result.is_correct);
+            const correctIndex = result ? question.options.indexOf(result.correct_answer) : -1;
             
             // Create review item
             const reviewItem = document.createElement('div');
@@ -478,7 +535,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 }
                 
                 // Highlight correct answer
-                if (question.correctIndex === optIndex) {
+                if (correctIndex === optIndex) {
                     reviewOption.classList.add('correct-answer');
                 }
                 
@@ -491,7 +548,7 @@ document.addEventListener('DOMContentLoaded', function() {
             // Add explanation
             const reviewExplanation = document.createElement('div');
             reviewExplanation.className = 'review-explanation';
-            reviewExplanation.textContent = question.explanation || 'No explanation available.';
+            reviewExplanation.textContent = (result && result.explanation) || 'No explanation available.';
             reviewItem.appendChild(reviewExplanation);
             
             // Add to review container
@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# modules.database reads these at import: keep test databases out of database/
+_scratch = tempfile.mkdtemp(prefix='edux-tests-')
+os.environ.setdefault('EDUX_DATABASE_DIR', _scratch)
+os.environ.setdefault('EDUX_DB_PATH', os.path.join(_scratch, 'user_data.db'))
+os.environ.setdefault('EDUX_ARCHIVE_DIR', os.path.join(_scratch, 'archive'))
@@ -0,0 +1,48 @@
+import sqlite3
+
+import pytest
+
+from modules import migrations
+from modules.assessments import Assessments
+from modules.topics import TopicIndex
+
+QUESTIONS = [
+    {'question': 'What is 1/2 + 1/4?', 'options': ['3/4', '2/6'], 'correct_answer': '3/4'},
+    {'question': 'What is 1/3 of 9?', 'options': ['3', '6'], 'correct_answer': '3'},
+    {'question': 'What is 2/4 simplified?', 'options': ['1/2', '2/2'], 'correct_answer': '1/2'},
+]
+
+
+@pytest.fixture
+def conn(tmp_path):
+    db_path = str(tmp_path / 'user_data.db')
+    migrations.upgrade(db_path)
+    conn = sqlite3.connect(db_path)
+    yield conn
+    conn.close()
+
+
+def test_partial_submission_counts_unanswered_questions_as_incorrect(conn):
+    test_id = Assessments.store(conn, 1, 'math', 'Fractions', QUESTIONS)
+    summary = Assessments.submit(conn, 1, test_id, [{'index': 0, 'user_answer': '3/4', 'response_time': 4.0}])
+
+    assert summary['total'] == 3
+    assert summary['correct'] == 1
+    assert [r['is_correct'] for r in summary['results']] == [True, False, False]
+    assert summary['results'][1]['user_answer'] is None
+    assert (summary['progress']['correct_count'], summary['progress']['incorrect_count']) == (1, 2)
+    assert conn.execute('SELECT COUNT(*) FROM rapid_quiz_responses WHERE user_id = 1').fetchone()[0] == 3
+    assert conn.execute('SELECT attempts FROM topic_mastery WHERE user_id = 1').fetchone()[0] == 3
+
+
+def test_topic_progress_adds_up_spelling_variants(conn):
+    conn.execute('''
+        INSERT INTO user_progress (user_id, topic, topic_id, correct_count, incorrect_count, avg_response_time)
+        VALUES (1, 'Fractions', ?, 4, 0, 2.0)
+    ''', (TopicIndex.resolve(conn, 'Fractions'),))
+    test_id = Assessments.store(conn, 1, 'math', 'fractions', QUESTIONS)
+    Assessments.submit(conn, 1, test_id, [{'index': i, 'user_answer': q['correct_answer'], 'response_time': 6.0}
+                                          for i, q in enumerate(QUESTIONS[:2])])
+
+    progress = Assessments.topic_progress(conn, 1, 'fractions')
+    assert (progress['correct_count'], progress['incorrect_count']) == (6, 1)
@@ -0,0 +1,32 @@
+import pytest
+
+import app as edux
+from modules.passwords import LoginThrottle
+
+
+@pytest.fixture
+def client(monkeypatch):
+    flask_app = edux.create_app({'TRUSTED_PROXIES': 1}, preload=True)
+    # Two attempts per address, no refill during the test
+    monkeypatch.setattr(edux, 'login_throttle', LoginThrottle(ip_capacity=2, ip_per_second=1e-6))
+    return flask_app.test_client()
+
+
+def login(client, forwarded_for):
+    return client.post('/login', json={'username': 'nobody', 'password': 'wrong'},
+                       headers={'X-Forwarded-For': forwarded_for}, environ_base={'REMOTE_ADDR': '127.0.0.1'})
+
+
+def test_clients_behind_the_proxy_have_separate_ip_buckets(client):
+    assert login(client, '203.0.113.7').status_code != 429
+    assert login(client, '203.0.113.7').status_code != 429
+    assert login(client, '203.0.113.7').status_code == 429
+    # Same proxy address, different client
+    assert login(client, '198.51.100.20').status_code != 429
+
+
+def test_only_the_trusted_hop_is_used(client):
+    # A client-supplied X-Forwarded-For entry in front of the proxy's own is ignored
+    for spoofed in ('10.0.0.1', '10.0.0.2', '10.0.0.3'):
+        response = login(client, f'{spoofed}, 203.0.113.9')
+    assert response.status_code == 429
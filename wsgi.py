@@ -0,0 +1,11 @@
+"""Production entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+gunicorn.conf.py preloads this module in the master, so migrations, imports
+and the app itself are set up once and every worker forks ready to serve;
+its post_fork hook starts each worker's job runner and hashing pool.
+"""
+from app import create_app
+
+app = create_app(preload=True)